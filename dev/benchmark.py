@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+
+# #########################################################################
+# Copyright (c) , UChicago Argonne, LLC. All rights reserved.             #
+#                                                                         #
+# See LICENSE file.                                                       #
+# #########################################################################
+
+"""
+This script measures the time of the reconstruction iterations in the CFM (Calc Fast Module).
+
+The reconstruction runs in a session with the parameters from given configuration file, on the data read from a tif
+file or on simulated data of given size. The per-iteration time comes from the progress records, see
+fast_module.Session.get_progress, and is reported for each algorithm as the median over the iterations of all runs.
+If alloc_report is configured, the bytes allocated by each flow item are summed over the iterations and printed.
+The checkpoints and the coarse stage are not used, so only the engine iterations are measured.
+The timings can be saved to a json file, and compared with timings saved before, i.e. on the baseline commit.
+
+example:
+python dev/benchmark.py conf/config_rec --proc cpu --shape 64 --runs 3 --save baseline.json
+python dev/benchmark.py conf/config_rec --proc cpu --shape 64 --runs 3 --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reccdi.src_py.controller.fast_module as calc
+import reccdi.src_py.utilities.utils as ut
+
+
+def get_simulated_data(shape):
+    """
+    Returns diffraction amplitudes of a random compact object, max centered.
+
+    Parameters
+    ----------
+    shape : int
+        size of the data in each of three dimensions
+
+    Returns
+    -------
+    data : ndarray
+        simulated data
+    """
+    np.random.seed(0)
+    grid = np.indices((shape,) * 3) - shape / 2.0
+    radius = np.sqrt(np.sum(grid ** 2, axis=0))
+    obj = (radius < shape / 6.0) * np.exp(1j * np.random.uniform(-.5, .5, radius.shape))
+    return np.abs(np.fft.fftshift(np.fft.fftn(obj)))
+
+
+def benchmark(proc, device, params, data, runs):
+    """
+    Runs the reconstruction given number of times and collects the progress records.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type/library, chices are: cpu, cuda, opencl
+    device : int
+        device id
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
+    data : ndarray
+        data array
+    runs : int
+        number of reconstructions
+
+    Returns
+    -------
+    records : list
+        progress records of all runs
+    wall_times : list
+        wall time of each run in seconds
+    alloc_array : ndarray
+        bytes allocated by each flow item summed over the runs, or None if not reported
+    flow : list
+        names of the flow items
+    """
+    records = []
+    wall_times = []
+    alloc_array = None
+    flow = None
+    session = calc.Session(proc, device, params, data)
+    try:
+        for _ in range(runs):
+            start = time.time()
+            image = session.run(callback=records.extend, interval=.5)[0]
+            wall_times.append(time.time() - start)
+            if image is None:
+                print ('the reconstruction failed')
+                return None, None, None, None
+            flow = session.get_flow()[0]
+            report = session.get_alloc_report()
+            if report is not None:
+                alloc_array = report if alloc_array is None else alloc_array + report
+    finally:
+        session.close()
+    return records, wall_times, alloc_array, flow
+
+
+def get_timings(records, wall_times):
+    """
+    Summarizes the progress records.
+
+    Parameters
+    ----------
+    records : list
+        progress records of all runs
+    wall_times : list
+        wall time of each run in seconds
+
+    Returns
+    -------
+    timings : dict
+        median wall time of a run, and median time of an iteration for each algorithm, in ms
+    """
+    timings = {'run': 1000 * float(np.median(wall_times))}
+    for algorithm in sorted(set([record['algorithm'] for record in records])):
+        times = [record['time'] for record in records if record['algorithm'] == algorithm]
+        timings[algorithm] = 1000 * float(np.median(times))
+    return timings
+
+
+def compare_timings(timings, baseline):
+    """
+    Prints the timings next to the baseline timings.
+
+    Parameters
+    ----------
+    timings : dict
+        timings of this benchmark, see get_timings
+    baseline : dict
+        timings saved before
+
+    Returns
+    -------
+    nothing
+    """
+    print ('median ms: baseline, now, ratio')
+    for name in sorted(timings):
+        if name in baseline:
+            print ('  %s: %.3f %.3f %.2f' % (name, baseline[name], timings[name], timings[name] / baseline[name]))
+        else:
+            print ('  %s: not in baseline, %.3f' % (name, timings[name]))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='measures time of the reconstruction iterations')
+    parser.add_argument('config', help='reconstruction configuration file')
+    parser.add_argument('--proc', default='cpu', help='library: cpu, opencl or cuda')
+    parser.add_argument('--device', type=int, default=-1, help='device id')
+    parser.add_argument('--data', help='tif file with data; simulated data is used if not given')
+    parser.add_argument('--shape', type=int, default=64, help='size of the simulated data in each dimension')
+    parser.add_argument('--runs', type=int, default=3, help='number of reconstructions')
+    parser.add_argument('--save', help='json file the timings are saved to')
+    parser.add_argument('--compare', help='json file with baseline timings to compare with')
+    args = parser.parse_args(args)
+
+    config_map = ut.read_config(args.config)
+    if config_map is None:
+        print ("can't read configuration file " + args.config)
+        return
+    params = ut.get_fast_module_params(config_map)
+    for name in ('checkpoint_interval', 'coarse_iterations', 'coarse_binning'):
+        params.pop(name, None)
+
+    if args.data is None:
+        data = get_simulated_data(args.shape)
+    else:
+        data = ut.read_tif(args.data)
+    print ('data shape', data.shape)
+
+    records, wall_times, alloc_array, flow = benchmark(args.proc, args.device, params, data, args.runs)
+    if records is None:
+        return
+
+    print ('wall time of runs (s):', ' '.join(['%.3f' % t for t in wall_times]))
+    algorithms = sorted(set([record['algorithm'] for record in records]))
+    for algorithm in algorithms:
+        times = np.asarray([record['time'] for record in records if record['algorithm'] == algorithm])
+        print ('%s: %d iterations, median %.3f ms, mean %.3f ms per iteration' %
+               (algorithm, len(times), 1000 * np.median(times), 1000 * times.mean()))
+    if alloc_array is not None:
+        print ('bytes allocated by flow item, summed over iterations and runs')
+        for i in range(len(flow)):
+            print ('  ' + str(flow[i]) + ': ' + str(int(alloc_array[i].sum())))
+
+    timings = get_timings(records, wall_times)
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(timings, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare_timings(timings, json.load(f))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
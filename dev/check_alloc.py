@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+
+# #########################################################################
+# Copyright (c) , UChicago Argonne, LLC. All rights reserved.             #
+#                                                                         #
+# See LICENSE file.                                                       #
+# #########################################################################
+
+"""
+This script checks the allocation report saved with the reconstruction results against a limit. The report is saved
+in graph/alloc_array.npy of the results directory when the configuration has alloc_report set to true. A flow item
+that allocates more than the limit in an iteration, i.e. after a change added an array copy, is printed, and the
+script exits with status 1.
+
+example:
+python dev/check_alloc.py results --limit 64
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+
+
+def check_alloc(save_dir, limit):
+    """
+    Finds the flow items that allocated more than the limit in one iteration.
+
+    Parameters
+    ----------
+    save_dir : str
+        directory with the reconstruction results
+    limit : float
+        limit in MB of the memory allocated by one flow item in one iteration
+
+    Returns
+    -------
+    exceeded : list
+        list of tuples: flow item, iteration, and allocated MB, for each item over the limit
+    """
+    graph_dir = os.path.join(save_dir, 'graph')
+    alloc_array = np.load(os.path.join(graph_dir, 'alloc_array.npy'))
+    flow = np.load(os.path.join(graph_dir, 'flow.npy'))
+    alloc_mb = alloc_array / (1024 * 1024)
+    exceeded = []
+    for item, iteration in zip(*np.nonzero(alloc_mb > limit)):
+        exceeded.append((str(flow[item]), int(iteration), float(alloc_mb[item, iteration])))
+    return exceeded
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='checks the allocation report against a limit')
+    parser.add_argument('save_dir', help='directory with the reconstruction results')
+    parser.add_argument('--limit', type=float, default=0.0, help='MB one flow item may allocate in one iteration')
+    args = parser.parse_args(args)
+
+    if not os.path.isfile(os.path.join(args.save_dir, 'graph', 'alloc_array.npy')):
+        print ('no allocation report in ' + args.save_dir + ', set alloc_report to true in the configuration')
+        return 2
+    exceeded = check_alloc(args.save_dir, args.limit)
+    for item, iteration, mb in exceeded:
+        print ('%s allocated %.1f MB in iteration %d' % (item, mb, iteration))
+    return 1 if len(exceeded) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -9,7 +9,9 @@ See LICENSE file.
 
 #include "vector"
 #include "string"
+#include "map"
 #include "common.h"
+#include "progress.hpp"
 
 class Manager;
 
@@ -21,23 +23,59 @@ private:
 public:
     Bridge();
 
-    void StartCalcWithGuess(int device, std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> dim, const std::string & config);
+    // The Init method starts a session. It takes the data as c-like buffer owned by the caller, holding doubles. The
+    // buffer is read in place and copied once, when the ArrayFire array is created. The dim parameter conveys the
+    // dimensions of the buffer. The config maps the configuration parameter names to values. The data, parameters and
+    // device context are kept by the session between runs.
+    void Init(int device, const double *data_buffer, std::vector<int> dim, const std::map<std::string, std::string> & config);
 
-    void StartCalcWithGuessSupport(int device, std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> support_buffer, std::vector<int> dim, const std::string & config);
+    // Replaces the session data with the data of the same dimensions.
+    void SetData(const double *data_buffer);
 
-    void StartCalcWithGuessSupportCoh(int device, std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> support_buffer, std::vector<int> dim, std::vector<float> coh_buffer, std::vector<int> coh_dim, const std::string & config);
+    // Runs reconstruction on the session data. The guess buffer holds complex doubles stored as interleaved real and
+    // imaginary parts, the support buffer holds integers, and the coherence buffer holds doubles. Any of the buffers
+    // can be NULL. A NULL guess means the guess is generated and this is the first run.
+    // The batch_size is number of images reconstructed together on the session data.
+    void Run(const double *guess_buffer, const int *support_buffer, const double *coh_buffer, std::vector<int> coh_dim, int batch_size);
 
-    void StartCalc(int device, std::vector<float> data_buffer_r, std::vector<int> dim, std::string const & config);
+    // Sets the checkpoint file for the following runs. The checkpoint is written every "checkpoint_interval" iterations.
+    void SetCheckpoint(const std::string & file);
 
-    std::vector<d_type> GetReciprocalR();
-    std::vector<d_type> GetReciprocalI();
-    std::vector<float> GetSupportV();
-    std::vector<d_type> GetCoherenceV();
-    std::vector<d_type> GetImageR();
-    std::vector<d_type> GetImageI();
+    // Resumes the reconstruction from the checkpoint file. The results are retrieved the same way as after Run.
+    void ResumeCheckpoint(const std::string & file);
+
+    // Returns the iteration records (iteration, error, algorithm, executed flow items) written since the previous call.
+    // It is safe to call from another thread while Run is in progress.
+    std::vector<progress_record> GetProgress();
+
+    // Cancel, pause and resume requests for the reconstruction in progress. They are safe to call from another thread
+    // while Run is in progress. A cancelled run ends with error code -1.
+    void Cancel();
+    void Pause();
+    void Resume();
+    bool IsPaused();
+
+    // Returns number of hits, number of misses, and number of grids in the session Gaussian grid cache.
+    std::vector<unsigned long> GetGaussCacheStats();
+
+    // The export methods copy the results into c-like buffers allocated by the caller. The complex buffers hold
+    // interleaved real and imaginary parts in double precision, or in single precision if single is true.
+    bool IsSinglePrecision();
+    std::vector<int> GetImageDims();
+    void GetImage(void *image_buffer, bool single);
+    void GetReciprocal(void *reciprocal_buffer, bool single);
+    void GetSupport(unsigned char *support_buffer);
+    bool HasVariance();
+    void GetVariance(void *variance_buffer, bool single);
+    std::vector<int> GetCoherenceDims();
+    void GetCoherence(double *coh_buffer);
     std::vector<d_type> GetErrors();
     std::vector<int> GetFlowV();
     std::vector<int> GetIterFlowV();
+    // Returns statistics of the last run mapped by name.
+    std::map<std::string, double> GetRunStats();
+    // Returns bytes allocated by the flow items in the last run, (flow x iterations), if "alloc_report" is configured.
+    std::vector<long long> GetAllocReport();
     int IsSuccess();
 
     void Cleanup();
@@ -7,7 +7,8 @@ See LICENSE file.
 #ifndef common_h
 #define common_h
 
-// defines the type of the data; can be float or double. The double will get replaced when running initializing script.
+// defines the type of host scalars, i.e. norms, errors, and reduction results. The precision of device arrays is not
+// fixed at build time; it is selected for each reconstruction by the "precision" configuration parameter.
 typedef double d_type;
 typedef unsigned int uint;
 
@@ -45,6 +46,14 @@ const int REGULARIZED_AMPLITUDE_GAUSS = 1;
 const int REGULARIZED_AMPLITUDE_POISSON = 2;
 const int REGULARIZED_AMPLITUDE_UNIFORM = 3;
 
+// garbage collection policies of the garbage_trigger; ALWAYS collects in every iteration, THRESHOLD and FRACTION
+// collect when the memory allocated by ArrayFire but not used exceeds the configured bytes or fraction of the allocated
+// memory, and NEVER keeps the buffers for reuse
+const int GC_ALWAYS = 0;
+const int GC_THRESHOLD = 1;
+const int GC_FRACTION = 2;
+const int GC_NEVER = 3;
+
 const int NOT_TRIGGER = 0;
 const int FIRST_RUN_ONLY = 1;
 const int FOR_ALL_RUNS = 2;
@@ -93,4 +102,14 @@ const flow_item_def flow_def[] = {
 
 const int flow_seq_len = 16;
 
+// number of iteration records kept in the progress stream; the reader should poll the stream at least once in that many
+// iterations, otherwise the oldest records are lost
+const int PROGRESS_CAPACITY = 1024;
+
+// maximum number of Gaussian grids kept on the device by the session; the support uses one grid for each sigma
+const int GAUSS_CACHE_CAPACITY = 8;
+
+// relative change of the low resolution det below which the mask of the previous iteration is reused
+const double RESOLUTION_DET_TOLERANCE = 0.005;
+
 #endif /* common_h */
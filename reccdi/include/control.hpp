@@ -0,0 +1,41 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+#ifndef control_hpp
+#define control_hpp
+
+#include "atomic"
+#include "mutex"
+#include "condition_variable"
+
+// This class holds the cancel and pause requests for the reconstruction run in a session. The requests are set by a
+// controller from any thread, and are checked by the reconstruction loop once per iteration, through atomic flags.
+// The cancel request applies to the current run, or to the next run if no run is in progress, and is cleared when the
+// run ends. The pause request holds the loop until resume or cancel is requested.
+class RunControl
+{
+private:
+    std::atomic<bool> cancel_flag;
+    std::atomic<bool> pause_flag;
+    std::mutex mtx;
+    std::condition_variable resumed;
+
+public:
+    RunControl();
+
+    void Cancel();
+    void Pause();
+    void Resume();
+    bool IsPaused();
+
+    // Clears the cancel request. Called when the run ends.
+    void ClearCancel();
+
+    // This method is called by the reconstruction loop at the beginning of each iteration. It blocks while the run is
+    // paused. Returns true if the run is cancelled.
+    bool CheckPoint();
+};
+
+#endif /* control_hpp */
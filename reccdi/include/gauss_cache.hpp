@@ -0,0 +1,58 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+#ifndef gauss_cache_hpp
+#define gauss_cache_hpp
+
+#include "vector"
+#include "list"
+#include "map"
+#include "tuple"
+#include "atomic"
+#include "arrayfire.h"
+#include "common.h"
+
+// This class keeps Gaussian distribution grids on the device, so the grids used repeatedly by shrink wrap and low
+// resolution are calculated once. A grid is identified by its dimensions, sigmas, alpha, and type. The cache holds
+// a limited number of grids; when the limit is reached the least recently used grid is evicted.
+// The cache is owned by the Manager and shared by consecutive reconstructions in the session. It is not thread safe,
+// the session serializes the calls. The statistics are kept in atomic counters, so they can be read while a
+// reconstruction runs.
+class GaussCache
+{
+private:
+    // dimensions, sigmas, alpha, and type
+    typedef std::tuple<dim_t, dim_t, dim_t, dim_t, std::vector<d_type>, int, int> gauss_key;
+    typedef std::pair<gauss_key, af::array> gauss_entry;
+
+    // maximum number of grids kept
+    uint capacity;
+    // entries ordered from the most to the least recently used
+    std::list<gauss_entry> entries;
+    std::map<gauss_key, std::list<gauss_entry>::iterator> index;
+    std::atomic<unsigned long> hits;
+    std::atomic<unsigned long> misses;
+    std::atomic<uint> size;
+
+public:
+    GaussCache(uint capacity);
+    ~GaussCache();
+
+    // Returns Gaussian distribution grid normalized to sum 1, as Utils::GaussDistribution. The grid is calculated
+    // for one member and repeated for each member of a batch stacked along the fourth dimension of data_dim.
+    af::array Get(uint nD, const af::dim4 data_dim, const d_type *sigmas, int alpha, af::dtype type);
+
+    // Removes all grids, i.e. when the device memory is needed.
+    void Clear();
+
+    // Returns number of lookups that found the grid in the cache.
+    unsigned long GetHits();
+    // Returns number of lookups that calculated the grid.
+    unsigned long GetMisses();
+    // Returns number of grids in the cache.
+    uint GetSize();
+};
+
+#endif /* gauss_cache_hpp */
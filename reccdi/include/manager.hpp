@@ -9,74 +9,161 @@ See LICENSE file.
 
 #include "vector"
 #include "string"
+#include "map"
+#include "mutex"
+#include "arrayfire.h"
 #include "common.h"
+#include "progress.hpp"
+#include "control.hpp"
+#include "gauss_cache.hpp"
 
 class Reconstruction;
-
+class Params;
+
+// The Manager keeps a reconstruction session. The session is initialized once with the device, data and configuration,
+// and then any number of reconstructions can be run on the resident data. The device context, the parsed parameters,
+// the data array, and the ArrayFire FFT plans are kept alive between the runs, so a consecutive run, for example the
+// next GA generation, starts without setup and data transfer.
+// Each Manager keeps its own state, so multiple Managers can run reconstructions concurrently in threads. The methods
+// of one Manager are serialized by the session mutex.
 class Manager
 {
 private:
-    // A worker instance managed by the Manager
+    // A worker instance managed by the Manager, it is replaced with each run
     Reconstruction *rec;
     int error_code;
+    // device id set in Init; ArrayFire keeps the active device per thread, so it is set again in each run
+    int device_id;
+    // serializes calls on this session
+    std::mutex session_mtx;
+    // iteration records of the runs in this session; it is read without the session lock while a run is in progress
+    ProgressStream progress;
+    // cancel and pause requests; they are set without the session lock while a run is in progress
+    RunControl control;
+    // Gaussian grids used by support and low resolution, kept between the runs
+    GaussCache gauss_cache;
+
+    // checkpoint file for the runs in this session, empty if not checkpointing
+    std::string checkpoint_file;
+
+    // configuration parameters and data dimensions of this session
+    std::map<std::string, std::string> config;
+    std::vector<int> dim;
+    // the abs of data, resident on the device
+    af::array data;
+    // parameters parsed for the first run and for the continuation runs, mapped by the first flag
+    std::map<bool, Params *> params_map;
+
+    // Returns parameters for the first or continuation run, parsing the configuration only once for each case.
+    Params * GetParams(bool first);
+
+    // Copies the data buffer into the resident data array.
+    void UploadData(const double *data_buffer);
+
+    // Makes the session device active in the calling thread.
+    void ActivateDevice();
+
+    // Runs iterations of the current reconstruction and sets the error code.
+    void Iterate();
+
+    // Reports the exception thrown by the engine, sets the error code to -6 and drops the current reconstruction.
+    void SetFailed(const std::exception & e);
 
 public:
     Manager();
     ~Manager();
-    // This method starts calculations. The Manager uses workers to perform the calculations. The parameters define
-    // calculations type.
-    // This method takes data, real and imaginary guess for the reconstruction algorithm. The dim parameter conveys the
-    // data and guess dimensions, since the data and guess are passed in a c-like buffer.
-    // The config parameter defines configuration file.
-    void StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> dim, const std::string & config);
-
-    void StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> support, std::vector<int> dim, const std::string & config);
-
-    void StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> support, std::vector<int> dim, std::vector<d_type> coh, std::vector<int> coh_dim, const std::string & config);
-
-    // This method starts calculations. The Manager uses workers to perform the calculations. The parameters define
-    // calculations type.
-    // This method takes data, for the reconstruction algorithm. To perform the reconstruction the code will generate 
-    // the guess parameter. The dim parameter conveys data dimensions, since the data is passed in a c-like buffer.
-    // The config parameter defines configuration file.
-    void StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config);
-
-    // This method starts calculations. The Manager uses workers to perform the calculations. The parameters define
-    // calculations type. 
-    // This method is aimed for multi-threaded calculations. User defines number of threads through parameter.
-    // This method takes data, for the reconstruction algorithm. To perform the reconstruction the code will generate 
-    // the guess parameter. The dim parameter conveys data dimensions, since the data is passed in a c-like buffer.
-    // The config parameter defines configuration file.
-   // void StartCalc(std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config);
-
-    // This method returns calculation results. The returned buffer contains a real part of reconstructed image.
-    std::vector<d_type> GetImageR();
- 
-    // This method returns calculation results. The returned buffer contains a imaginary part of reconstructed image.
-    std::vector<d_type> GetImageI();
- 
+
+    // This method initializes the session. It sets the device, verifies the configuration and copies the data
+    // into ArrayFire array. The dim parameter conveys the data dimensions, since the data is passed in a c-like buffer.
+    // The config parameter maps configuration parameter names to values.
+    void Init(int device, const double *data_buffer, std::vector<int> dim, const std::map<std::string, std::string> & config);
+
+    // This method replaces the resident data with new data of the same dimensions, i.e. when the data is modified
+    // between runs.
+    void SetData(const double *data_buffer);
+
+    // This method runs reconstruction on the resident data. The Manager uses workers to perform the calculations.
+    // If the guess buffer is NULL the code will generate the guess and the run is considered to be the first run.
+    // Otherwise the guess buffer holds complex guess as interleaved real and imaginary parts. The support and coherence
+    // buffers are optional (may be NULL); if given, they hold the initial support and coherence of coh_dim dimensions.
+    // The batch_size defines number of images reconstructed together; the guess and support buffers then hold the
+    // images of all members, one after another. Partial coherence is not supported in batch.
+    void Run(const double *guess_buffer, const int *support_buffer, const double *coh_buffer, std::vector<int> coh_dim, int batch_size);
+
+    // Sets the file where the reconstruction state is saved every "checkpoint_interval" iterations.
+    void SetCheckpoint(const std::string & file);
+
+    // This method resumes the reconstruction saved in the checkpoint file. The reconstruction continues from the
+    // iteration the checkpoint was written at, with the same triggers, and produces the same results as Run.
+    void ResumeCheckpoint(const std::string & file);
+
+    // Returns the iteration records written since the previous call. It can be called from another thread while the
+    // reconstruction runs.
+    std::vector<progress_record> GetProgress();
+
+    // Cancel, pause and resume the reconstruction in progress. These can be called from another thread while the
+    // reconstruction runs. A cancel request made when no reconstruction runs applies to the next run.
+    void Cancel();
+    void Pause();
+    void Resume();
+    bool IsPaused();
+
+    // Returns statistics of the Gaussian grid cache: number of hits, number of misses, and number of cached grids.
+    // It does not wait for a running reconstruction.
+    std::vector<unsigned long> GetGaussCacheStats();
+
+    // The getters below return empty results, and the copy methods leave the buffers unchanged, if no reconstruction
+    // was run, i.e. the run or the checkpoint resume failed before the reconstruction started.
+
+    // Returns true if the reconstruction was run in single precision.
+    bool IsSinglePrecision();
+
+    // This method returns dimensions of the reconstructed image. In batch mode the last dimension is the batch size.
+    std::vector<int> GetImageDims();
+
+    // This method copies the reconstructed image into the given c-like buffer in one pass. The buffer holds complex
+    // numbers as interleaved real and imaginary parts, in double precision, or in single precision if single is true.
+    void GetImage(void *image_buffer, bool single);
+
     // This method returns calculation results. The returned vector contains error values for each iteration.
     std::vector<d_type> GetErrors();
- 
-    // This method returns final support array.
-    std::vector<float> GetSupportV();
 
-    // This method returns final coherence array.
-    std::vector<d_type> GetCoherenceV();
+    // This method copies the final support array into the given buffer of unsigned chars.
+    void GetSupport(unsigned char *support_buffer);
+
+    // Returns true if the image was averaged, i.e. the variance map is available.
+    bool HasVariance();
 
-    // This method returns last amplitudes in reciprocal space. The returned buffer contains the real part.
-    std::vector<d_type> GetReciprocalR();
+    // This method copies the per voxel variance of the image amplitudes over the averaging iterations into the
+    // given buffer. The buffer has the image dimensions and holds doubles, or floats if single is true.
+    void GetVariance(void *variance_buffer, bool single);
 
-    // This method returns last amplitudes in reciprocal space. The returned buffer contains the imaginary part.
-    std::vector<d_type> GetReciprocalI();
+    // This method returns dimensions of the final coherence array, or empty vector if partial coherence is not active.
+    std::vector<int> GetCoherenceDims();
+
+    // This method copies the final coherence array into the given buffer of doubles.
+    void GetCoherence(double *coh_buffer);
+
+    // This method copies the last amplitudes in reciprocal space into the given buffer. The buffer layout is the
+    // same as the image buffer.
+    void GetReciprocal(void *reciprocal_buffer, bool single);
 
     // This method returns flow vector, i.e the actins that were used.
     std::vector<int> GetFlowV();
 
     // This method returns 2D flow array (flow x iterations).
     std::vector<int> GetIterFlowV();
+
+    // This method returns statistics of the last run mapped by name: "gc_count", number of garbage collections, and
+    // "stop_iteration", the iteration after which the convergence rules skipped to the final ER block, or -1.
+    std::map<std::string, double> GetRunStats();
+
+    // This method returns 2D array (flow x iterations) of bytes allocated on the device by the flow items, or empty
+    // vector if the allocations were not reported.
+    std::vector<long long> GetAllocReport();
     
-    // Returns True if the reconstruction was successful, i.e. no exception happened.
+    // Returns the error code of the last call, 0 if the reconstruction was successful, -6 if the engine threw an
+    // exception; the exception is reported on the console and the reconstruction is dropped.
     int IsSuccess();
 };
 
@@ -19,6 +19,10 @@ class Params
 private:
     // number of dimensions taken from input array dims
     uint nD;
+    // true if the device arrays are single precision
+    bool is_single;
+    // true if the device arrays are single precision and the reductions are accumulated in double precision
+    bool is_mixed;
     // maps algorithm name to algorithm number
     std::map<std::string, int> algorithm_id_map;
     // vector holding algorithm run sequence, where algorithm run is a pair of algorithm and number of iterations
@@ -50,6 +54,27 @@ private:
 
     bool plot_errors;
 
+    // number of iterations between checkpoints, 0 if not checkpointing
+    int checkpoint_interval;
+
+    // garbage collection policy, and the unused memory limits in bytes and as fraction of allocated memory
+    int gc_policy;
+    size_t gc_threshold;
+    float gc_fraction;
+
+    // if true, the bytes allocated on the device by each flow item are recorded
+    bool alloc_report;
+
+    // number of iterations between the read backs of errors and NaN check from the device
+    int error_readback_interval;
+
+    // convergence rules; the reconstruction skips to the final ER block when the relative error improvement over the
+    // window of iterations is below the epsilon, or when the support did not change for the number of shrink wrap
+    // updates. The rules with zero window or updates are not used.
+    int convergence_window;
+    d_type convergence_epsilon;
+    int convergence_support_updates;
+
     bool is_resolution;
 
     int low_res_iterations;
@@ -75,8 +100,9 @@ private:
     std::vector<std::string> ParseList(std::string s);
     
 public:
-    // Constructor. Takes in configuration file, parses the configuration and sets the parameters accordingly.
-    Params(std::string const & config_file, std::vector<int> data_dim, bool first);
+    // Constructor. Takes in configuration parameters map, parses the values and sets the parameters accordingly.
+    // The map is built in python (see utils.get_fast_module_params) and holds a string value for each parameter.
+    Params(std::map<std::string, std::string> const & config_map, std::vector<int> data_dim, bool first);
     ~Params();
 
     // Returns number of dimensions of the data array
@@ -85,6 +111,17 @@ public:
     // returns data type (float/double). Used by python code
     std::string GetDataType();
 
+    // Returns true if the reconstruction runs in single precision, i.e. on f32/c32 arrays.
+    bool IsSinglePrecision();
+
+    // Returns true for the "mixed" precision, where the arrays are f32/c32 and the norms, errors and support
+    // maxima are accumulated in f64.
+    bool IsMixedPrecision();
+
+    // Returns true if the norms, errors and support maxima are accumulated in double precision, i.e. for the
+    // "double" and "mixed" precision.
+    bool IsDoubleReduction();
+
     // Returns number of all iterations. It is calculated from the "algorithm_sequence" parameter.
     int GetNumberIterations();
 
@@ -129,6 +166,34 @@ public:
     // Returns boolean flag indication whether to plot errors in during calculations
     bool IsPlotErrors();
 
+    // Returns number of iterations between checkpoints, 0 if checkpoints are not configured.
+    int GetCheckpointInterval();
+
+    // Returns garbage collection policy, one of GC_ALWAYS, GC_THRESHOLD, GC_FRACTION, GC_NEVER.
+    int GetGcPolicy();
+
+    // Returns number of unused bytes that triggers garbage collection with GC_THRESHOLD policy.
+    size_t GetGcThreshold();
+
+    // Returns fraction of the allocated memory that, if unused, triggers garbage collection with GC_FRACTION policy.
+    float GetGcFraction();
+
+    // Returns true if the bytes allocated by the flow items should be recorded.
+    bool IsAllocReport();
+
+    // Returns number of iterations the errors are accumulated on the device before they are read back, 1 by default.
+    int GetErrorReadbackInterval();
+
+    // Returns number of iterations over which the error improvement is checked, 0 if the rule is not used.
+    int GetConvergenceWindow();
+
+    // Returns relative error improvement over the window below which the reconstruction converged.
+    d_type GetConvergenceEpsilon();
+
+    // Returns number of consecutive shrink wrap updates without support change after which the reconstruction
+    // converged, 0 if the rule is not used.
+    int GetConvergenceSupportUpdates();
+
     std::vector<int> GetUsedFlowSeq();
 //    int* GetFlowArray();
     std::vector<int> GetFlowArray();
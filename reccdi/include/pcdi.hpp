@@ -18,32 +18,49 @@ class PartialCoherence
 {
 private:
     Params * params;
+    // type the normalization sums are accumulated in; f64 for the double and mixed precision
+    af::dtype reduce_type;
     std::vector<int> roi;
     int algorithm;
     bool normalize;
     int iteration_num;
     
     af::array kernel_array;
+    // dimensions of the transforms applying the coherence, at least the data plus kernel size minus one, and the
+    // spectrum of the kernel padded to them, calculated when the kernel changes
+    af::dim4 apply_dims;
+    af::array kernel_spectrum;
+    // dimensions of the Lucy deconvolution transforms, and spectra of the squared roi data and of its mirror
+    af::dim4 lucy_dims;
+    af::array data_spectrum;
+    af::array data_mirror_spectrum;
     af::array roi_amplitudes_prev;
     af::array roi_data_abs;
     d_type sum_roi_data;
     af::dim4 roi_dims;
     af::dim4 dims;
     
-    void DeconvLucy(af::array image, af::array filter, int iter_num);
+    void DeconvLucy(af::array image, int iter_num);
     void OnTrigger(af::array abs_image);
     void TuneLucyCoherence(af::array);
     int GetAlgorithm();
     std::vector<int> GetRoi();
-    af::array fftConvolve(af::array arr, af::array kernel);
+    // Returns spectrum of the kernel zero padded to the fft dimensions, with the kernel center moved to the origin.
+    af::array KernelSpectrum(const af::array & kernel, af::dim4 fft_dims);
+    // Returns convolution of the array with the kernel given by its spectrum. The array is zero padded to the spectrum
+    // dimensions, and the result is cropped to the array dimensions.
+    af::array SpectrumConvolve(const af::array & arr, const af::array & kernel_spectrum);
 
 public:
     PartialCoherence(Params *params, af::array coherence_array);
     ~PartialCoherence();
     void Init(af::array data);
-    void SetPrevious(af::array abs_amplitudes);
-    af::array ApplyPartialCoherence(af::array abs_image);
-    void UpdatePartialCoherence(af::array abs_image);
+    void SetPrevious(const af::array & abs_amplitudes);
+    // The previous amplitudes are saved in checkpoint and restored when resuming.
+    af::array GetPreviousArray();
+    void RestorePrevious(af::array roi_amplitudes);
+    af::array ApplyPartialCoherence(const af::array & abs_image);
+    void UpdatePartialCoherence(const af::array & abs_image);
     af::array GetKernelArray();
 };
 
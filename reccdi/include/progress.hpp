@@ -0,0 +1,51 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+#ifndef progress_hpp
+#define progress_hpp
+
+#include "vector"
+#include "atomic"
+#include "common.h"
+
+// a record of one completed iteration
+typedef struct progress_record
+{
+    int iteration;
+    // error in this iteration, average of the members if running batch
+    d_type error;
+    // id of the algorithm active in this iteration
+    int algorithm;
+    // the flow items executed in this iteration, bit i is set if the flow_def[i] item was executed
+    unsigned int flow;
+    // wall time of the iteration in seconds; if the errors are read back every few iterations, it is the average
+    // time of the iterations since the previous read back
+    d_type time;
+} progress_record;
+
+// This class is a ring buffer streaming the iteration records from the reconstruction loop to the controller.
+// There is one writer, the reconstruction loop, and one reader, i.e. a controller thread polling the stream while the
+// reconstruction runs. Neither side takes a lock, so the writer is never blocked by the reader.
+// If the reader does not keep up, the oldest records are overwritten and skipped by the reader.
+class ProgressStream
+{
+private:
+    std::vector<progress_record> records;
+    // number of records written since the stream was created
+    std::atomic<unsigned long> written;
+    // number of records consumed by the reader
+    std::atomic<unsigned long> consumed;
+
+public:
+    ProgressStream(int capacity);
+
+    // Adds a record to the stream. Called by the reconstruction loop after each iteration.
+    void Write(int iteration, d_type error, int algorithm, unsigned int flow, d_type time);
+
+    // Returns the records written since the previous read.
+    std::vector<progress_record> Read();
+};
+
+#endif /* progress_hpp */
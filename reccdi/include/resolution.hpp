@@ -9,11 +9,9 @@ See LICENSE file.
 
 #include "vector"
 #include "common.h"
+#include "arrayfire.h"
 
 class Params;
-namespace af {
-    class array;
-}
 
 // This class encapsulates low resolution data operations.
 class Resolution
@@ -22,6 +20,15 @@ private:
     std::vector<float> dets;
     std::vector<float> sigmas;
     uint nD;
+    // the iteration whose det defines the mask used in each iteration
+    std::vector<int> mask_source;
+    // the current mask and the iteration it was calculated for
+    af::array mask;
+    int mask_iter;
+
+    // Returns Gaussian mask normalized to maximum 1 for the given det. The mask is a product of 1D Gaussian lines
+    // in each dimension, in the frame of the data, i.e. with the maximum in the first element.
+    af::array GetMask(d_type det, const af::dim4 data_dim, af::dtype type);
 
 public:
     Resolution(Params *params);
@@ -29,8 +36,11 @@ public:
     // Needs destructor to free allocated memory.
     ~Resolution();
     
-    // Returns resolution based on iteration
+    // Returns the data masked for the iteration. The mask is calculated only when the det changed by more than
+    // RESOLUTION_DET_TOLERANCE since the mask was calculated.
     af::array GetIterData(int iter, af::array data);
+    // Returns the level of the iteration. The iterations of the same level use the same mask.
+    int GetIterLevel(int iter);
     float GetIterSigma(int iter);
 };
 
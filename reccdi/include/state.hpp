@@ -37,6 +37,8 @@ private:
     int current_alg;
     // current index of index switches vector
     int alg_switch_index;
+    // iteration at which the next algorithm starts
+    int switch_iter;
 
 public:
     // Constructor. Takes pointer to the Param object. Uses the Param object to set the initial values.
@@ -70,6 +72,22 @@ public:
     
     // Returns vector containing errors
     std::vector<d_type> GetErrors();
+
+    // Returns number of recorded errors, and the error at the given index; used to check convergence without copying
+    // the errors.
+    int GetNumberErrors();
+    d_type GetError(int index);
+
+    // Returns index of the current algorithm switch. Used when saving checkpoint.
+    int GetAlgSwitchIndex();
+
+    // Skips the iterations before the final ER block of the algorithm sequence, so the next iteration starts the block.
+    // If the sequence does not end with ER, the next iteration ends the reconstruction. Returns false if the current
+    // iteration is already in the final block, and nothing is skipped.
+    bool SkipToFinal();
+
+    // Restores the state saved in checkpoint, so the next iteration continues the interrupted sequence.
+    void Restore(int iteration, int switch_index, std::vector<d_type> saved_errors);
 };
 
 
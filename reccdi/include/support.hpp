@@ -13,11 +13,17 @@ See LICENSE file.
 using namespace af;
 
 class Params;
+class GaussCache;
 
 class Support
 {
 private:
     Params * params;
+    // type the sums and maxima are accumulated in; f64 for the double and mixed precision
+    af::dtype reduce_type;
+    // cache of Gaussian grids owned by the Manager
+    GaussCache * gauss_cache;
+    // Gaussian grid for the last sigma, used by the shrink wrap convolution
     af::array distribution;   
     float threshold;
     float sigma;
@@ -26,14 +32,15 @@ private:
     d_type last_sigma;
     af::array support_array;
 //    af::array init_support_array;
-    af::array GaussConvFft(af::array ds_image);
-    af::array GetDistribution(const af::dim4 data_dim, d_type sigma);  
+    af::array GaussConvFft(const af::array & ds_image);
+    af::array GetDistribution(const af::dim4 data_dim, d_type sigma, af::dtype type);
 
 public:
-    Support(const af::dim4 data_dim, Params *params, af::array support_array);
+    Support(const af::dim4 data_dim, Params *params, af::array support_array, GaussCache *gauss_cache);
     ~Support();
-    void UpdateAmp(const af::array ds_image, d_type sig, int iter);
-    void UpdatePhase(const af::array ds_image, int iter);
+    // The update methods read the image and do not modify it, so they take references to the current image.
+    void UpdateAmp(const af::array & ds_image, d_type sig, int iter);
+    void UpdatePhase(const af::array & ds_image, int iter);
     int GetTriggerAlgorithm();
     float GetThreshold();
     af::array GetSupportArray();
@@ -10,11 +10,7 @@ See LICENSE file.
 #include "common.h"
 #include "vector"
 #include "string"
-
-namespace af {
-    class array;
-    class dim4;
-}
+#include "arrayfire.h"
 
 class Utils
 {
@@ -36,10 +32,19 @@ public:
     static af::array CenterCropCenter(af::array arr, af::dim4 roi);
     static af::array Crop(af::array data, af::dim4 roi);
 
+    // The shifts apply to the first three dimensions only; the fourth dimension holds members of a batch.
     static af::array fftshift(af::array arr);
     static af::array ifftshift(af::array arr);
     static af::array fft(af::array arr, uint nD);
     static af::array ifft(af::array arr, uint nD);
+    // Transforms with the result multiplied by the scale. The inverse transform is not normalized otherwise, so the
+    // normalization is applied in the same pass.
+    static af::array fft(af::array arr, uint nD, d_type scale);
+    static af::array ifft(af::array arr, uint nD, d_type scale);
+    // In-place transforms with the result multiplied by the scale. The array must not share its data with another
+    // array, i.e. it should be a result of a calculation, not an assigned copy.
+    static void FftInPlace(af::array & arr, uint nD, d_type scale);
+    static void IfftInPlace(af::array & arr, uint nD, d_type scale);
 
     // This method takes a 3D array, and dimensions of sub-array. It is assumed that the dimensions do not extend array
     // dimensions.
@@ -65,7 +70,8 @@ public:
     static af::array CenterMax(af::array arr);
 
     static void GetMaxIndices(af::array arr, int* indices);
-    static af::array GaussDistribution(uint nD, const af::dim4, d_type *, int);
+    // Returns Gaussian distribution grid of the given type (f32 or f64), normalized to sum 1.
+    static af::array GaussDistribution(uint nD, const af::dim4, const d_type *, int, af::dtype type);
 
     // pads symmetrically around array arr to the size on new_dims with the constant value pad
     static af::array PadAround(af::array arr, af::dim4 new_dims, d_type pad);
@@ -73,6 +79,19 @@ public:
 
     static af::array GetRatio(af::array, af::array );
     static bool IsNullArray(af::array);
+
+    // Reductions over the first three dimensions. The result has one value for each member of a batch stacked along
+    // the fourth dimension, i.e. the result dimensions are (1, 1, 1, batch size).
+    static af::array MemberSum(af::array arr);
+    // Member sum accumulated in the given type. The conversion is fused with the reduction, so the array is not
+    // copied.
+    static af::array MemberSum(af::array arr, af::dtype type);
+    static af::array MemberMax(af::array arr);
+    // Expands the values returned by member reductions to the given dimensions, so they can be applied element-wise.
+    static af::array ToMemberDims(af::array member_values, af::dim4 dims);
+    // Returns number of bytes allocated on the active device by the ArrayFire memory manager, including the buffers
+    // released to the manager and kept for reuse.
+    static size_t GetAllocatedBytes();
     static std::string GetFullFilename(const char * dir, const char * filename);
     static std::vector<float> Linspace(int iter, float start_val, float end_val);
 
@@ -10,6 +10,7 @@ See LICENSE file.
 #include "stdio.h"
 #include "vector"
 #include "map"
+#include "string"
 #include "arrayfire.h"
 #include "common.h"
 
@@ -18,15 +19,21 @@ class State;
 class Support;
 class PartialCoherence;
 class Resolution;
+class ProgressStream;
+class RunControl;
+class GaussCache;
 
 using namespace af;
 
 // This class represents a single image phase reconstruction processing.
 // It constructs the following objects:
 // 1. Params, which is initialized from configuration file, and keeps the attributes that do not change during processing.
+//    The Params object is owned by the Manager and can be shared by consecutive reconstructions.
 // 2. State, which keeps the variables that mutate during processing.
 // The class does calculations defined by the configuration file. The result of the calculation is an image that is a close
 // match to the reciprocal space data in the opposite space.
+// The reconstruction can run a batch of images stacked along the fourth dimension of the guess array. The members of the
+// batch are reconstructed independently on the same data, using batched FFTs. Each member has its own support and errors.
 
 class Reconstruction
 {
@@ -34,8 +41,10 @@ typedef void (Reconstruction::*fp)(void);
 
 private:
 
-    // Params object constructed by the Reconstruction class
+    // Params object owned by the Manager
     Params *params;
+    // type the norms and errors are accumulated in; f64 for the double and mixed precision
+    af::dtype reduce_type;
     // State object constructed by the Reconstruction class
     State *state;
     // A reference to Support object
@@ -44,37 +53,119 @@ private:
     PartialCoherence *partialCoherence;
     // A reference to Resolution
     Resolution *resolution;
+    // A reference to progress stream owned by the Manager, may be NULL
+    ProgressStream *progress;
+    // A reference to cancel/pause requests owned by the Manager, may be NULL
+    RunControl *control;
 
     af::array data;   // this is abs
     af::array iter_data;  // if low resolution is used, data will differ in iterations
+    // norms of the data members, and of the iter_data members
+    af::array data_norms;
+    af::array iter_data_norms;
+    // the resolution level requested for the current iteration and the level of iter_data; -1 denotes full data,
+    // otherwise the level identifies the low resolution mask
+    int iter_level;
+    int iter_data_level;
+    // iteration at which the resolution trigger requested the current level
+    int resolution_iter;
     d_type sig;
     d_type current_error;
+    // number of points in one member of the batch
     int num_points;
+    // number of images reconstructed in this batch
+    int batch_size;
     d_type norm_data;
     int current_iteration;
     af::array ds_image;
     af::array ds_image_raw;
     af::array rs_amplitudes;
     int aver_iter;
-    std::vector<d_type> aver_v;
-    std::vector<float> support_vector;
-    std::vector<d_type> coherence_vector;
+    // running sums of the image amplitudes and of their squares over the averaging iterations
+    af::array aver_sum;
+    af::array aver_sq_sum;
+    // variance of the amplitudes over the averaging iterations, calculated at the end of the run
+    af::array variance;
+    // mask applied by the twin trigger, created at the first trigger
+    af::array twin_mask;
     std::vector<std::vector<fp> > iter_flow;
+    // number of garbage collections done in the run
+    int gc_count;
+    // index in the used flow of the flow items executed in each iteration
+    std::vector<std::vector<int> > iter_flow_item;
+    // bytes allocated on the device by each flow item in each iteration, (flow x iterations), empty if not reported
+    std::vector<long long> alloc_bytes;
+    // flow items executed in each iteration as bits, reported in progress
+    std::vector<unsigned int> iter_flow_mask;
+    // true if this is the first run, i.e. the flow uses the first run triggers
+    bool first_run;
+    // number of iterations between the read backs of errors and NaN flag from the device
+    int readback_interval;
+    // errors of the current iteration, one for each member
+    af::array iter_errors;
+    // errors of the iterations since the last read back, a column for each iteration, and the NaN flag of the images
+    af::array pending_errors;
+    af::array nan_found;
+    // iterations and algorithms of the pending errors
+    std::vector<int> pending_iters;
+    std::vector<int> pending_algs;
+    // true for the pending iterations that print the progress on the console, set by the progress trigger
+    std::vector<bool> pending_prints;
+    bool print_progress;
+    // measures time between the read backs
+    af::timer readback_timer;
+    // number of consecutive shrink wrap updates that did not change the support, counted on the device and read back
+    // with the errors; used by the convergence rule on support
+    af::array support_unchanged;
+    int support_unchanged_updates;
+    // iteration after which the convergence rules skipped to the final ER block, -1 if the sequence ran in full
+    int stop_iteration;
+    // file the checkpoints are written to, no checkpoints if empty
+    std::string checkpoint_file;
 
     // mapping of algorithm id to an Algorithm method pointer
     std::map<int, fp> algorithm_map;
 
     // This method returns sum of squares of all elements in the array
     double GetNorm(af::array arr);
+
+    // This method returns sum of squares of elements for each member of the batch
+    af::array GetMemberNorms(af::array arr);
+
+    // Records the errors of all members in the current iteration. The errors are kept on the device until the
+    // read back.
+    void RecordErrors(af::array member_errors);
+
+    // Adds the errors of the current iteration to the pending errors, and accumulates the NaN check of the image.
+    void AddPending();
+
+    // Copies the pending errors and the NaN flag to the host in one transfer, records the errors, and writes the
+    // progress records of the pending iterations. Returns false if the image had NaN element.
+    bool ReadBack();
+
+    // Returns true if the read back errors or support updates meet one of the configured convergence rules. The
+    // error rule is met when the error of each member did not increase and its relative improvement over the window is
+    // below epsilon. The rules are not checked while HIO runs.
+    bool IsConverged();
+
+    // Runs the i-th flow item of the current iteration and records the bytes it allocated on the device.
+    void RunReportingAlloc(int i);
+
+    // Writes the reconstruction state after the current iteration into the checkpoint file. The file is written
+    // under a temporary name and then renamed, so a run interrupted while writing keeps the previous checkpoint.
+    void SaveCheckpoint();
     
     // This method calculates ratio of amplitudes and correction arrays replacing zero divider with 1.
     af::array GetRatio(af::array ar, af::array correction);
 
-    // vectorize support array at the end of iterations
-    void VectorizeSupport();
+    // Applies the modulus constraint to rs_amplitudes and records the errors. The amplitudes are the modeled
+    // amplitudes, and the mask selects the elements included in the error. The error, ratio, and update are
+    // evaluated in two passes over the arrays.
+    void ModulusProjection(af::array amplitudes, af::array mask);
 
-    // vectorize coherence array at the end of iterations
-    void VectorizeCoherence();
+    // Sets iter_data and its norms for the resolution level requested in the current iteration. The data and norms
+    // are calculated only when the level changes.
+    void UpdateIterData();
 
     d_type CalculateError();
  
@@ -102,8 +193,10 @@ private:
 public:
     // The class constructor takes data array, an image guess array in reciprocal space, and configuration file. The image guess
     // is typically generated as an complex random array. This image can be also the best outcome of previous calculations. The
-    // data is saved and is used for processing. 
-    Reconstruction(af::array data, af::array guess, Params* params, af::array support_array, af::array coherence_array);
+    // data is saved and is used for processing. The progress stream, if not NULL, receives a record after each iteration.
+    // The run control, if not NULL, is checked at each iteration for cancel and pause requests.
+    // The Gaussian grids used by support are taken from the gauss_cache owned by the Manager.
+    Reconstruction(af::array data, af::array guess, Params* params, af::array support_array, af::array coherence_array, ProgressStream *progress, RunControl *control, GaussCache *gauss_cache);
     
     ~Reconstruction();
     
@@ -121,16 +214,34 @@ public:
     // been completed (i.e. the code reached last state), and true otherwise. Typically this method will be run in a while loop.
     int Iterate();
 
+    // Sets the file the checkpoints are written to. The checkpoints are written every number of iterations defined by
+    // the "checkpoint_interval" parameter.
+    void SetCheckpoint(std::string file);
+
+    // Restores the reconstruction state from checkpoint file. It is called after Init, with the Reconstruction
+    // constructed from the image, support and coherence saved in the checkpoint. The next Iterate continues after the
+    // iteration the checkpoint was saved at, with the same triggers.
+    void Restore(std::string file);
+
     af::array GetImage();
     af::array GetSupportArray();
+    // Returns variance of the image amplitudes over the averaging iterations, or empty array if averaging was not
+    // active.
+    af::array GetVarianceArray();
     af::array GetCoherenceArray();
+    // Returns errors by iterations. If the batch has multiple members, the errors of all members are recorded for each
+    // iteration, i.e. the vector holds iterations x batch size values.
     std::vector<d_type>  GetErrors();
-    std::vector<float> GetSupportVector();
-    std::vector<d_type> GetCoherenceVector();
-    std::vector<d_type> GetCoherenceVectorR();
-    std::vector<d_type> GetCoherenceVectorI();
     std::vector<int> GetFlowVector();
     std::vector<int> GetIterFlowVector();
+    // Returns bytes allocated on the device by each flow item in each iteration, as 2D array (flow x iterations), or
+    // empty vector if "alloc_report" is not configured. The bytes are the growth of the memory allocated by the
+    // ArrayFire memory manager, so a buffer reused from the manager is not counted.
+    std::vector<long long> GetAllocReport();
+    // Returns number of garbage collections done by the garbage trigger.
+    int GetGcCount();
+    // Returns the iteration after which the convergence rules skipped to the final ER block, or -1.
+    int GetStopIteration();
 
     af::array GetReciprocal();
 };
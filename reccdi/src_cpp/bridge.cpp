@@ -15,72 +15,109 @@ Bridge::Bridge()
     mgr = new Manager();
 }
 
-void Bridge::StartCalcWithGuess(int device, std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> dim, const std::string & config)
+void Bridge::Init(int device, const double *data_buffer, std::vector<int> dim, const std::map<std::string, std::string> & config)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    std::vector<d_type> guess_i(guess_buffer_i.begin(), guess_buffer_i.end());
-    std::vector<d_type> guess_r(guess_buffer_r.begin(), guess_buffer_r.end());
-    mgr->StartCalc(device, data_r, guess_r, guess_i, dim, config);
+    mgr->Init(device, data_buffer, dim, config);
 }
 
-void Bridge::StartCalcWithGuessSupport(int device, std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> support_buffer, std::vector<int> dim, const std::string & config)
+void Bridge::SetData(const double *data_buffer)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    std::vector<d_type> guess_i(guess_buffer_i.begin(), guess_buffer_i.end());
-    std::vector<d_type> guess_r(guess_buffer_r.begin(), guess_buffer_r.end());
-    std::vector<int> support(support_buffer.begin(), support_buffer.end());
-    mgr->StartCalc(device, data_r, guess_r, guess_i, support, dim, config);
+    mgr->SetData(data_buffer);
 }
 
-void Bridge::StartCalcWithGuessSupportCoh(int device, std::vector<float> data_buffer_r, std::vector<float> guess_buffer_r, std::vector<float> guess_buffer_i, std::vector<int> support_buffer, std::vector<int> dim, std::vector<float> coh_buffer, std::vector<int> coh_dim, const std::string & config)
+void Bridge::Run(const double *guess_buffer, const int *support_buffer, const double *coh_buffer, std::vector<int> coh_dim, int batch_size)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    std::vector<d_type> guess_i(guess_buffer_i.begin(), guess_buffer_i.end());
-    std::vector<d_type> guess_r(guess_buffer_r.begin(), guess_buffer_r.end());
-    std::vector<int> support(support_buffer.begin(), support_buffer.end());
-    std::vector<d_type> coh(coh_buffer.begin(), coh_buffer.end());
-    mgr->StartCalc(device, data_r, guess_r, guess_i, support, dim, coh, coh_dim, config);
+    mgr->Run(guess_buffer, support_buffer, coh_buffer, coh_dim, batch_size);
 }
 
-void Bridge::StartCalc(int device, std::vector<float> data_buffer_r, std::vector<int> dim, std::string const & config)
+void Bridge::SetCheckpoint(const std::string & file)
 {
-    std::vector<d_type> data_r(data_buffer_r.begin(), data_buffer_r.end());
-    mgr->StartCalc(device, data_r, dim, config);
+    mgr->SetCheckpoint(file);
 }
 
-std::vector<d_type> Bridge::GetImageR()
+void Bridge::ResumeCheckpoint(const std::string & file)
 {
-    return mgr->GetImageR();
+    mgr->ResumeCheckpoint(file);
 }
 
-std::vector<d_type> Bridge::GetImageI()
+std::vector<progress_record> Bridge::GetProgress()
 {
-    return mgr->GetImageI();
+    return mgr->GetProgress();
 }
 
-std::vector<d_type> Bridge::GetErrors()
+void Bridge::Cancel()
 {
-    return mgr->GetErrors();
+    mgr->Cancel();
+}
+
+void Bridge::Pause()
+{
+    mgr->Pause();
+}
+
+void Bridge::Resume()
+{
+    mgr->Resume();
+}
+
+bool Bridge::IsPaused()
+{
+    return mgr->IsPaused();
+}
+
+std::vector<unsigned long> Bridge::GetGaussCacheStats()
+{
+    return mgr->GetGaussCacheStats();
+}
+
+bool Bridge::IsSinglePrecision()
+{
+    return mgr->IsSinglePrecision();
+}
+
+std::vector<int> Bridge::GetImageDims()
+{
+    return mgr->GetImageDims();
 }
 
-std::vector<float> Bridge::GetSupportV()
+void Bridge::GetImage(void *image_buffer, bool single)
 {
-    return mgr->GetSupportV();
+    mgr->GetImage(image_buffer, single);
 }
 
-std::vector<d_type> Bridge::GetCoherenceV()
+void Bridge::GetReciprocal(void *reciprocal_buffer, bool single)
 {
-    return mgr->GetCoherenceV();
+    mgr->GetReciprocal(reciprocal_buffer, single);
 }
 
-std::vector<d_type> Bridge::GetReciprocalR()
+void Bridge::GetSupport(unsigned char *support_buffer)
 {
-    return mgr->GetReciprocalR();
+    mgr->GetSupport(support_buffer);
 }
 
-std::vector<d_type> Bridge::GetReciprocalI()
+bool Bridge::HasVariance()
 {
-    return mgr->GetReciprocalI();
+    return mgr->HasVariance();
+}
+
+void Bridge::GetVariance(void *variance_buffer, bool single)
+{
+    mgr->GetVariance(variance_buffer, single);
+}
+
+std::vector<int> Bridge::GetCoherenceDims()
+{
+    return mgr->GetCoherenceDims();
+}
+
+void Bridge::GetCoherence(double *coh_buffer)
+{
+    mgr->GetCoherence(coh_buffer);
+}
+
+std::vector<d_type> Bridge::GetErrors()
+{
+    return mgr->GetErrors();
 }
 
 std::vector<int> Bridge::GetFlowV()
@@ -93,6 +130,16 @@ std::vector<int> Bridge::GetIterFlowV()
     return mgr->GetIterFlowV();
 }
 
+std::map<std::string, double> Bridge::GetRunStats()
+{
+    return mgr->GetRunStats();
+}
+
+std::vector<long long> Bridge::GetAllocReport()
+{
+    return mgr->GetAllocReport();
+}
+
 void Bridge::Cleanup()
 {
    delete mgr;
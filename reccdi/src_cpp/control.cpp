@@ -0,0 +1,52 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+#include "control.hpp"
+
+
+RunControl::RunControl() : cancel_flag(false), pause_flag(false)
+{
+}
+
+void RunControl::Cancel()
+{
+    std::lock_guard<std::mutex> lock(mtx);
+    cancel_flag.store(true, std::memory_order_release);
+    resumed.notify_all();
+}
+
+void RunControl::Pause()
+{
+    std::lock_guard<std::mutex> lock(mtx);
+    pause_flag.store(true, std::memory_order_release);
+}
+
+void RunControl::Resume()
+{
+    std::lock_guard<std::mutex> lock(mtx);
+    pause_flag.store(false, std::memory_order_release);
+    resumed.notify_all();
+}
+
+bool RunControl::IsPaused()
+{
+    return pause_flag.load(std::memory_order_acquire);
+}
+
+void RunControl::ClearCancel()
+{
+    cancel_flag.store(false, std::memory_order_release);
+}
+
+bool RunControl::CheckPoint()
+{
+    // the lock is taken only when paused, a running loop reads the flags only
+    if (pause_flag.load(std::memory_order_acquire))
+    {
+        std::unique_lock<std::mutex> lock(mtx);
+        resumed.wait(lock, [this]{ return !pause_flag.load() || cancel_flag.load(); });
+    }
+    return cancel_flag.load(std::memory_order_acquire);
+}
@@ -0,0 +1,80 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+#include "gauss_cache.hpp"
+#include "util.hpp"
+
+
+GaussCache::GaussCache(uint cache_capacity)
+{
+    capacity = cache_capacity;
+    hits = 0;
+    misses = 0;
+    size = 0;
+}
+
+GaussCache::~GaussCache()
+{
+    Clear();
+}
+
+af::array GaussCache::Get(uint nD, const af::dim4 data_dim, const d_type *sigmas, int alpha, af::dtype type)
+{
+    gauss_key key(data_dim[0], data_dim[1], data_dim[2], data_dim[3], std::vector<d_type>(sigmas, sigmas + nD), alpha, type);
+    std::map<gauss_key, std::list<gauss_entry>::iterator>::iterator found = index.find(key);
+    if (found != index.end())
+    {
+        hits++;
+        // move the entry to the front, it is the most recently used now
+        entries.splice(entries.begin(), entries, found->second);
+        return found->second->second;
+    }
+
+    misses++;
+    af::dim4 member_dim = data_dim;
+    member_dim[3] = 1;
+    af::array dist = Utils::GaussDistribution(nD, member_dim, sigmas, alpha, type);
+    if (data_dim[3] > 1)
+    {
+        dist = tile(dist, 1, 1, 1, data_dim[3]);
+    }
+    dist.eval();
+
+    if (capacity == 0)
+    {
+        return dist;
+    }
+    if (entries.size() >= capacity)
+    {
+        index.erase(entries.back().first);
+        entries.pop_back();
+    }
+    entries.push_front(gauss_entry(key, dist));
+    index[key] = entries.begin();
+    size = entries.size();
+    return dist;
+}
+
+void GaussCache::Clear()
+{
+    index.clear();
+    entries.clear();
+    size = 0;
+}
+
+unsigned long GaussCache::GetHits()
+{
+    return hits;
+}
+
+unsigned long GaussCache::GetMisses()
+{
+    return misses;
+}
+
+uint GaussCache::GetSize()
+{
+    return size;
+}
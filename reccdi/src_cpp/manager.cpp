@@ -5,7 +5,6 @@ See LICENSE file.
 // Created by Barbara Frosik
 
 #include "stdexcept"
-#include "typeinfo"
 #include "arrayfire.h"
 #include "worker.hpp"
 #include "manager.hpp"
@@ -13,31 +12,61 @@ See LICENSE file.
 #include "parameters.hpp"
 #include "common.h"
 #include "unistd.h"
+#include "random"
 
 using namespace af;
 
-Manager::Manager()
+Manager::Manager() : progress(PROGRESS_CAPACITY), gauss_cache(GAUSS_CACHE_CAPACITY)
 {
     error_code = 0;
+    device_id = -1;
+    rec = NULL;
 }
 
 
 Manager::~Manager()
 {
-    delete rec;
+    if (rec != NULL)
+    {
+        delete rec;
+    }
+    for (std::map<bool, Params *>::iterator it = params_map.begin(); it != params_map.end(); ++it)
+    {
+        delete it->second;
+    }
+    params_map.clear();
+    gauss_cache.Clear();
+    data = af::array();
 }
 
-void Manager::StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<int> dim, std::string const & config)
+Params * Manager::GetParams(bool first)
 {
-    if(!( access( config.c_str(), F_OK ) == 0) )
+    if (params_map.count(first) == 0)
     {
-            printf("Configuration file %s not found\n", config.c_str());
+        params_map[first] = new Params(config, dim, first);
+    }
+    return params_map[first];
+}
+
+void Manager::ActivateDevice()
+{
+    if (device_id >= 0)
+    {
+        setDevice(device_id);
+    }
+}
+
+void Manager::Init(int device, const double *data_buffer, std::vector<int> data_dim, const std::map<std::string, std::string> & config_map)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    error_code = 0;
+    if (config_map.count("num_iter") == 0)
+    {
+            printf("Configuration parameters are missing the algorithm sequence\n");
             error_code = -3;
             return;
     }
 
-    info();
-
     if (device >= 0)
     {
         try{
@@ -51,250 +80,389 @@ void Manager::StartCalc(int device, std::vector<d_type> data_buffer_r, std::vect
         }
         printf("Set deviceId %d\n", getDevice());
     }
+    info();
+    if (config_map.count("fft_plan_cache_size"))
+    {
+        // the plan cache is kept by ArrayFire for the backend; the plans of the session FFTs are reused between runs
+        setFFTPlanCacheSize(std::stoul(config_map.at("fft_plan_cache_size")));
+    }
 
-    bool first = true;
-    Params * params = new Params(config, dim, first);
-    
-    dim4 af_dims = Utils::Int2Dim4(dim);
-    af::array real_d(af_dims, &data_buffer_r[0]);
-    //saving abs(data)
-    af::array data = abs(real_d);
-
-    af::array guess;
-    af::randomEngine r(AF_RANDOM_ENGINE_MERSENNE, getpid() * time(0));
-    d_type test1 = 0;
-    double test2 = 0;
-    if (typeid(test1) == typeid(test2))
+    device_id = device;
+    config = config_map;
+    dim = data_dim;
+    try
     {
-        guess = randu(data.dims(), c64, r);
+        UploadData(data_buffer);
     }
-    else
+    catch (const std::exception & e)
     {
-        guess = randu(data.dims(), c32, r);
+        SetFailed(e);
     }
-    af::array null_array = array();
-
-    rec = new Reconstruction(data, guess, params, null_array, null_array);
-    rec->Init(first);
-    printf("initialized\n");
+}
 
-    timer::start();
-    error_code = rec->Iterate();
-    if (error_code == 0)
-    {       
-        printf("iterate function took %g seconds\n", timer::stop());
+void Manager::SetData(const double *data_buffer)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    try
+    {
+        ActivateDevice();
+        UploadData(data_buffer);
     }
-    else    
+    catch (const std::exception & e)
     {
-        timer::stop();
-    }       
+        SetFailed(e);
+        // the runs do not start without data, so the error code is kept
+        data = af::array();
+    }
 }
 
-void Manager::StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> dim, const std::string & config)
+void Manager::UploadData(const double *data_buffer)
 {
-    bool first = false;
-    Params * params = new Params(config.c_str(), dim, first);
-    
-    if (device >= 0)
+    // the precision does not depend on the first flag, so any parsed parameters can be used
+    bool single = GetParams(true)->IsSinglePrecision();
+    af::array real_d(Utils::Int2Dim4(dim), data_buffer);
+    //saving abs(data) in the configured precision
+    data = abs(real_d).as(single ? f32 : f64);
+}
+
+void Manager::Run(const double *guess_buffer, const int *support_buffer, const double *coh_buffer, std::vector<int> coh_dim, int batch_size)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    // the session was not initialized, the error code is set by Init
+    if (Utils::IsNullArray(data))
     {
-        try{
-            setDevice(device);
-        }
-        catch (...)
-        {
-            printf("no gpu with id %d, check configuration\n", device);
-            error_code = -2;
-            return;
-        }
-        info();
+        return;
+    }
+    ActivateDevice();
+    if (rec != NULL)
+    {
+        delete rec;
+        rec = NULL;
     }
 
+    bool first = (guess_buffer == NULL);
+    Params * params = GetParams(first);
+    if ((batch_size > 1) && params->IsPcdi())
+    {
+        printf("partial coherence is not supported in batch mode\n");
+        error_code = -4;
+        return;
+    }
+    // the members of a batch are stacked along the fourth dimension
     dim4 af_dims = Utils::Int2Dim4(dim);
-    af::array real_d(af_dims, &data_buffer_r[0]);
-    //saving abs(data)
-    af::array data = abs(real_d);
-
-    af::array real_g(af_dims, &guess_buffer_r[0]);
-    af::array imag_g(af_dims, &guess_buffer_i[0]);
-    af::array guess = complex(real_g, imag_g);
-       
-    af::array null_array = array();
-
-    rec = new Reconstruction(data, guess, params, null_array, null_array);
-    rec->Init(first);
-    printf("initialized\n");
+    af_dims[3] = batch_size;
 
-    timer::start();
-    error_code = rec->Iterate();
-    if (error_code == 0)
-    {       
-        printf("iterate function took %g seconds\n", timer::stop());
-    }
-    else    
+    try
     {
-        timer::stop();
-    }       
-}
-
-void Manager::StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> support_vector, std::vector<int> dim, const std::string & config)
-{
-    bool first = false;
-    Params * params = new Params(config.c_str(), dim, first);
-    
-    if (device >= 0)
-    {
-        try{
-            setDevice(device);
+        af::array guess;
+        if (first)
+        {
+            // the seed must differ for reconstructions started concurrently in one process
+            std::random_device seed;
+            af::randomEngine r(AF_RANDOM_ENGINE_MERSENNE, seed());
+            guess = randu(af_dims, params->IsSinglePrecision() ? c32 : c64, r);
         }
-        catch (...)
-        {// leave to the os to assign device
-            printf("no gpu with id %d, check configuration\n", device);
-            error_code = -2;
-            return;
+        else
+        {
+            guess = af::array(af_dims, reinterpret_cast<const af::cdouble *>(guess_buffer)).as(params->IsSinglePrecision() ? c32 : c64);
         }
-        info();
+        af::array support_a = array();
+        if (support_buffer != NULL)
+        {
+            support_a = af::array(af_dims, support_buffer);
+        }
+        af::array coh_a = array();
+        if (coh_buffer != NULL)
+        {
+            coh_a = af::array(Utils::Int2Dim4(coh_dim), coh_buffer).as(data.type());
+        }
+
+        rec = new Reconstruction(data, guess, params, support_a, coh_a, &progress, &control, &gauss_cache);
+        rec->Init(first);
     }
-    
-    dim4 af_dims = Utils::Int2Dim4(dim);
-    af::array real_d(af_dims, &data_buffer_r[0]);
-    //saving abs(data)
-    af::array data = abs(real_d);
-
-    af::array real_g(af_dims, &guess_buffer_r[0]);
-    af::array imag_g(af_dims, &guess_buffer_i[0]);
-    af::array guess = complex(real_g, imag_g);
-    af::array support_a(af_dims, &support_vector[0]);
-       
-    af::array null_array = array();
-
-    rec = new Reconstruction(data, guess, params, support_a, null_array);
-    rec->Init(first);
+    catch (const std::exception & e)
+    {
+        SetFailed(e);
+        return;
+    }
+    rec->SetCheckpoint(checkpoint_file);
     printf("initialized\n");
+    Iterate();
+}
 
-    timer::start();
-    error_code = rec->Iterate();
-    if (error_code == 0)
+void Manager::SetCheckpoint(const std::string & file)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    checkpoint_file = file;
+}
+
+void Manager::ResumeCheckpoint(const std::string & file)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    if (Utils::IsNullArray(data))
     {
-        printf("iterate function took %g seconds\n", timer::stop());
+        return;
     }
-    else
+    ActivateDevice();
+    if (rec != NULL)
     {
-        timer::stop();
+        delete rec;
+        rec = NULL;
     }
-}
 
-void Manager::StartCalc(int device, std::vector<d_type> data_buffer_r, std::vector<d_type> guess_buffer_r, std::vector<d_type> guess_buffer_i, std::vector<int> support_vector, std::vector<int> dim, std::vector<d_type> coh_vector, std::vector<int> coh_dim, const std::string & config)
-{
-    bool first = false;
-    Params * params = new Params(config.c_str(), dim, first);
-    
-    if (device >= 0)
+    try
     {
-        try{
-            setDevice(device);
+        const char *file_name = file.c_str();
+        // the run state holds the first flag at index 2, it defines which parameters the interrupted run used
+        std::vector<d_type> run_state = Utils::ToVector(readArray(file_name, "state"));
+        Params * params = GetParams(run_state[2] != 0);
+        af::array image = readArray(file_name, "image");
+        af::array support_a = readArray(file_name, "support");
+        af::array coh_a = array();
+        if (readArrayCheck(file_name, "coherence") >= 0)
+        {
+            coh_a = readArray(file_name, "coherence");
         }
-        catch (...)
+        rec = new Reconstruction(data, image, params, support_a, coh_a, &progress, &control, &gauss_cache);
+        // the image is already scaled, so it is initialized as a continuation
+        rec->Init(false);
+        rec->Restore(file);
+    }
+    catch (...)
+    {
+        printf("can't read checkpoint file %s\n", file.c_str());
+        error_code = -5;
+        // a reconstruction that was not restored is not kept, the getters return empty results
+        if (rec != NULL)
         {
-            printf("no gpu with id %d, check configuration\n", device);
-            error_code = -2;
-            return;
+            delete rec;
+            rec = NULL;
         }
-        info();
+        return;
     }
-    
-    dim4 af_dims = Utils::Int2Dim4(dim);
-    af::array real_d(af_dims, &data_buffer_r[0]);
-    //saving abs(data)
-    af::array data = abs(real_d);
-
-    af::array real_g(af_dims, &guess_buffer_r[0]);
-    af::array imag_g(af_dims, &guess_buffer_i[0]);
-    af::array guess = complex(real_g, imag_g).copy();
-    af::array support_a(af_dims, &support_vector[0]);
-    af::array coh_a(Utils::Int2Dim4(coh_dim), &coh_vector[0]);
-       
-    rec = new Reconstruction(data, guess, params, support_a, coh_a);
-    rec->Init(first);
-    printf("initialized\n");
+    rec->SetCheckpoint(checkpoint_file);
+    printf("resumed from checkpoint\n");
+    Iterate();
+}
 
-    timer::start();
-    error_code = rec->Iterate();
+void Manager::Iterate()
+{
+    // use own timer, the default timer is shared by all threads
+    timer iter_timer = timer::start();
+    try
+    {
+        error_code = rec->Iterate();
+    }
+    catch (const std::exception & e)
+    {
+        SetFailed(e);
+    }
+    control.ClearCancel();
     if (error_code == 0)
     {
-        printf("iterate function took %g seconds\n", timer::stop());
+        printf("iterate function took %g seconds\n", timer::stop(iter_timer));
     }
-    else
+}
+
+void Manager::SetFailed(const std::exception & e)
+{
+    printf("the reconstruction failed: %s\n", e.what());
+    error_code = -6;
+    if (rec != NULL)
     {
-        timer::stop();
+        delete rec;
+        rec = NULL;
     }
 }
 
-std::vector<d_type> Manager::GetImageR()
+std::vector<progress_record> Manager::GetProgress()
 {
-    af::array image = rec->GetImage();
-    
-    d_type *image_r = real(image).copy().host<d_type>();
-    std::vector<d_type> v(image_r, image_r + image.elements());
+    // the stream is not guarded by the session mutex, so it can be polled during a run
+    return progress.Read();
+}
 
-    delete [] image_r;
-    return v;
+void Manager::Cancel()
+{
+    control.Cancel();
 }
 
-std::vector<d_type> Manager::GetImageI()
+void Manager::Pause()
 {
-    af::array image = rec->GetImage();
+    control.Pause();
+}
 
-    d_type *image_i = imag(image).copy().host<d_type>();
-    std::vector<d_type> v(image_i, image_i + image.elements());
+void Manager::Resume()
+{
+    control.Resume();
+}
 
-    delete [] image_i;
-    return v;
+bool Manager::IsPaused()
+{
+    return control.IsPaused();
 }
 
-std::vector<d_type> Manager::GetErrors()
+std::vector<unsigned long> Manager::GetGaussCacheStats()
 {
-    return rec->GetErrors();
+    // the counters are atomic, so the statistics are read without the session lock, also during a run
+    std::vector<unsigned long> stats;
+    stats.push_back(gauss_cache.GetHits());
+    stats.push_back(gauss_cache.GetMisses());
+    stats.push_back(gauss_cache.GetSize());
+    return stats;
 }
 
-std::vector<float> Manager::GetSupportV()
+bool Manager::IsSinglePrecision()
 {
-    return rec->GetSupportVector();
+    if (rec == NULL)
+    {
+        return false;
+    }
+    return rec->GetImage().issingle();
 }
 
-std::vector<d_type> Manager::GetCoherenceV()
+std::vector<int> Manager::GetImageDims()
 {
-    return rec->GetCoherenceVector();
+    if (rec == NULL)
+    {
+        return std::vector<int>();
+    }
+    af::array image = rec->GetImage();
+    std::vector<int> dims;
+    for (uint i = 0; i < image.numdims(); i++)
+    {
+        dims.push_back(image.dims()[i]);
+    }
+    return dims;
 }
 
-std::vector<d_type> Manager::GetReciprocalR()
+void Manager::GetImage(void *image_buffer, bool single)
 {
-    af::array rs_amplitudes = rec->GetReciprocal();
+    std::lock_guard<std::mutex> lock(session_mtx);
+    if (rec == NULL)
+    {
+        return;
+    }
+    ActivateDevice();
+    // the cast returns the same array if the type already matches, so the image is copied only to the host buffer
+    rec->GetImage().as(single ? c32 : c64).host(image_buffer);
+}
 
-    d_type *rs_amplitudes_r = real(rs_amplitudes).copy().host<d_type>();
-    std::vector<d_type> v(rs_amplitudes_r, rs_amplitudes_r + rs_amplitudes.elements());
+std::vector<d_type> Manager::GetErrors()
+{
+    if (rec == NULL)
+    {
+        return std::vector<d_type>();
+    }
+    return rec->GetErrors();
+}
 
-    delete [] rs_amplitudes_r;
-    return v;
+void Manager::GetSupport(unsigned char *support_buffer)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    if (rec == NULL)
+    {
+        return;
+    }
+    ActivateDevice();
+    rec->GetSupportArray().as(u8).host(support_buffer);
 }
 
-std::vector<d_type> Manager::GetReciprocalI()
+bool Manager::HasVariance()
 {
-    af::array rs_amplitudes = rec->GetReciprocal();
+    if (rec == NULL)
+    {
+        return false;
+    }
+    return !Utils::IsNullArray(rec->GetVarianceArray());
+}
 
-    d_type *rs_amplitudes_i = imag(rs_amplitudes).copy().host<d_type>();
-    std::vector<d_type> v(rs_amplitudes_i, rs_amplitudes_i + rs_amplitudes.elements());
+void Manager::GetVariance(void *variance_buffer, bool single)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    if ((rec == NULL) || Utils::IsNullArray(rec->GetVarianceArray()))
+    {
+        return;
+    }
+    ActivateDevice();
+    rec->GetVarianceArray().as(single ? f32 : f64).host(variance_buffer);
+}
 
-    delete [] rs_amplitudes_i;
-    return v;
+std::vector<int> Manager::GetCoherenceDims()
+{
+    std::vector<int> dims;
+    if (rec == NULL)
+    {
+        return dims;
+    }
+    af::array coherence = rec->GetCoherenceArray();
+    if (!Utils::IsNullArray(coherence))
+    {
+        for (uint i = 0; i < rec->GetImage().numdims(); i++)
+        {
+            dims.push_back(coherence.dims()[i]);
+        }
+    }
+    return dims;
+}
+
+void Manager::GetCoherence(double *coh_buffer)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    if ((rec == NULL) || Utils::IsNullArray(rec->GetCoherenceArray()))
+    {
+        return;
+    }
+    ActivateDevice();
+    rec->GetCoherenceArray().as(f64).host(coh_buffer);
+}
+
+void Manager::GetReciprocal(void *reciprocal_buffer, bool single)
+{
+    std::lock_guard<std::mutex> lock(session_mtx);
+    if (rec == NULL)
+    {
+        return;
+    }
+    ActivateDevice();
+    rec->GetReciprocal().as(single ? c32 : c64).host(reciprocal_buffer);
 }
 
 std::vector<int> Manager::GetFlowV()
 {
+    if (rec == NULL)
+    {
+        return std::vector<int>();
+    }
     return rec->GetFlowVector();
 }
 
+std::map<std::string, double> Manager::GetRunStats()
+{
+    std::map<std::string, double> stats;
+    if (rec == NULL)
+    {
+        return stats;
+    }
+    stats["gc_count"] = rec->GetGcCount();
+    stats["stop_iteration"] = rec->GetStopIteration();
+    return stats;
+}
+
+std::vector<long long> Manager::GetAllocReport()
+{
+    if (rec == NULL)
+    {
+        return std::vector<long long>();
+    }
+    return rec->GetAllocReport();
+}
+
 std::vector<int> Manager::GetIterFlowV()
 {
+    if (rec == NULL)
+    {
+        return std::vector<int>();
+    }
     return rec->GetIterFlowVector();
 }
 
@@ -12,19 +12,29 @@ See LICENSE file.
 #include "common.h"
 #include "util.hpp"
 #include "math.h"
-#include "fstream"
 #include "map"
 #include "vector"
 #include "string"
 #include "sstream"
-#include "mutex"
 
-Params::Params(std::string const & config_file, std::vector<int> data_dim, bool first)
+Params::Params(std::map<std::string, std::string> const & config_map, std::vector<int> data_dim, bool first)
 {
+    is_single = false;
+    is_mixed = false;
     is_resolution = false;
     is_pcdi = false;
     pcdi_normalize = false;
     plot_errors = false;
+    checkpoint_interval = 0;
+    error_readback_interval = 1;
+    convergence_window = 0;
+    convergence_epsilon = 0.001;
+    convergence_support_updates = 0;
+    alloc_report = false;
+    gc_policy = GC_FRACTION;
+    // 1GB
+    gc_threshold = 1024 * 1024 * 1024;
+    gc_fraction = 0.5;
     beta = 0.9;
     support_threshold = 0.1;
     support_sigma = 1.0;
@@ -45,31 +55,9 @@ Params::Params(std::string const & config_file, std::vector<int> data_dim, bool
     pcdi_tr_iter.clear();
     nD = data_dim.size();
     
-    std::mutex mtx;
-    std::ifstream cFile(config_file);
-    
     BuildAlgorithmMap();
-    mtx.lock();
-    if (cFile.is_open())
-    {
-        std::string line;
-        while(getline(cFile, line)){
-            line.erase(std::remove_if(line.begin(), line.end(), isspace),
-                                 line.end());
-
-            if(line.empty() || ((line.length() > 2) && (line[0] == '/' && line[1] == '/')))
-                continue;
-            size_t delimiterPos = line.find("=");
-            std::string name = line.substr(0, delimiterPos);
-            std::string value = line.substr(delimiterPos + 1);
-            parms[name] = value;
-        }
-    }
-    else {
-        printf("Couldn't open config file for reading.\n");
-    }
-    cFile.close();
-    mtx.unlock();
+    // the parameters are passed from python already formatted, one string value for each configuration parameter
+    parms = config_map;
     
     number_iterations = std::stoi(parms["num_iter"]);
 
@@ -87,6 +75,72 @@ Params::Params(std::string const & config_file, std::vector<int> data_dim, bool
         algs_repeats.clear();
     }
     // parse general parameters
+    if (parms.count("precision"))
+    {
+        if (parms["precision"] == "single")
+        {
+            is_single = true;
+        }
+        else if (parms["precision"] == "mixed")
+        {
+            is_single = true;
+            is_mixed = true;
+        }
+        else if (parms["precision"] != "double")
+        {
+            printf("Not supported 'precision' parameter %s. Setting to double\n", parms["precision"].c_str());
+        }
+    }
+    if (parms.count("checkpoint_interval"))
+    {
+        checkpoint_interval = std::stoi(parms["checkpoint_interval"]);
+    }
+    if (parms.count("gc_policy"))
+    {
+        std::string policy = parms["gc_policy"];
+        if (policy == "always")
+        {
+            gc_policy = GC_ALWAYS;
+        }
+        else if (policy == "threshold")
+        {
+            gc_policy = GC_THRESHOLD;
+        }
+        else if (policy == "never")
+        {
+            gc_policy = GC_NEVER;
+        }
+        else
+        {
+            gc_policy = GC_FRACTION;
+        }
+    }
+    if (parms.count("gc_threshold"))
+    {
+        // configured in MB
+        gc_threshold = (size_t)(std::stod(parms["gc_threshold"]) * 1024 * 1024);
+    }
+    if (parms.count("gc_fraction"))
+    {
+        gc_fraction = std::stof(parms["gc_fraction"]);
+    }
+    alloc_report = parms.count("alloc_report") && ((strcmp(parms["alloc_report"].c_str(), "true") == 0) || (strcmp(parms["alloc_report"].c_str(), "True") == 0));
+    if (parms.count("error_readback_interval"))
+    {
+        error_readback_interval = std::max(1, std::stoi(parms["error_readback_interval"]));
+    }
+    if (parms.count("convergence_window"))
+    {
+        convergence_window = std::max(0, std::stoi(parms["convergence_window"]));
+    }
+    if (parms.count("convergence_epsilon"))
+    {
+        convergence_epsilon = std::stod(parms["convergence_epsilon"]);
+    }
+    if (parms.count("convergence_support_updates"))
+    {
+        convergence_support_updates = std::max(0, std::stoi(parms["convergence_support_updates"]));
+    }
     if (parms.count("beta"))
     {
         beta = std::stof(parms["beta"]);
@@ -532,6 +586,71 @@ uint Params::GetNdim()
     return nD;
 }
 
+std::string Params::GetDataType()
+{
+    return is_single ? "float" : "double";
+}
+
+bool Params::IsSinglePrecision()
+{
+    return is_single;
+}
+
+bool Params::IsMixedPrecision()
+{
+    return is_mixed;
+}
+
+bool Params::IsDoubleReduction()
+{
+    return !is_single || is_mixed;
+}
+
+int Params::GetCheckpointInterval()
+{
+    return checkpoint_interval;
+}
+
+int Params::GetGcPolicy()
+{
+    return gc_policy;
+}
+
+size_t Params::GetGcThreshold()
+{
+    return gc_threshold;
+}
+
+float Params::GetGcFraction()
+{
+    return gc_fraction;
+}
+
+bool Params::IsAllocReport()
+{
+    return alloc_report;
+}
+
+int Params::GetErrorReadbackInterval()
+{
+    return error_readback_interval;
+}
+
+int Params::GetConvergenceWindow()
+{
+    return convergence_window;
+}
+
+d_type Params::GetConvergenceEpsilon()
+{
+    return convergence_epsilon;
+}
+
+int Params::GetConvergenceSupportUpdates()
+{
+    return convergence_support_updates;
+}
+
 void Params::BuildAlgorithmMap()
 {
     // hardcoded
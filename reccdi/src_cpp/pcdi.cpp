@@ -15,6 +15,7 @@ See LICENSE file.
 PartialCoherence::PartialCoherence(Params *parameters, af::array coherence_array)
 {
     params = parameters;
+    reduce_type = params->IsDoubleReduction() ? f64 : f32;
     roi= params->GetPcdiRoi();
     algorithm = params->GetPcdiAlgorithm();
     normalize = params->GetPcdiNormalize();
@@ -33,6 +34,9 @@ PartialCoherence::PartialCoherence(Params *parameters, af::array coherence_array
 PartialCoherence::~PartialCoherence()
 {
     kernel_array = af::array();
+    kernel_spectrum = af::array();
+    data_spectrum = af::array();
+    data_mirror_spectrum = af::array();
     roi_amplitudes_prev = af::array();
     roi_data_abs = af::array();
     roi.clear();
@@ -46,22 +50,54 @@ void PartialCoherence::Init(af::array data)
     roi_data_abs =  Utils::CropCenter(data_centered, roi_dims).copy();
     if (normalize)
     {
-        sum_roi_data = sum<d_type>(pow(roi_data_abs, 2));
+        sum_roi_data = sum<d_type>(pow(roi_data_abs, 2).as(reduce_type));
     }
     if (Utils::IsNullArray(kernel_array))
     {
         d_type c = 0.5;
-        kernel_array = constant(c, roi_dims);
+        kernel_array = constant(c, roi_dims, data.type());
     }
+    // the kernel spectrum is padded to at least the data plus kernel size minus one, so the convolution applying the
+    // coherence is linear as af::fftConvolve; the zero frequency of the data is at the volume corners, so a circular
+    // convolution would wrap the strongest amplitudes around the edges
+    apply_dims = dims;
+    for (uint i = 0; i < params->GetNdim(); i++)
+    {
+        apply_dims[i] = Utils::GetDimension(dims[i] + roi_dims[i] - 1);
+    }
+    kernel_spectrum = KernelSpectrum(kernel_array, apply_dims);
+
+    // the Lucy deconvolution convolves roi sized arrays with the roi data and its mirror; the arrays are padded so
+    // the convolution does not wrap around
+    lucy_dims = af::dim4(1, 1, 1, 1);
+    for (uint i = 0; i < params->GetNdim(); i++)
+    {
+        lucy_dims[i] = Utils::GetDimension(2 * roi_dims[i] - 1);
+    }
+    af::array roi_data_2 = pow(roi_data_abs, 2);
+    af::array roi_data_mirror = af::flip(af::flip(af::flip(af::flip(roi_data_2, 0),1),2),3);
+    data_spectrum = KernelSpectrum(roi_data_2, lucy_dims);
+    data_mirror_spectrum = KernelSpectrum(roi_data_mirror, lucy_dims);
     //dim4 kdim = kernel_array.dims();
 }
 
-void PartialCoherence::SetPrevious(af::array abs_amplitudes)
+void PartialCoherence::SetPrevious(const af::array & abs_amplitudes)
 {
     af::array abs_amplitudes_centered = shift(abs_amplitudes, dims[0]/2, dims[1]/2, dims[2]/2, dims[3]/2);
+    // the copy keeps only the roi, not the whole amplitudes array, until the next trigger
     roi_amplitudes_prev =  Utils::CropCenter(abs_amplitudes_centered, roi_dims).copy();
 }
 
+af::array PartialCoherence::GetPreviousArray()
+{
+    return roi_amplitudes_prev;
+}
+
+void PartialCoherence::RestorePrevious(af::array roi_amplitudes)
+{
+    roi_amplitudes_prev = roi_amplitudes;
+}
+
 int PartialCoherence::GetAlgorithm()
 {
     return algorithm;
@@ -72,13 +108,13 @@ std::vector<int> PartialCoherence::GetRoi()
     return roi;
 }
 
-af::array PartialCoherence::ApplyPartialCoherence(af::array abs_amplitudes)
+af::array PartialCoherence::ApplyPartialCoherence(const af::array & abs_amplitudes)
 {
 try{
-    // apply coherence
-    af::array abs_amplitudes_2 = pow(abs_amplitudes, 2);
-    af::array converged_2 = af::fftConvolve(abs_amplitudes_2, kernel_array);
-    af::array converged = sqrt(converged_2);
+    // apply coherence; the kernel spectrum is calculated when the kernel changes, so this costs a forward and an
+    // inverse transform of the zero padded amplitudes
+    af::array converged_2 = SpectrumConvolve(pow(abs_amplitudes, 2), kernel_spectrum);
+    af::array converged = sqrt(converged_2 * (converged_2 > 0));
     //af::array converged = sqrt(fftConvolve(pow(abs_amplitudes, 2), kernel_array));  // implemented here, but works different than af::fftConvolve
 
     //printf("coherence norm %f\n", sum<d_type>(pow(abs(kernel_array), 2)));
@@ -93,11 +129,11 @@ catch(af::exception& e) {
     }
 }
 
-void PartialCoherence::UpdatePartialCoherence(af::array abs_amplitudes)
+void PartialCoherence::UpdatePartialCoherence(const af::array & abs_amplitudes)
 {
 try{
     af::array abs_amplitudes_centered = shift(abs_amplitudes, dims[0]/2, dims[1]/2, dims[2]/2, dims[3]/2);
-    af::array roi_abs_amplitudes = Utils::CropCenter(abs_amplitudes_centered, roi_dims).copy();
+    af::array roi_abs_amplitudes = Utils::CropCenter(abs_amplitudes_centered, roi_dims);
 
     af::array roi_combined_amp = 2*roi_abs_amplitudes - roi_amplitudes_prev;
     OnTrigger(roi_combined_amp);   // use_2k_1 from matlab program
@@ -120,7 +156,7 @@ try{
     if (normalize)
     {
         af::array amplitudes_2 = pow(arr, 2);
-        d_type sum_ampl = sum<d_type>(amplitudes_2);
+        d_type sum_ampl = sum<d_type>(amplitudes_2.as(reduce_type));
         d_type ratio = sum_roi_data/sum_ampl;
         amplitudes = sqrt(amplitudes_2 * ratio);
     }
@@ -129,7 +165,7 @@ try{
     // LUCY deconvolution
     if (algorithm == ALGORITHM_LUCY)
     {
-        DeconvLucy(pow(amplitudes, 2), pow(roi_data_abs, 2), iteration_num);
+        DeconvLucy(pow(amplitudes, 2), iteration_num);
     }
     else if (algorithm == ALGORITHM_LUCY_PREV)
     {
@@ -148,56 +184,53 @@ catch(af::exception& e) {
     }
 }
 
-af::array PartialCoherence::fftConvolve(af::array arr, af::array kernel)
+af::array PartialCoherence::KernelSpectrum(const af::array & kernel, af::dim4 fft_dims)
 {
-try{
-    af::dim4 dims_input = arr.dims();
-//    af::dim4 dims_kernel = kernel.dims();
-//
-//    int dims_fft_padded [nD];
-//
-//    for(unsigned int i = 0; i < nD; i++)
-//    {
-//        dim_t d = Utils::GetDimension(dims_input[i] + dims_kernel[i] - 1);
-//        dims_fft_padded[i] = Utils::GetDimension(dims_input[i] + dims_kernel[i] - 1);
-//    }
-    
-    d_type pad = 0;
-    af::array kernel_padded = Utils::PadAround(kernel, dims_input, pad);
+    af::dim4 kdims = kernel.dims();
+    af::array padded = constant(0, fft_dims, kernel.type());
+    padded(seq(0, kdims[0]-1), seq(0, kdims[1]-1), seq(0, kdims[2]-1), span) = kernel;
+    // the kernel center goes to the origin, so the convolution is aligned as the af::fftConvolve result
+    padded = af::shift(padded, -(int)(kdims[0]/2), -(int)(kdims[1]/2), -(int)(kdims[2]/2));
+    return Utils::fft(padded, params->GetNdim());
+}
 
+af::array PartialCoherence::SpectrumConvolve(const af::array & arr, const af::array & kernel_spectrum)
+{
+    af::dim4 adims = arr.dims();
+    af::dim4 fft_dims = kernel_spectrum.dims();
     uint nD = params->GetNdim();
-    af::array coh_padded = real( Utils::ifft( Utils::fft(arr, nD) * Utils::fft(kernel_padded, nD), nD ) );
-    return coh_padded;
-}
-catch(af::exception& e) {
-        fprintf(stderr, "%s\n", e.what());
-        printf("fftConvolve\n");
-        throw;
+    if (adims == fft_dims)
+    {
+        return real(Utils::ifft(Utils::fft(arr, nD) * kernel_spectrum, nD));
     }
-
+    af::array padded = constant(0, fft_dims, arr.type());
+    padded(seq(0, adims[0]-1), seq(0, adims[1]-1), seq(0, adims[2]-1), span) = arr;
+    af::array convolved = real(Utils::ifft(Utils::fft(padded, nD) * kernel_spectrum, nD));
+    return convolved(seq(0, adims[0]-1), seq(0, adims[1]-1), seq(0, adims[2]-1), span);
 }
 
-void PartialCoherence::DeconvLucy(af::array amplitudes, af::array data, int iterations)
+void PartialCoherence::DeconvLucy(af::array amplitudes, int iterations)
 {
 try{
     // implementation based on Python code: https://github.com/scikit-image/scikit-image/blob/master/skimage/restoration/deconvolution.py
+    // the roi data squared is the filter; its spectrum and the spectrum of its mirror are calculated in Init
     //set it to the last coherence instead
     af::array coherence = kernel_array;
-    af::array data_mirror = af::flip(af::flip(af::flip(af::flip(data, 0),1),2),3).copy();
 
     for (int i = 0; i < iterations; i++)
     {
-        af::array convolve = af::fftConvolve(coherence, data);
-        convolve(convolve == 0) = 1.0;   // added to the algorithm from scikit to prevent division by 0
-
-        af::array relative_blurr = amplitudes/convolve;
-        coherence *= af::fftConvolve(relative_blurr, data_mirror);
+        af::array convolve = SpectrumConvolve(coherence, data_spectrum);
+        // the zero divisor is replaced by 1, added to the algorithm from scikit to prevent division by 0
+        af::array relative_blurr = Utils::GetRatio(amplitudes, convolve);
+        coherence *= SpectrumConvolve(relative_blurr, data_mirror_spectrum);
+        coherence.eval();
     }
     coherence = real(coherence);
-    d_type coh_sum = sum<d_type>(abs(coherence));
+    d_type coh_sum = sum<d_type>(abs(coherence).as(reduce_type));
     coherence = abs(coherence)/coh_sum;
     //printf("coherence norm ,  %f\n", sum<d_type>(pow(abs(coherence), 2)));
     kernel_array = coherence;
+    kernel_spectrum = KernelSpectrum(kernel_array, apply_dims);
 }
 catch(af::exception& e) {
         fprintf(stderr, "%s\n", e.what());
@@ -0,0 +1,51 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+#include "algorithm"
+#include "progress.hpp"
+
+
+ProgressStream::ProgressStream(int capacity) : records(capacity), written(0), consumed(0)
+{
+}
+
+void ProgressStream::Write(int iteration, d_type error, int algorithm, unsigned int flow, d_type time)
+{
+    unsigned long index = written.load(std::memory_order_relaxed);
+    progress_record & record = records[index % records.size()];
+    record.iteration = iteration;
+    record.error = error;
+    record.algorithm = algorithm;
+    record.flow = flow;
+    record.time = time;
+    // publish the record after it is filled
+    written.store(index + 1, std::memory_order_release);
+}
+
+std::vector<progress_record> ProgressStream::Read()
+{
+    std::vector<progress_record> new_records;
+    unsigned long capacity = records.size();
+    unsigned long end = written.load(std::memory_order_acquire);
+    unsigned long start = consumed.load(std::memory_order_relaxed);
+    if (end - start > capacity)
+    {
+        // the reader fell behind, the oldest records were overwritten
+        start = end - capacity;
+    }
+    for (unsigned long i = start; i < end; i++)
+    {
+        new_records.push_back(records[i % capacity]);
+    }
+    // the writer might have overwritten some records while they were copied, these records are dropped
+    unsigned long overwritten_end = written.load(std::memory_order_acquire);
+    if (overwritten_end - start > capacity)
+    {
+        unsigned long dropped = std::min(overwritten_end - capacity - start, end - start);
+        new_records.erase(new_records.begin(), new_records.begin() + dropped);
+    }
+    consumed.store(end, std::memory_order_relaxed);
+    return new_records;
+}
@@ -5,6 +5,7 @@ See LICENSE file.
 // Created by Barbara Frosik
 
 #include "stdio.h"
+#include "math.h"
 #include "util.hpp"
 #include "common.h"
 #include "resolution.hpp"
@@ -19,12 +20,28 @@ Resolution::Resolution(Params* param)
     dets = Utils::Linspace(iter, param->GetIterResDetFirst(), param->GetIterResDetLast()); 
     sigmas = Utils::Linspace(iter, param->GetIterResSigmaFirst(), param->GetIterResSigmaLast());
     nD = param->GetNdim();
+
+    // consecutive iterations with nearly the same det use the mask calculated for the first of them
+    for (int i = 0; i < iter; i++)
+    {
+        if ((i == 0) || (fabs(dets[i] - dets[mask_source.back()]) > RESOLUTION_DET_TOLERANCE * fabs(dets[mask_source.back()])))
+        {
+            mask_source.push_back(i);
+        }
+        else
+        {
+            mask_source.push_back(mask_source.back());
+        }
+    }
+    mask_iter = -1;
 }
 
 Resolution::~Resolution()
 {
     dets.clear();
     sigmas.clear();
+    mask_source.clear();
+    mask = af::array();
 }
 
 float Resolution::GetIterSigma(int iter)
@@ -32,20 +49,50 @@ float Resolution::GetIterSigma(int iter)
     return sigmas[iter];
 }
 
-af::array Resolution::GetIterData(int iter, af::array data)
+int Resolution::GetIterLevel(int iter)
 {
-    int alpha = 1;
-    d_type *dim_sigmas = new d_type[nD];
-    for (uint i=0; i<nD; i++)
+    return mask_source[iter];
+}
+
+af::array Resolution::GetMask(d_type det, const af::dim4 data_dim, af::dtype type)
+{
+    af::array grid;
+    for (uint i = 0; i < nD; i++)
     {
-        dim_sigmas[i] = data.dims()[i]*dets[iter];
+        d_type sigma = data_dim[i] * det;
+        d_type multiplier = - 0.5 / (sigma * sigma);
+        af::array line = range(af::dim4(data_dim[i]), 0, type) - (data_dim[i] - 1)/2.0;
+        line = exp(line * line * multiplier);
+        line = line/af::max<d_type>(line);
+        // the Gaussian is centered, the data has zero frequency in the first element, so the line is shifted back
+        // instead of shifting the data
+        line = af::shift(line, -(int)(data_dim[i]/2));
+
+        // orient the line along dimension i and repeat it over the other dimensions of one member
+        af::dim4 line_dim(1, 1, 1, 1);
+        line_dim[i] = data_dim[i];
+        af::dim4 tile_dim = data_dim;
+        tile_dim[i] = 1;
+        tile_dim[3] = 1;
+        af::array dim_grid = tile(moddims(line, line_dim), tile_dim);
+        grid = (i == 0) ? dim_grid : grid * dim_grid;
     }
-    af::array distribution = Utils::GaussDistribution(nD, data.dims(), dim_sigmas, alpha);
-    d_type max_dist = af::max<d_type>(distribution);
-    distribution = distribution/max_dist;
-    af::array data_shifted = Utils::ifftshift(data);
-    af::array masked = distribution*data_shifted;
-    return Utils::ifftshift(masked);
+    if (data_dim[3] > 1)
+    {
+        grid = tile(grid, 1, 1, 1, data_dim[3]);
+    }
+    grid.eval();
+    return grid;
 }
 
+af::array Resolution::GetIterData(int iter, af::array data)
+{
+    int source = mask_source[iter];
+    if ((source != mask_iter) || (mask.dims() != data.dims()) || (mask.type() != data.type()))
+    {
+        mask = GetMask(dets[source], data.dims(), data.type());
+        mask_iter = source;
+    }
+    return data * mask;
+}
 
@@ -22,6 +22,7 @@ State::State(Params* parameters)
     total_iter_num = 0;
     current_alg = 0;
     alg_switch_index = 0;
+    switch_iter = 0;
 }
 
 State::~State()
@@ -33,6 +34,7 @@ void State::Init()
 {
     total_iter_num = params->GetNumberIterations();
     current_alg = params->GetAlgSwitches()[0].algorithm_id;
+    switch_iter = params->GetAlgSwitches()[0].iterations;
 }
 
 int State::Next()
@@ -41,12 +43,13 @@ int State::Next()
     {
         return false;
     }
-    // figure out current alg
-    if (params->GetAlgSwitches()[alg_switch_index].iterations == current_iter)
+    // figure out current alg; the switches hold the number of iterations of each algorithm
+    if (switch_iter == current_iter)
     // switch to the next algorithm
     {
         alg_switch_index++;
         current_alg = params->GetAlgSwitches()[alg_switch_index].algorithm_id;
+        switch_iter += params->GetAlgSwitches()[alg_switch_index].iterations;
     }
 
     return true;
@@ -68,9 +71,61 @@ int State::GetCurrentIteration()
     return current_iter;
 }
 
+int State::GetAlgSwitchIndex()
+{
+    return alg_switch_index;
+}
+
+bool State::SkipToFinal()
+{
+    std::vector<alg_switch> alg_switches = params->GetAlgSwitches();
+    int last = alg_switches.size() - 1;
+    int final_start = total_iter_num;
+    if ((last > 0) && (alg_switches[last].algorithm_id == ALGORITHM_ER))
+    {
+        final_start = total_iter_num - alg_switches[last].iterations;
+    }
+    if (current_iter >= final_start - 1)
+    {
+        return false;
+    }
+    // the next iteration switches to the final block
+    current_iter = final_start - 1;
+    if (final_start < total_iter_num)
+    {
+        alg_switch_index = last - 1;
+        current_alg = alg_switches[alg_switch_index].algorithm_id;
+        switch_iter = final_start;
+    }
+    return true;
+}
+
+void State::Restore(int iteration, int switch_index, std::vector<d_type> saved_errors)
+{
+    current_iter = iteration;
+    alg_switch_index = switch_index;
+    current_alg = params->GetAlgSwitches()[alg_switch_index].algorithm_id;
+    switch_iter = 0;
+    for (int i = 0; i <= alg_switch_index; i++)
+    {
+        switch_iter += params->GetAlgSwitches()[i].iterations;
+    }
+    errors = saved_errors;
+}
+
 std::vector<d_type>  State::GetErrors()
 {
     return errors;
 }
 
+int State::GetNumberErrors()
+{
+    return errors.size();
+}
+
+d_type State::GetError(int index)
+{
+    return errors[index];
+}
+
 
@@ -9,14 +9,20 @@ See LICENSE file.
 #include "support.hpp"
 #include "parameters.hpp"
 #include "util.hpp"
+#include "gauss_cache.hpp"
 
-Support::Support(const af::dim4 data_dim, Params *parameters, af::array support)
+Support::Support(const af::dim4 data_dim, Params *parameters, af::array support, GaussCache *cache)
 {
     params = parameters;
+    reduce_type = params->IsDoubleReduction() ? f64 : f32;
+    gauss_cache = cache;
     threshold = params->GetSupportThreshold();
     sigma = params->GetSupportSigma();
     algorithm = params->GetSupportAlg();
-    af::array ones = constant(1, Utils::Int2Dim4(params->GetSupportArea()), u32);
+    // the support area is set in each member of a batch
+    af::dim4 area = Utils::Int2Dim4(params->GetSupportArea());
+    area[3] = data_dim[3];
+    af::array ones = constant(1, area, u32);
     if (Utils::IsNullArray(support))
     {
         support_array = Utils::PadAround(ones, data_dim, 0);
@@ -26,6 +32,7 @@ Support::Support(const af::dim4 data_dim, Params *parameters, af::array support)
         support_array = support;
     }
     update_iter = -1;
+    last_sigma = -1;
 
 /*    if (algorithm == ALGORITHM_GAUSS)
     {
@@ -48,25 +55,27 @@ Support::~Support()
 //    init_support_array = af::array();
 }
 
-void Support::UpdateAmp(const af::array ds_image, d_type sig, int iter)
+void Support::UpdateAmp(const af::array & ds_image, d_type sig, int iter)
 {
     
+    af::array ds_image_abs = abs(ds_image);
     if (sig != last_sigma)
     {
-        distribution = GetDistribution(ds_image.dims(), sig);
+        distribution = GetDistribution(ds_image.dims(), sig, ds_image_abs.type());
     }
 
     //printf("updating support\n");
-    af::array convag = GaussConvFft(abs(ds_image));
-    d_type max_convag = af::max<d_type>(convag);
-    convag = convag/max_convag;
-    support_array = (convag >= threshold);
+    af::array convag = GaussConvFft(ds_image_abs);
+    // comparing with the scaled maximum instead of normalizing the array fuses the threshold into one kernel; the
+    // maximum is scaled in the reduction precision
+    af::array member_max = Utils::MemberMax(convag).as(reduce_type);
+    support_array = (convag >= Utils::ToMemberDims(threshold * member_max, convag.dims()));
 
     last_sigma = sig;
     update_iter = iter;
 }
 
-void Support::UpdatePhase(const af::array ds_image, int iter)
+void Support::UpdatePhase(const af::array & ds_image, int iter)
 {
         //printf("phase trigger\n");
         af::array phase = atan2(imag(ds_image), real(ds_image));
@@ -90,7 +99,7 @@ af::array Support::GetSupportArray()
     return support_array;
 }
 
-af::array Support::GetDistribution(const af::dim4 data_dim, d_type sigma)
+af::array Support::GetDistribution(const af::dim4 data_dim, d_type sigma, af::dtype type)
 {
     int alpha = 1;
     uint nD = params->GetNdim();
@@ -99,26 +108,27 @@ af::array Support::GetDistribution(const af::dim4 data_dim, d_type sigma)
     {
         sigmas[i] = data_dim[i]/(2.0*af::Pi*sigma);
     }
-    af::array dist = Utils::GaussDistribution(params->GetNdim(), data_dim, sigmas, alpha);
+    af::array dist = gauss_cache->Get(nD, data_dim, sigmas, alpha, type);
+    delete [] sigmas;
     return dist;
 }
 
 
-af::array Support::GaussConvFft(af::array ds_image_abs)
+af::array Support::GaussConvFft(const af::array & ds_image_abs)
 {
-    d_type image_sum = sum<d_type>(ds_image_abs);
-    af::array shifted = Utils::ifftshift(ds_image_abs);
-    af::array rs_amplitudes = Utils::fft(shifted, params->GetNdim());
-    af::array rs_amplitudes_cent = Utils::ifftshift(rs_amplitudes);
-    af::array distribution = GetDistribution (ds_image_abs.dims(), 1.0);
-    af::array amp_dist = rs_amplitudes_cent * distribution;
-    shifted = Utils::ifftshift(amp_dist);
-    af::array convag_compl = Utils::ifft(shifted, params->GetNdim());
-    af::array convag = (Utils::ifftshift(convag_compl));
+    af::array image_sum = Utils::MemberSum(ds_image_abs, reduce_type);
+    // the shifted arrays are new arrays, so they are transformed in place; the inverse is normalized by the number of
+    // points in one member
+    d_type member_points = ds_image_abs.elements() / ds_image_abs.dims()[3];
+    af::array rs_amplitudes = Utils::ifftshift(ds_image_abs).as(ds_image_abs.issingle() ? c32 : c64);
+    Utils::FftInPlace(rs_amplitudes, params->GetNdim(), 1.0);
+    af::array amp_dist = Utils::ifftshift(Utils::ifftshift(rs_amplitudes) * distribution);
+    Utils::IfftInPlace(amp_dist, params->GetNdim(), 1.0/member_points);
+    af::array convag = (Utils::ifftshift(amp_dist));
     convag = real(convag);
     convag(convag < 0) = 0;
-    d_type correction = image_sum/sum<d_type>(convag);
-    convag *= correction;
+    af::array correction = image_sum/Utils::MemberSum(convag, reduce_type);
+    convag *= Utils::ToMemberDims(correction, convag.dims()).as(convag.type());
     return convag;
 }
 
@@ -90,12 +90,12 @@ af::array Utils::Crop(af::array arr, af::dim4 roi)
 
 af::array Utils::fftshift(af::array arr)
 {
-    return af::shift(arr, ceil(arr.dims()[0]/2)-1, ceil(arr.dims()[1]/2)-1, ceil(arr.dims()[2]/2)-1, ceil(arr.dims()[3]/2)-1);
+    return af::shift(arr, ceil(arr.dims()[0]/2)-1, ceil(arr.dims()[1]/2)-1, ceil(arr.dims()[2]/2)-1, 0);
 }
 
 af::array Utils::ifftshift(af::array arr)
 {
-    return af::shift(arr, ceil(arr.dims()[0]/2), ceil(arr.dims()[1]/2), ceil(arr.dims()[2]/2), ceil(arr.dims()[3]/2));
+    return af::shift(arr, ceil(arr.dims()[0]/2), ceil(arr.dims()[1]/2), ceil(arr.dims()[2]/2), 0);
 }
 
 af::array Utils::fft(af::array arr, uint nD)
@@ -122,10 +122,55 @@ af::array Utils::ifft(af::array arr, uint nD)
     }
 }
 
+af::array Utils::fft(af::array arr, uint nD, d_type scale)
+{
+    if (nD == 3)
+    {
+        return fft3Norm(arr, scale);
+    }
+    else
+    {
+        return fft2Norm(arr, scale);
+    }
+}
+
+af::array Utils::ifft(af::array arr, uint nD, d_type scale)
+{
+    if (nD == 3)
+    {
+        return ifft3Norm(arr, scale);
+    }
+    else
+    {
+        return ifft2Norm(arr, scale);
+    }
+}
+
+void Utils::FftInPlace(af::array & arr, uint nD, d_type scale)
+{
+    // the C API takes the scale as is; the C++ in-place inverse would also divide by the number of elements
+    arr.eval();
+    af_err err = (nD == 3) ? af_fft3_inplace(arr.get(), scale) : af_fft2_inplace(arr.get(), scale);
+    if (err != AF_SUCCESS)
+    {
+        throw af::exception("in-place fft failed");
+    }
+}
+
+void Utils::IfftInPlace(af::array & arr, uint nD, d_type scale)
+{
+    arr.eval();
+    af_err err = (nD == 3) ? af_ifft3_inplace(arr.get(), scale) : af_ifft2_inplace(arr.get(), scale);
+    if (err != AF_SUCCESS)
+    {
+        throw af::exception("in-place ifft failed");
+    }
+}
+
 void Utils::GetMaxIndices(af::array arr, int* indices)
 {
     //find indexes of max
-    d_type *arr_values = abs(arr).host<d_type>();
+    d_type *arr_values = abs(arr).as(f64).host<d_type>();
     std::vector<d_type> v(arr_values, arr_values + arr.elements());
     std::vector<d_type>::iterator result = std::max_element(v.begin(), v.end());
     int max_offset = result - v.begin();
@@ -137,19 +182,19 @@ void Utils::GetMaxIndices(af::array arr, int* indices)
     //printf("offset, ind1, ind2 ind3 %i %i %i %i\n", max_offset, indices[0], indices[1], indices[2]);
 }
 
-af::array Utils::GaussDistribution(uint nD, af::dim4 data_dim, d_type * sgma, int alpha)
+af::array Utils::GaussDistribution(uint nD, af::dim4 data_dim, const d_type * sgma, int alpha, af::dtype type)
 {
     // calculate multipliers
     //initialize first element of the grid, assuming at least one dimension
     d_type multiplier = - 0.5 * alpha/pow(sgma[0],2);
-    af::array exponent =  pow( (range(data_dim, 0)-(data_dim[0]-1)/2.0).as(f64) ,2)* multiplier;
+    af::array exponent =  pow( (range(data_dim, 0)-(data_dim[0]-1)/2.0).as(type) ,2)* multiplier;
     af::array grid = exp(exponent);
 
     //add grid in other dimensions
     for (uint i = 1; i<nD; i++)
     {
         multiplier = - 0.5 * alpha/pow(sgma[i],2);
-        exponent =  pow( (range(data_dim, i)-(data_dim[i]-1)/2.0).as(f64) ,2)* multiplier;
+        exponent =  pow( (range(data_dim, i)-(data_dim[i]-1)/2.0).as(type) ,2)* multiplier;
         af::array gi = exp(exponent);
         grid = grid * gi;
     }
@@ -192,9 +237,8 @@ af::array Utils::PadAround(af::array arr, af::dim4 new_dims, int pad)
 
 af::array Utils::GetRatio(af::array divident, af::array divisor)
 {
-    af::array divisor_copy = divisor.copy();
-    divisor_copy(divisor == 0) = 1;
-    return divident/divisor_copy;
+    // adding 1 where the divisor is zero keeps the expression in one JIT kernel, without a copy of the divisor
+    return divident/(divisor + (divisor == 0).as(divisor.type()));
 }
 
 bool Utils::IsNullArray(af::array  arr)
@@ -202,6 +246,33 @@ bool Utils::IsNullArray(af::array  arr)
     return (arr.elements() == 0);
 }
 
+size_t Utils::GetAllocatedBytes()
+{
+    size_t alloc_bytes, alloc_buffers, lock_bytes, lock_buffers;
+    af::deviceMemInfo(&alloc_bytes, &alloc_buffers, &lock_bytes, &lock_buffers);
+    return alloc_bytes;
+}
+
+af::array Utils::MemberSum(af::array arr)
+{
+    return sum(sum(sum(arr, 0), 1), 2);
+}
+
+af::array Utils::MemberSum(af::array arr, af::dtype type)
+{
+    return MemberSum(arr.as(type));
+}
+
+af::array Utils::MemberMax(af::array arr)
+{
+    return max(max(max(arr, 0), 1), 2);
+}
+
+af::array Utils::ToMemberDims(af::array member_values, af::dim4 dims)
+{
+    return tile(member_values, dims[0], dims[1], dims[2]);
+}
+
 std::string Utils::GetFullFilename(const char * dir, const char * filename)
 {
     std::string full_filename;
@@ -223,7 +294,7 @@ std::vector<float> Utils::Linspace(int iter, float start_val, float end_val)
 
 std::vector<d_type> Utils::ToVector(af::array arr)
 {
-    d_type *vec = arr.copy().host<d_type>();
+    d_type *vec = arr.as(f64).host<d_type>();
     std::vector<d_type> v(vec, vec + arr.elements());
     delete [] vec;
     return v;
@@ -7,6 +7,7 @@ See LICENSE file.
 #include "fstream"
 #include "unistd.h"
 #include "stdio.h"
+#include "string"
 #include "worker.hpp"
 #include "cstdio"
 #include "cstdlib"
@@ -20,25 +21,43 @@ See LICENSE file.
 #include "common.h"
 #include "util.hpp"
 #include "resolution.hpp"
+#include "progress.hpp"
+#include "control.hpp"
 
 
-Reconstruction::Reconstruction(af::array image_data, af::array guess, Params* parameters, af::array support_array, af::array coherence_array)
+Reconstruction::Reconstruction(af::array image_data, af::array guess, Params* parameters, af::array support_array, af::array coherence_array, ProgressStream *progress_stream, RunControl *run_control, GaussCache *gauss_cache)
 {
     num_points = 0;
     norm_data = 0;
     current_iteration = 0;
     aver_iter = 0;
     current_error = 0.0;
-    data = image_data;
+    print_progress = false;
+    first_run = false;
+    iter_level = -1;
+    iter_data_level = -1;
+    resolution_iter = 0;
+    readback_interval = 1;
+    gc_count = 0;
+    support_unchanged_updates = 0;
+    stop_iteration = -1;
+    // the members of the batch are stacked along the fourth dimension of the guess; the data is repeated for each member
+    batch_size = guess.dims()[3];
+    data = (batch_size > 1) ? tile(image_data, 1, 1, 1, batch_size) : image_data;
     ds_image = guess;
     params = parameters;
+    reduce_type = params->IsDoubleReduction() ? f64 : f32;
+    progress = progress_stream;
+    control = run_control;
     for (int i = 0; i < params->GetNumberIterations(); i++)
     {
          std::vector<fp> v;
          iter_flow.push_back(v);
+         iter_flow_mask.push_back(0);
+         iter_flow_item.push_back(std::vector<int>());
     }
     state = new State(params);
-    support = new Support(data.dims(), params, support_array);
+    support = new Support(data.dims(), params, support_array, gauss_cache);
     
     if (params->IsPcdi())
     {
@@ -70,7 +89,6 @@ Reconstruction::~Reconstruction()
     {
         delete resolution;
     }
-    delete params;
 
     if (&data == &iter_data)
     {
@@ -85,16 +103,18 @@ Reconstruction::~Reconstruction()
     ds_image_raw = af::array();
     rs_amplitudes = af::array();
 
-    aver_v.clear();
-    support_vector.clear();
-    coherence_vector.clear();
+    aver_sum = af::array();
+    aver_sq_sum = af::array();
+    variance = af::array();
     iter_flow.clear();
+    iter_flow_mask.clear();
     algorithm_map.clear();
     Gc();
 }
 
 void Reconstruction::Init(bool first)
 {
+    first_run = first;
     std::map<const char*, fp> flow_ptr_map;
     flow_ptr_map["NextIter"] = &Reconstruction::NextIter;
     flow_ptr_map["ResolutionTrigger"] =  &Reconstruction::ResolutionTrigger;
@@ -128,10 +148,17 @@ void Reconstruction::Init(bool first)
             {
                 fp func_ptr = flow_ptr_map[flow_def[func_order].func_name];
                 iter_flow[j].push_back(func_ptr);
+                iter_flow_item[j].push_back(i);
+                iter_flow_mask[j] |= 1u << func_order;
             }
         }
     }
 
+    if (params->IsAllocReport())
+    {
+        alloc_bytes.assign(used_flow_seq.size() * num_iter, 0);
+    }
+
     // initialize other components
     state->Init();
     if (partialCoherence != NULL)
@@ -139,13 +166,26 @@ void Reconstruction::Init(bool first)
          partialCoherence->Init(data);
     }
    
+    readback_interval = params->GetErrorReadbackInterval();
+    pending_errors = constant(0, batch_size, readback_interval, f64);
+    if (params->GetConvergenceSupportUpdates() > 0)
+    {
+        support_unchanged = constant(0, dim4(1), f64);
+    }
+    readback_timer = timer::start();
+
     norm_data = GetNorm(data);
-    num_points = data.elements();
+    data_norms = GetMemberNorms(data);
+    iter_data = data;
+    iter_data_norms = data_norms;
+    iter_data_level = -1;
+    num_points = data.elements() / batch_size;
     if (first)
     {
 	// multiply the rs_amplitudes by max element of data array and the norm
         d_type max_data = af::max<d_type>(data);
-        ds_image *= max_data * GetNorm(ds_image);
+        // the norms may be accumulated in double precision, the factor is applied in the image precision
+        ds_image *= max_data * Utils::ToMemberDims(GetMemberNorms(ds_image), ds_image.dims()).as(data.type());
 
         // the next two lines are for testing it sets initial guess to initial support
         // af::array temp = support->GetSupportArray();
@@ -159,103 +199,199 @@ void Reconstruction::Init(bool first)
 
 int Reconstruction::Iterate()
 {
+    readback_timer = timer::start();
     while (state->Next())
     {
         current_iteration = state->GetCurrentIteration();
-        if (access("stopfile", F_OK) == 0)
+        if ((control != NULL) && control->CheckPoint())
         {
-            remove("stopfile");
+            ReadBack();
+            printf("the reconstruction was cancelled\n");
             return -1;
         }
-        if (anyTrue<bool>(isNaN(ds_image)))
+        // the errors are read back at the algorithm switch, so the errors of each algorithm are complete
+        if (!pending_iters.empty() && (state->GetCurrentAlg() != pending_algs.back()) && !ReadBack())
         {
             printf("the image array has NaN element, quiting this reconstruction process\n");
             return -3;
         }
         for (uint i=0; i<iter_flow[current_iteration].size(); i++ )
         {
-            (this->*iter_flow[current_iteration][i])();
+            if (alloc_bytes.empty())
+            {
+                (this->*iter_flow[current_iteration][i])();
+            }
+            else
+            {
+                RunReportingAlloc(i);
+            }
         }
-    }
+        AddPending();
 
-    if (aver_v.size() > 0)
+        int interval = params->GetCheckpointInterval();
+        bool save_checkpoint = !checkpoint_file.empty() && (interval > 0) && ((current_iteration + 1) % interval == 0);
+        if ((pending_iters.size() == (uint)readback_interval) || save_checkpoint)
+        {
+            if (!ReadBack())
+            {
+                printf("the image array has NaN element, quiting this reconstruction process\n");
+                return -3;
+            }
+            if ((stop_iteration < 0) && IsConverged() && state->SkipToFinal())
+            {
+                stop_iteration = current_iteration;
+                printf("converged at iteration %d, continuing with the final ER block\n", current_iteration);
+            }
+        }
+        if (save_checkpoint)
+        {
+            SaveCheckpoint();
+        }
+    }
+    if (!ReadBack())
     {
-        af::array aver_a(ds_image.dims(), &aver_v[0]);
-        af::array ratio = Utils::GetRatio(aver_a, abs(ds_image));
-        ds_image *= ratio/aver_iter;
+        printf("the image array has NaN element, quiting this reconstruction process\n");
+        return -3;
     }
-    ds_image *= support->GetSupportArray();
-    VectorizeSupport();
-    if (partialCoherence != NULL)
+
+    if (!Utils::IsNullArray(aver_sum))
     {
-        VectorizeCoherence();
+        af::array aver_a = aver_sum/aver_iter;
+        // variance of the amplitudes over the averaged iterations, clipped at zero to remove rounding errors
+        variance = aver_sq_sum/aver_iter - aver_a * aver_a;
+        variance = (variance * (variance > 0)).as(data.type());
+        ds_image *= Utils::GetRatio(aver_a.as(data.type()), abs(ds_image));
     }
+    ds_image *= support->GetSupportArray();
     return 0;
 }
 
 void Reconstruction::NextIter()
 {
-    iter_data = data;
+    // the full data is used unless the resolution trigger is active in this iteration
+    iter_level = -1;
     sig = params->GetSupportSigma();
 //     printf("NextIter %d\n", (uint)(getpid()));
 }
 
 void Reconstruction::ResolutionTrigger()
 {
-    iter_data = resolution->GetIterData(current_iteration, data.copy());
+    iter_level = resolution->GetIterLevel(current_iteration);
+    resolution_iter = current_iteration;
     sig = resolution->GetIterSigma(current_iteration);
    //  printf("ResolutionTrigger %d\n", (uint)(getpid()));
 }
 
 void Reconstruction::ShrinkWrapTrigger()
 {
-    support->UpdateAmp(ds_image.copy(), sig, current_iteration);
+    if (Utils::IsNullArray(support_unchanged))
+    {
+        support->UpdateAmp(ds_image, sig, current_iteration);
+        return;
+    }
+    af::array previous = support->GetSupportArray();
+    support->UpdateAmp(ds_image, sig, current_iteration);
+    // the count is reset by any change; it stays on the device until the read back
+    af::array unchanged = allTrue(flat(support->GetSupportArray() == previous)).as(f64);
+    support_unchanged = (support_unchanged + 1) * unchanged;
+    support_unchanged.eval();
   //   printf("SupportTrigger, support norm %fl\n", GetNorm(support->GetSupportArray()));
 }
 
 void Reconstruction::PhaseTrigger()
 {
-    support->UpdatePhase(ds_image.copy(), current_iteration);
+    support->UpdatePhase(ds_image, current_iteration);
    //  printf("PhaseTrigger %d\n", (uint)(getpid()));
 }
 
 void Reconstruction::ToReciprocal()
 {
-    rs_amplitudes = Utils::ifft(ds_image, params->GetNdim())*num_points;
+    // the image is used after the transform by HIO, so this transform is not in place; the scale makes the
+    // transform unnormalized
+    rs_amplitudes = Utils::ifft(ds_image, params->GetNdim(), 1.0);
  //   printf("ToReciprocal, rs_amplitudes norm %fl\n", GetNorm(rs_amplitudes));
 }
 
 void Reconstruction::PcdiTrigger()
 {
-
-    af::array abs_amplitudes = abs(rs_amplitudes).copy();
-    partialCoherence->UpdatePartialCoherence(abs_amplitudes);
+    partialCoherence->UpdatePartialCoherence(abs(rs_amplitudes));
  //    printf("PcdiTrigger %d\n", (uint)(getpid()));
 }
 
 void Reconstruction::Pcdi()
 {
-    af::array abs_amplitudes = abs(rs_amplitudes).copy();
-    af::array converged = partialCoherence->ApplyPartialCoherence(abs_amplitudes);
-    af::array ratio = Utils::GetRatio(iter_data, abs(converged));
-    current_error =  GetNorm(abs(converged)(converged > 0)-iter_data(converged > 0))/GetNorm(iter_data);
-    state->RecordError(current_error);
-    rs_amplitudes *= ratio;
+    af::array converged = partialCoherence->ApplyPartialCoherence(abs(rs_amplitudes));
+    converged.eval();
+    ModulusProjection(abs(converged), converged > 0);
  //    printf("Pcdi %d\n", (uint)(getpid()));
 }
 
 void Reconstruction::NoPcdi()
 {
-    af::array ratio = Utils::GetRatio(iter_data, abs(rs_amplitudes));
-    current_error = GetNorm(abs(rs_amplitudes)(rs_amplitudes > 0)-iter_data(rs_amplitudes > 0))/GetNorm(iter_data);
-    state->RecordError(current_error);
-    rs_amplitudes *= ratio;
+    af::array abs_amplitudes = abs(rs_amplitudes);
+    abs_amplitudes.eval();
+    ModulusProjection(abs_amplitudes, abs_amplitudes > 0);
 //     printf("NoPcdi, rs_amplitudes after correction %fl \n", GetNorm(rs_amplitudes));
 }
 
+void Reconstruction::ModulusProjection(af::array amplitudes, af::array mask)
+{
+    UpdateIterData();
+    // the masked difference is fused with the square and the reduction; masking by multiplication keeps the
+    // members' layout
+    af::array diff = (amplitudes - iter_data) * mask;
+    RecordErrors(GetMemberNorms(diff) / iter_data_norms);
+    // the ratio, with zero amplitudes replaced by 1, is fused with the update
+    rs_amplitudes *= Utils::GetRatio(iter_data, amplitudes);
+    rs_amplitudes.eval();
+}
+
+void Reconstruction::UpdateIterData()
+{
+    if (iter_level == iter_data_level)
+    {
+        return;
+    }
+    if (iter_level < 0)
+    {
+        iter_data = data;
+        iter_data_norms = data_norms;
+    }
+    else
+    {
+        iter_data = resolution->GetIterData(resolution_iter, data);
+        iter_data.eval();
+        iter_data_norms = GetMemberNorms(iter_data);
+        iter_data_norms.eval();
+    }
+    iter_data_level = iter_level;
+}
+
 void Reconstruction::Gc()
 {
+    int policy = params->GetGcPolicy();
+    if (policy == GC_NEVER)
+    {
+        return;
+    }
+    if (policy != GC_ALWAYS)
+    {
+        // the collection releases the buffers cached by the memory manager, so it is done only when they hold
+        // too much memory
+        size_t alloc_bytes, alloc_buffers, lock_bytes, lock_buffers;
+        af::deviceMemInfo(&alloc_bytes, &alloc_buffers, &lock_bytes, &lock_buffers);
+        size_t unused_bytes = alloc_bytes - lock_bytes;
+        if ((policy == GC_THRESHOLD) && (unused_bytes <= params->GetGcThreshold()))
+        {
+            return;
+        }
+        if ((policy == GC_FRACTION) && (unused_bytes <= params->GetGcFraction() * alloc_bytes))
+        {
+            return;
+        }
+    }
     af::deviceGC();
+    gc_count++;
 }
 
 void Reconstruction::SetPcdiPrevious()
@@ -266,51 +402,56 @@ void Reconstruction::SetPcdiPrevious()
 
 void Reconstruction::ToDirect()
 {
-    ds_image_raw = Utils::fft(rs_amplitudes, params->GetNdim())/num_points;
+    // the amplitudes are not used after this, so they are transformed in place; the reciprocal amplitudes are
+    // calculated back from ds_image_raw when requested
+    ds_image_raw = rs_amplitudes;
+    rs_amplitudes = af::array();
+    Utils::FftInPlace(ds_image_raw, params->GetNdim(), 1.0/num_points);
 //     printf("ToDirect, ds_image_raw norm %fl\n", GetNorm(ds_image_raw));
 }
 
 void Reconstruction::Twin()
 {
-    dim4 dims = data.dims();
-    std::vector<int> twin_halves = params->GetTwinHalves();
-    af::array temp = constant(0, dims, u32);
-    int x_start = (twin_halves[0] == 0) ? 0 : dims[0]/2;
-    int x_end = (twin_halves[0] == 0) ? dims[0]/2 -1 : dims[0]-1;
-    int y_start = (twin_halves[1] == 0) ? 0 : dims[1]/2;
-    int y_end = (twin_halves[1] == 0) ? dims[1]/2 -1 : dims[1]-1;
-    temp( af::seq(x_start, x_end), af::seq(y_start, y_end), span, span) = 1;
-    ds_image = ds_image * temp;
+    // the mask does not change during the reconstruction, it is created at the first trigger
+    if (Utils::IsNullArray(twin_mask))
+    {
+        dim4 dims = data.dims();
+        std::vector<int> twin_halves = params->GetTwinHalves();
+        twin_mask = constant(0, dims, ds_image.issingle() ? f32 : f64);
+        int x_start = (twin_halves[0] == 0) ? 0 : dims[0]/2;
+        int x_end = (twin_halves[0] == 0) ? dims[0]/2 -1 : dims[0]-1;
+        int y_start = (twin_halves[1] == 0) ? 0 : dims[1]/2;
+        int y_end = (twin_halves[1] == 0) ? dims[1]/2 -1 : dims[1]-1;
+        twin_mask( af::seq(x_start, x_end), af::seq(y_start, y_end), span, span) = 1;
+    }
+    ds_image = ds_image * twin_mask;
 //     printf("Twin\n");
 }
 
 void Reconstruction::Average()
 {
     aver_iter++;
-    af::array abs_image = abs(ds_image).copy();
-    d_type *image_v = abs_image.host<d_type>();
-    std::vector<d_type> v(image_v, image_v + ds_image.elements());
-    if (aver_v.size() == 0)
+    // the sums are accumulated on the device in double precision
+    af::array abs_image = abs(ds_image).as(f64);
+    if (Utils::IsNullArray(aver_sum))
     {
-        for (uint i = 0; i < v.size(); i++)
-        {
-            aver_v.push_back(v[i]);
-        }
+        aver_sum = abs_image;
+        aver_sq_sum = abs_image * abs_image;
     }
     else
     {
-        for (uint i = 0; i < v.size(); i++)
-        {
-            aver_v[i] += v[i];
-        }
+        aver_sum += abs_image;
+        aver_sq_sum += abs_image * abs_image;
     }
-    delete [] image_v;
+    aver_sum.eval();
+    aver_sq_sum.eval();
  //   printf("Average\n");
 }
 
 void Reconstruction::Progress()
 {
-    printf("------- current iteration %i, error %f -------\n", current_iteration, current_error);
+    // the error of this iteration is known after the read back, which prints the progress
+    print_progress = true;
 }
 
 void Reconstruction::ModulusConstrainEr()
@@ -331,28 +472,178 @@ void Reconstruction::ModulusConstrainHio()
 //  printf("hio, image norm after support %fl\n",GetNorm(ds_image));
 }
 
+void Reconstruction::SetCheckpoint(std::string file)
+{
+    checkpoint_file = file;
+}
+
+void Reconstruction::SaveCheckpoint()
+{
+    std::string tmp_file = checkpoint_file + ".tmp";
+    const char *file = tmp_file.c_str();
+    d_type run_state[] = {d_type(current_iteration), d_type(state->GetAlgSwitchIndex()), d_type(first_run), d_type(aver_iter), current_error, d_type(stop_iteration)};
+    af::saveArray("state", af::array(6, run_state), file, false);
+    af::saveArray("image", ds_image, file, true);
+    af::saveArray("support", support->GetSupportArray(), file, true);
+    std::vector<d_type> errors = state->GetErrors();
+    if (errors.size() > 0)
+    {
+        af::saveArray("errors", af::array(errors.size(), &errors[0]), file, true);
+    }
+    if (!Utils::IsNullArray(aver_sum))
+    {
+        af::saveArray("average", aver_sum, file, true);
+        af::saveArray("average_sq", aver_sq_sum, file, true);
+    }
+    if (partialCoherence != NULL)
+    {
+        af::saveArray("coherence", partialCoherence->GetKernelArray(), file, true);
+        if (!Utils::IsNullArray(partialCoherence->GetPreviousArray()))
+        {
+            af::saveArray("coherence_prev", partialCoherence->GetPreviousArray(), file, true);
+        }
+    }
+    std::rename(file, checkpoint_file.c_str());
+}
+
+void Reconstruction::Restore(std::string file_name)
+{
+    const char *file = file_name.c_str();
+    std::vector<d_type> run_state = Utils::ToVector(af::readArray(file, "state"));
+    std::vector<d_type> errors;
+    if (af::readArrayCheck(file, "errors") >= 0)
+    {
+        errors = Utils::ToVector(af::readArray(file, "errors"));
+    }
+    current_iteration = int(run_state[0]);
+    state->Restore(current_iteration, int(run_state[1]), errors);
+    first_run = (run_state[2] != 0);
+    aver_iter = int(run_state[3]);
+    current_error = run_state[4];
+    if (run_state.size() > 5)
+    {
+        stop_iteration = int(run_state[5]);
+    }
+    if (af::readArrayCheck(file, "average") >= 0)
+    {
+        aver_sum = af::readArray(file, "average");
+        aver_sq_sum = af::readArray(file, "average_sq");
+    }
+    if ((partialCoherence != NULL) && (af::readArrayCheck(file, "coherence_prev") >= 0))
+    {
+        partialCoherence->RestorePrevious(af::readArray(file, "coherence_prev"));
+    }
+}
+
 double Reconstruction::GetNorm(af::array arr)
 {
-    return sum<d_type>(pow(abs(arr), 2));
+    return sum<d_type>(pow(abs(arr), 2).as(reduce_type));
+}
+
+af::array Reconstruction::GetMemberNorms(af::array arr)
+{
+    return Utils::MemberSum(pow(abs(arr), 2), reduce_type);
+}
+
+void Reconstruction::RecordErrors(af::array member_errors)
+{
+    // the errors stay on the device until the read back
+    iter_errors = moddims(member_errors, batch_size).as(f64);
 }
 
-void Reconstruction::VectorizeSupport()
+void Reconstruction::AddPending()
 {
-    af::array a = support->GetSupportArray().as(f32);
-    float *support_v = a.host<float>();
-    std::vector<float> v(support_v, support_v + a.elements());
-    support_vector = v;
-    delete [] support_v;
- }
+    int column = pending_iters.size();
+    if (!Utils::IsNullArray(iter_errors))
+    {
+        pending_errors(span, column) = iter_errors;
+    }
+    af::array image_nan = anyTrue(flat(isNaN(ds_image)));
+    nan_found = (column == 0) ? image_nan : (nan_found || image_nan);
+    pending_iters.push_back(current_iteration);
+    pending_algs.push_back(state->GetCurrentAlg());
+    pending_prints.push_back(print_progress);
+    print_progress = false;
+}
+
+bool Reconstruction::ReadBack()
+{
+    uint pending = pending_iters.size();
+    if (pending == 0)
+    {
+        return true;
+    }
+    // the errors and the NaN flag are copied to the host in one transfer
+    af::array values = join(0, flat(pending_errors(span, seq(0, pending - 1))), nan_found.as(f64));
+    if (!Utils::IsNullArray(support_unchanged))
+    {
+        values = join(0, values, support_unchanged);
+        values.eval();
+    }
+    std::vector<d_type> host_values = Utils::ToVector(values);
+    d_type iter_time = timer::stop(readback_timer) / pending;
+    readback_timer = timer::start();
+
+    for (uint i = 0; i < pending; i++)
+    {
+        current_error = 0;
+        for (int j = 0; j < batch_size; j++)
+        {
+            d_type error = host_values[i * batch_size + j];
+            state->RecordError(error);
+            current_error += error;
+        }
+        // the progress reports average error of the batch
+        current_error /= batch_size;
+        if (pending_prints[i])
+        {
+            printf("------- current iteration %i, error %f -------\n", pending_iters[i], current_error);
+        }
+        if (progress != NULL)
+        {
+            progress->Write(pending_iters[i], current_error, pending_algs[i], iter_flow_mask[pending_iters[i]], iter_time);
+        }
+    }
+    pending_iters.clear();
+    pending_algs.clear();
+    pending_prints.clear();
+    if (!Utils::IsNullArray(support_unchanged))
+    {
+        support_unchanged_updates = int(host_values.back());
+    }
+    return (host_values[pending * batch_size] == 0);
+}
 
-void Reconstruction::VectorizeCoherence()
+bool Reconstruction::IsConverged()
 {
-    // get the partial coherence as double, so it will work for float and double data types
-    af::array a = partialCoherence->GetKernelArray().copy();
-    d_type *coherence_v = a.host<d_type>();
-    std::vector<d_type> v(coherence_v, coherence_v + a.elements());
-    coherence_vector = v;
-    delete [] coherence_v;
+    // the error goes up and down during HIO, so the convergence is not checked while HIO runs
+    if (state->GetCurrentAlg() == ALGORITHM_HIO)
+    {
+        return false;
+    }
+    int updates = params->GetConvergenceSupportUpdates();
+    if ((updates > 0) && (support_unchanged_updates >= updates))
+    {
+        return true;
+    }
+    int window = params->GetConvergenceWindow();
+    int iterations = state->GetNumberErrors() / batch_size;
+    if ((window == 0) || (iterations <= window))
+    {
+        return false;
+    }
+    d_type epsilon = params->GetConvergenceEpsilon();
+    for (int j = 0; j < batch_size; j++)
+    {
+        d_type previous = state->GetError((iterations - 1 - window) * batch_size + j);
+        d_type last = state->GetError((iterations - 1) * batch_size + j);
+        // converged only if the error did not increase and improved less than epsilon over the window
+        if ((last > previous) || (previous - last > epsilon * previous))
+        {
+            return false;
+        }
+    }
+    return true;
 }
 
 af::array Reconstruction::GetImage()
@@ -360,6 +651,11 @@ af::array Reconstruction::GetImage()
     return ds_image;
 }
 
+af::array Reconstruction::GetVarianceArray()
+{
+    return variance;
+}
+
 af::array Reconstruction::GetSupportArray()
 {
     return support->GetSupportArray();
@@ -367,6 +663,10 @@ af::array Reconstruction::GetSupportArray()
 
 af::array Reconstruction::GetCoherenceArray()
 {
+    if (partialCoherence == NULL)
+    {
+        return af::array();
+    }
     return partialCoherence->GetKernelArray();
 }
 
@@ -375,29 +675,38 @@ std::vector<d_type> Reconstruction::GetErrors()
     return state->GetErrors();
 }
 
-std::vector<float> Reconstruction::GetSupportVector()
+af::array Reconstruction::GetReciprocal()
 {
-    return support_vector;
+    // the amplitudes are transformed in place to the direct space in each iteration, so they are calculated back
+    if (Utils::IsNullArray(ds_image_raw))
+    {
+        return rs_amplitudes;
+    }
+    return Utils::ifft(ds_image_raw, params->GetNdim(), 1.0);
 }
 
-std::vector<d_type> Reconstruction::GetCoherenceVector()
+void Reconstruction::RunReportingAlloc(int i)
 {
-    return coherence_vector;
+    size_t before = Utils::GetAllocatedBytes();
+    (this->*iter_flow[current_iteration][i])();
+    // the allocations of a lazily evaluated expression are accounted to the flow item that evaluates it
+    long long allocated = (long long)Utils::GetAllocatedBytes() - (long long)before;
+    alloc_bytes[iter_flow_item[current_iteration][i] * params->GetNumberIterations() + current_iteration] += allocated;
 }
 
-std::vector<d_type> Reconstruction::GetCoherenceVectorR()
+int Reconstruction::GetGcCount()
 {
-    return coherence_vector;
+    return gc_count;
 }
 
-std::vector<d_type> Reconstruction::GetCoherenceVectorI()
+int Reconstruction::GetStopIteration()
 {
-    return coherence_vector;
+    return stop_iteration;
 }
 
-af::array Reconstruction::GetReciprocal()
+std::vector<long long> Reconstruction::GetAllocReport()
 {
-    return rs_amplitudes;
+    return alloc_bytes;
 }
 
 std::vector<int> Reconstruction::GetFlowVector()
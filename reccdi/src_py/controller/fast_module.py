@@ -11,30 +11,625 @@ The processor specifies which library will be used by FM (Fast Module) that perf
 """
 
 import numpy as np
-import copy
+import os
 import sys
+import threading
+import reccdi.src_py.utilities.utils as ut
 
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
-__all__ = ['fast_module_reconstruction',]
+__all__ = ['ALGORITHM_NAMES',
+           'get_bridge',
+           'Session',
+           'coarse_reconstruction',
+           'fast_module_reconstruction',]
 
 
-def fast_module_reconstruction(proc, device, conf, data, coh_dims, image=None, support=None, coherence=None):
+# maps algorithm id reported by CFM in progress records to algorithm name
+ALGORITHM_NAMES = {2 : 'ER', 3 : 'HIO'}
+
+
+def get_bridge(proc):
+    """
+    This function imports bridge module corresponding to the requested processor type and returns the bridge instance.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type/library, chices are: cpu, cuda, opencl
+
+    Returns
+    -------
+    fast_module : PyBridge
+        bridge object, access to the CFM (Calc Fast Module), or None if the library could not be imported
     """
-    This function calls a bridge method corresponding to the requested processor type. The bridge method is an access
-    to the CFM (Calc Fast Module). When reconstruction is completed the function retrieves results from the CFM.
+    try:
+        if proc == 'cpu':
+            import reccdi.src_py.cyth.bridge_cpu as bridge_cpu
+            return bridge_cpu.PyBridge()
+        elif proc == 'opencl':
+            import reccdi.src_py.cyth.bridge_opencl as bridge_opencl
+            return bridge_opencl.PyBridge()
+        elif proc == 'cuda':
+            if sys.platform == 'darwin':
+                print ('cuda library is not supported on mac platform')
+            else:
+                import reccdi.src_py.cyth.bridge_cuda as bridge_cuda
+                return bridge_cuda.PyBridge()
+    except Exception as ex:
+        print(str(ex))
+    print ('could not import library')
+    return None
+
+
+class Session:
+    """
+    This class keeps a CFM (Calc Fast Module) session. The data, parsed configuration, device context and FFT plans are
+    kept in the CFM between reconstructions, so consecutive reconstructions on the same data (i.e. GA generations) do
+    not repeat the setup and data transfer.
     The data received is max centered and the array is ordered "C". The CFM requires data zero-frequency component at
-    the center of the spectrum and "F" array order. Thus the data is modified at the beginning.
+    the center of the spectrum and "F" array order. Thus the data is modified when it is set.
+    """
+    def __init__(self, proc, device, params, data):
+        """
+        Constructor, imports the bridge and initializes the CFM session with data.
+
+        Parameters
+        ----------
+        proc : str
+            a string indicating the processor type/library, chices are: cpu, cuda, opencl
+        device : int
+            device id assigned to this session
+        params : dict
+            reconstruction parameters, see utils.get_fast_module_params
+        data : ndarray
+            np array containing pre-processed, formatted experiment data
+        """
+        self.shape = data.shape
+        self.fast_module = get_bridge(proc)
+        if self.fast_module is not None:
+            # the arrays are passed to the bridge as buffers; the "C" ordered arrays with reversed dims are read as "F" order
+            self.fast_module.init(device, np.fft.fftshift(data), self.shape[::-1], params)
+
+
+    def set_data(self, data):
+        """
+        Replaces the data in the session. The new data must have the same shape.
+
+        Parameters
+        ----------
+        data : ndarray
+            np array containing pre-processed, formatted experiment data
+
+        Returns
+        -------
+        nothing
+        """
+        if self.fast_module is not None:
+            self.fast_module.set_data(np.fft.fftshift(data))
+
+
+    def get_progress(self):
+        """
+        Returns the iteration records written by the CFM since the previous call. The CFM does not hold the GIL while
+        running, so this method can be called from another thread to watch the reconstruction while it runs.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        records : list
+            list of dictionaries, one for each iteration, with keys: 'iteration', 'error', 'algorithm' (name),
+            'flow', list of functions executed in the iteration, given the same way as the flow returned by run, and
+            'time', wall time of the iteration in seconds. If error_readback_interval is configured, the records
+            arrive at each read back, and the time is the average of the iterations since the previous read back
+        """
+        if self.fast_module is None:
+            return []
+        records = self.fast_module.get_progress()
+        for record in records:
+            record['algorithm'] = ALGORITHM_NAMES.get(record['algorithm'], record['algorithm'])
+            mask = record['flow']
+            record['flow'] = [i for i in range(mask.bit_length()) if (mask >> i) & 1]
+        return records
+
+
+    def cancel(self):
+        """
+        Requests cancellation of the reconstruction in progress, or of the next reconstruction if none is running. The
+        cancelled run returns no results. It can be called from another thread or from the progress callback, i.e.
+        to stop a GA member that is clearly losing.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        if self.fast_module is not None:
+            self.fast_module.cancel()
+
+
+    def pause(self):
+        """
+        Pauses the reconstruction in progress at the beginning of the next iteration, until resumed or cancelled.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        if self.fast_module is not None:
+            self.fast_module.pause()
+
+
+    def resume(self):
+        """
+        Resumes paused reconstruction.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        if self.fast_module is not None:
+            self.fast_module.resume()
+
+
+    def is_paused(self):
+        """
+        Returns True if the session is paused.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        paused : bool
+            True if pause was requested and not resumed
+        """
+        return self.fast_module is not None and self.fast_module.is_paused()
+
+
+    def get_gauss_cache_stats(self):
+        """
+        Returns statistics of the Gaussian grid cache kept by the session on the device.
+
+        The grids used by shrink wrap and low resolution are calculated once and reused by the following iterations and runs. The statistics are read without waiting for a running reconstruction, so this method can be called from another thread while it runs.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        stats : dict
+            number of 'hits', 'misses', and number of grids in the cache, 'size'
+        """
+        if self.fast_module is None:
+            return None
+        return self.fast_module.get_gauss_cache_stats()
+
+
+    def run_engine(self, engine_func, callback, interval, *args, **kwargs):
+        """
+        Runs the CFM reconstruction function with given arguments. If callback is given, the CFM runs in a separate
+        thread and the calling thread passes the progress records to the callback every interval.
+
+        Parameters
+        ----------
+        engine_func : callable
+            the bridge function running reconstruction
+        callback : callable
+            function taking list of progress records, or None
+        interval : float
+            time in seconds between progress polls
+
+        Returns
+        -------
+        nothing
+        """
+        # discard records left from previous runs
+        self.get_progress()
+        if callback is None:
+            engine_func(*args, **kwargs)
+            return
+
+        engine = threading.Thread(target=engine_func, args=args, kwargs=kwargs)
+        engine.start()
+        try:
+            while engine.is_alive():
+                engine.join(interval)
+                records = self.get_progress()
+                if len(records) > 0:
+                    callback(records)
+        finally:
+            engine.join()
+
+
+    def run(self, image=None, support=None, coherence=None, callback=None, interval=1.0, variance=False):
+        """
+        Runs reconstruction on the session data and retrieves the results from the CFM.
+
+        Parameters
+        ----------
+        image : ndarray
+            initial image to continue reconstruction or None if random initial image
+        support : ndarray
+            support corresponding to image if continuation or None
+        coherence : ndarray
+           coherence corresponding to image if continuation and active pcdi feature or None
+        callback : callable
+            optional function receiving list of progress records (see get_progress) while the reconstruction runs
+        interval : float
+            time in seconds between callbacks
+        variance : bool
+            if True, the variance map is returned after the results listed below, see get_results
+
+        Returns
+        -------
+        image : ndarray
+            reconstructed image
+        support : ndarray
+            support for reconstructed image
+        coherence : ndarray
+            coherence for reconstructed image or None if pcdi inactive
+        er : list
+            a vector containing errors for each iteration
+        flow : ndarray
+            info to scientist/developer; a list of functions  that can run in one iterations (excluding inactive features)
+        iter_array : ndarray
+            info to scientist/developer; an array of 0s and 1s, 1 meaning the function in flow will be executed in iteration, 0 otherwise
+        """
+        if self.fast_module is None:
+            return (None,) * (7 if variance else 6)
+
+        if image is None:
+            self.run_engine(self.fast_module.run, callback, interval)
+        elif coherence is None:
+            self.run_engine(self.fast_module.run, callback, interval, image, support)
+        else:
+            self.run_engine(self.fast_module.run, callback, interval, image, support, coherence, coherence.shape[::-1])
+        return self.get_results(variance)
+
+
+    def set_checkpoint(self, filename):
+        """
+        Sets the file the CFM saves the reconstruction state to, every "checkpoint_interval" iterations. The
+        reconstruction can be resumed from the checkpoint, i.e. when the run was preempted.
+
+        Parameters
+        ----------
+        filename : str
+            checkpoint file name
+
+        Returns
+        -------
+        nothing
+        """
+        if self.fast_module is not None:
+            self.fast_module.set_checkpoint(filename)
+
+
+    def resume_checkpoint(self, filename, callback=None, interval=1.0, variance=False):
+        """
+        Resumes reconstruction saved in the checkpoint file and retrieves the results from the CFM. The reconstruction
+        continues from the iteration the checkpoint was saved at.
+
+        Parameters
+        ----------
+        filename : str
+            checkpoint file name
+        callback : callable
+            optional function receiving list of progress records (see get_progress) while the reconstruction runs
+        interval : float
+            time in seconds between callbacks
+        variance : bool
+            if True, the variance map is returned after the results, see get_results
+
+        Returns
+        -------
+        same as run
+        """
+        if self.fast_module is None:
+            return (None,) * (7 if variance else 6)
+
+        self.run_engine(self.fast_module.resume_checkpoint, callback, interval, filename)
+        return self.get_results(variance)
+
+
+    def get_results(self, variance=False):
+        """
+        Retrieves the results of the last reconstruction from the CFM.
+
+        Parameters
+        ----------
+        variance : bool
+            if True, the variance map is returned as the last result
+
+        Returns
+        -------
+        image : ndarray
+            reconstructed image
+        support : ndarray
+            support for reconstructed image
+        coherence : ndarray
+            coherence for reconstructed image or None if pcdi inactive
+        er : list
+            a vector containing errors for each iteration
+        flow : ndarray
+            info to scientist/developer; a list of functions  that can run in one iterations (excluding inactive features)
+        iter_array : ndarray
+            info to scientist/developer; an array of 0s and 1s, 1 meaning the function in flow will be executed in iteration, 0 otherwise
+        variance : ndarray
+            returned only if variance is True; per voxel variance of the image amplitudes over the averaging iterations, scaled as the normalized image, or None if averaging was inactive
+        """
+        ec = self.fast_module.is_success()
+        if ec < 0:
+            print ('the reconstruction in c++ module encountered problems')
+            # -1 error code is returned when cancelled, -2 when device can't be set, -2 when NAN is found in image array, -3 if configuration parameters are missing
+            # -4 if the configuration is not supported in batch, -5 if the checkpoint can't be read, -6 if the engine threw an exception
+            return (None,) * (7 if variance else 6)
+
+        fast_module = self.fast_module
+        er = fast_module.get_errors()
+        # the results are copied from the fast module directly into preallocated arrays
+        if fast_module.is_single_precision():
+            image = np.empty(self.shape, dtype=np.complex64)
+        else:
+            image = np.empty(self.shape, dtype=np.complex128)
+        fast_module.get_image(image)
+
+        # normalize image
+        mx = np.abs(image).max()
+        image /= mx
+
+        support = np.empty(self.shape, dtype=np.uint8)
+        fast_module.get_support(support)
+        coh_shape = tuple(fast_module.get_coherence_dims())[::-1]
+        if len(coh_shape) > 0:
+            coherence = np.empty(coh_shape)
+            fast_module.get_coherence(coherence)
+        else:
+            coherence = None
+
+        flow, iter_array = self.get_flow()
+
+        print (' ')
+        if not variance:
+            return image, support, coherence, er, flow, iter_array
+
+        if fast_module.has_variance():
+            var = np.empty(self.shape, dtype=np.float32 if image.dtype == np.complex64 else np.float64)
+            fast_module.get_variance(var)
+            var /= mx * mx
+        else:
+            var = None
+        return image, support, coherence, er, flow, iter_array, var
+
+
+    def run_batch(self, batch_size, images=None, supports=None, callback=None, interval=1.0):
+        """
+        Runs a batch of reconstructions on the session data in one CFM run. The images are stacked in the CFM and the
+        FFTs run batched over the stack. Each member of the batch has its own support and errors. Partial coherence is
+        not supported in batch.
+
+        Parameters
+        ----------
+        batch_size : int
+            number of reconstructions in the batch
+        images : ndarray
+            initial images stacked along the first axis to continue reconstruction or None if random initial images
+        supports : ndarray
+            supports corresponding to images stacked along the first axis if continuation or None
+        callback : callable
+            optional function receiving list of progress records (see get_progress) while the reconstruction runs; the
+            error in the records is the average error of the batch
+        interval : float
+            time in seconds between callbacks
+
+        Returns
+        -------
+        images : ndarray
+            reconstructed images stacked along the first axis
+        supports : ndarray
+            supports for reconstructed images stacked along the first axis
+        errs : ndarray
+            errors by iteration for each reconstruction, shape (batch size, iterations)
+        flow : ndarray
+            info to scientist/developer; a list of functions  that can run in one iterations (excluding inactive features)
+        iter_array : ndarray
+            info to scientist/developer; an array of 0s and 1s, 1 meaning the function in flow will be executed in iteration, 0 otherwise
+        """
+        if self.fast_module is None:
+            return None, None, None, None, None
+
+        # the arrays stacked along the first "C" axis are stacked along the last dimension in the CFM
+        self.run_engine(self.fast_module.run, callback, interval, images, supports, batch=batch_size)
+
+        ec = self.fast_module.is_success()
+        if ec < 0:
+            print ('the reconstruction in c++ module encountered problems')
+            return None, None, None, None, None
+
+        fast_module = self.fast_module
+        batch_shape = (batch_size,) + self.shape
+        # the errors are recorded for all members in each iteration
+        errs = np.asarray(fast_module.get_errors()).reshape(-1, batch_size).T
+        if fast_module.is_single_precision():
+            images = np.empty(batch_shape, dtype=np.complex64)
+        else:
+            images = np.empty(batch_shape, dtype=np.complex128)
+        fast_module.get_image(images)
+
+        # normalize each image
+        mx = np.abs(images).reshape(batch_size, -1).max(axis=1)
+        images /= mx.reshape((batch_size,) + (1,) * len(self.shape))
+
+        supports = np.empty(batch_shape, dtype=np.uint8)
+        fast_module.get_support(supports)
+
+        flow, iter_array = self.get_flow()
+
+        print (' ')
+        return images, supports, errs, flow, iter_array
+
+
+    def get_flow(self):
+        """
+        Retrieves the flow of the last reconstruction from the CFM.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        flow : ndarray
+            info to scientist/developer; a list of functions  that can run in one iterations (excluding inactive features)
+        iter_array : ndarray
+            info to scientist/developer; an array of 0s and 1s, 1 meaning the function in flow will be executed in iteration, 0 otherwise
+        """
+        iter_array = np.asarray(self.fast_module.get_iter_flow())
+        flow = list(self.fast_module.get_flow())
+        flow_len = len(flow)
+        iter_array = np.reshape(iter_array, (flow_len, int(iter_array.shape[0]/flow_len)))
+        return flow, iter_array
+
+
+    def get_run_stats(self):
+        """
+        Retrieves statistics of the last reconstruction from the CFM.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        stats : dict
+            statistics mapped by name: 'gc_count', number of garbage collections done by the garbage trigger, and
+            'stop_iteration', the iteration after which the convergence rules skipped to the final ER block, or -1 if
+            the algorithm sequence ran in full
+        """
+        if self.fast_module is None:
+            return None
+        return self.fast_module.get_run_stats()
+
+
+    def get_alloc_report(self):
+        """
+        Retrieves the bytes allocated on the device by each flow item in each iteration of the last reconstruction.
+
+        The report is recorded if the configuration has alloc_report set to True. The bytes are the growth of the memory held by the ArrayFire memory manager, so an item that allocates more than before, i.e. an added copy, shows in the report.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        alloc_array : ndarray
+            array of bytes of the same shape as the iter_array returned by get_flow, or None if not reported
+        """
+        if self.fast_module is None or self.fast_module.is_success() < 0:
+            return None
+        report = np.asarray(self.fast_module.get_alloc_report())
+        if report.shape[0] == 0:
+            return None
+        flow_len = len(self.fast_module.get_flow())
+        return np.reshape(report, (flow_len, int(report.shape[0]/flow_len)))
+
+
+    def close(self):
+        """
+        Closes the session, releasing the CFM resources.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        if self.fast_module is not None:
+            self.fast_module.cleanup()
+            self.fast_module = None
+
+
+def coarse_reconstruction(proc, device, params, data):
+    """
+    This function runs the coarse stage of a reconstruction. The data is cropped in reciprocal space by the
+    "coarse_binning" factor, so the image is reconstructed on a grid with larger pixels and the same field of view.
+    The reconstructed image and support are upsampled to the data shape by zero padding the spectrum.
+
+    Parameters
+    ----------
+    proc : str
+        a string indicating the processor type/library, chices are: cpu, cuda, opencl
+    device : int
+        device id assigned to this reconstruction
+    params : dict
+        parameters of the coarse stage, see utils.get_coarse_params
+    data : ndarray
+        np array containing pre-processed, formatted experiment data
+
+    Returns
+    -------
+    image : ndarray
+        reconstructed image upsampled to the data shape, or None if the reconstruction failed
+    support : ndarray
+        support upsampled to the data shape
+    coherence : ndarray
+        coherence for reconstructed image or None if pcdi inactive
+    er : list
+        a vector containing errors for each iteration of the coarse stage
+    """
+    binning = int(params['coarse_binning'])
+    shape = tuple(min(dim, ut.get_good_dim(dim // binning)) for dim in data.shape)
+    session = Session(proc, device, params, ut.crop_center(data, shape))
+    image, support, coherence, er, flow, iter_array = session.run()
+    session.close()
+    if image is None:
+        return None, None, None, None
+
+    image = ut.get_upsampled(image, data.shape).astype(image.dtype)
+    support = (ut.get_upsampled(support, data.shape).real > .5).astype(support.dtype)
+    return image, support, coherence, er
+
+
+def fast_module_reconstruction(proc, device, params, data, coh_dims, image=None, support=None, coherence=None, checkpoint=None, run_stats=None):
+    """
+    This function runs a single reconstruction in a new CFM (Calc Fast Module) session. When reconstruction is
+    completed the function retrieves results from the CFM and closes the session.
+    If checkpoint file is given, the reconstruction state is saved to it every "checkpoint_interval" iterations. If the
+    checkpoint file exists, i.e. left by a preempted run, the reconstruction resumes from it. The checkpoint is removed
+    when the reconstruction completes.
+    If the coarse stage is configured and the reconstruction starts from a random image, the first iterations run on
+    the reduced grid, see coarse_reconstruction, and the full size reconstruction continues from the upsampled image.
+    The errors of both stages are returned, the flow and iter_array describe the full size stage.
     Parameters
     ----------
     proc : str
         a string indicating the processor type/library, chices are: cpu, cuda, opencl
     device : int
         device id assigned to this reconstruction
-    conf : str
-        configuration file name containing reconstruction parameters
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
     data : ndarray
         np array containing pre-processed, formatted experiment data
     coh_dims : tuple
@@ -45,6 +640,11 @@ def fast_module_reconstruction(proc, device, conf, data, coh_dims, image=None, s
         support corresponding to image if continuation or None
     coherence : ndarray
        coherence corresponding to image if continuation and active pcdi feature or None
+    checkpoint : str
+        checkpoint file name or None
+    run_stats : dict
+        if given, the statistics of the full size run are added to it, see Session.get_run_stats, and the allocation
+        report under the 'alloc_array' key if it was recorded, see Session.get_alloc_report
        
     Returns
     -------
@@ -61,79 +661,35 @@ def fast_module_reconstruction(proc, device, conf, data, coh_dims, image=None, s
     iter_array : ndarray
         info to scientist/developer; an array of 0s and 1s, 1 meaning the function in flow will be executed in iteration, 0 otherwise
     """
-    try:
-        if proc == 'cpu':
-            import reccdi.src_py.cyth.bridge_cpu as bridge_cpu
-            fast_module = bridge_cpu.PyBridge()
-        elif proc == 'opencl':
-            import reccdi.src_py.cyth.bridge_opencl as bridge_opencl
-            fast_module = bridge_opencl.PyBridge()
-        elif proc == 'cuda':
-            if sys.platform == 'darwin':
-                print ('cuda library is not supported on mac platform')
-            else:
-                import reccdi.src_py.cyth.bridge_cuda as bridge_cuda
-                fast_module = bridge_cuda.PyBridge()
-    except Exception as ex:
-        print(str(ex))
-        print ('could not import library')
-        return None, None, None, None, None, None
-    
-    conf = conf + '_tmp'
-
-    # shift data
-    data = np.fft.fftshift(data)
-    dims = data.shape[::-1]
-    data_l = data.flatten().tolist()
+    resume = checkpoint is not None and os.path.isfile(checkpoint)
+    coarse_er = []
     if image is None:
-        fast_module.start_calc(device, data_l, dims, conf)
-    elif support is None:
-        image = image.flatten()
-        fast_module.start_calc_with_guess(device, data_l, image.real.tolist(), image.imag.tolist(), dims, conf)
-    elif coherence is None:
-        image = image.flatten()
-        support = support.flatten()
-        fast_module.start_calc_with_guess_support(device, data_l, image.real.tolist(), image.imag.tolist(), support.tolist(), dims, conf)
-    else:
-        image = image.flatten()
-        support = support.flatten()
-        coh_dims1 = (coh_dims[2], coh_dims[1], coh_dims[0])
-        coherence = coherence.flatten()
-
-        fast_module.start_calc_with_guess_support_coh(device, data_l, image.real.tolist(), image.imag.tolist(), support.tolist(), dims, coherence.tolist(), coh_dims, conf)
-
-    ec = fast_module.is_success()
-
-    if ec < 0:
-        print ('the reconstruction in c++ module encountered problems')
-        # -1 error code is returned when ctl-c, -2 when device can't be set, -2 when NAN is found in image array, -3 if no config file found
-        fast_module.cleanup()
-        return None, None, None, None, None, None
+        coarse_params, fine_params = ut.get_coarse_params(params)
+        if coarse_params is not None:
+            # the checkpoint is saved by the full size stage, so the coarse stage is not repeated on resume
+            params = fine_params
+            if not resume:
+                image, support, coherence, coarse_er = coarse_reconstruction(proc, device, coarse_params, data)
+                if image is None:
+                    return (None,) * 6
 
-    er = copy.deepcopy(fast_module.get_errors())
-    image_r = np.asarray(fast_module.get_image_r())
-    image_i = np.asarray(fast_module.get_image_i())
-    image = image_r + 1j*image_i  #no need to deepcopy the real and imag parts since this makes a new array
-
-    # normalize image
-    mx = np.abs(image).max()
-    image = image/mx
-
-    support = copy.deepcopy(np.asarray(fast_module.get_support()))
-    coherence = copy.deepcopy(np.asarray(fast_module.get_coherence()))
-
-    image.shape=dims[::-1]
-    support = np.reshape(support, dims[::-1])
-    if coherence.shape[0] > 1:
-        coherence = np.reshape(coherence, coh_dims[::-1])
+    session = Session(proc, device, params, data)
+    if checkpoint is not None:
+        session.set_checkpoint(checkpoint)
+    if resume:
+        print ('resuming from checkpoint ' + checkpoint)
+        results = session.resume_checkpoint(checkpoint)
     else:
-        coherence = None
-
-    iter_array = copy.deepcopy(np.asarray(fast_module.get_iter_flow()))
-    flow = copy.deepcopy(list(fast_module.get_flow()))
-    flow_len = len(flow)
-    iter_array = np.reshape(iter_array, (flow_len, int(iter_array.shape[0]/flow_len)))
-
-    fast_module.cleanup()
-    print (' ')
-    return image, support, coherence, er, flow, iter_array
+        results = session.run(image, support, coherence)
+    if run_stats is not None and results[0] is not None:
+        run_stats.update(session.get_run_stats())
+        alloc_array = session.get_alloc_report()
+        if alloc_array is not None:
+            run_stats['alloc_array'] = alloc_array
+    session.close()
+    if len(coarse_er) > 0 and results[0] is not None:
+        results = results[:3] + (list(coarse_er) + list(results[3]),) + results[4:]
+    # the checkpoint is kept if the reconstruction did not complete
+    if checkpoint is not None and results[0] is not None and os.path.isfile(checkpoint):
+        os.remove(checkpoint)
+    return results
@@ -11,7 +11,7 @@ This module controls the genetic algoritm process.
 
 import numpy as np
 import os
-import reccdi.src_py.controller.reconstruction as single
+import reccdi.src_py.controller.fast_module as calc
 import reccdi.src_py.controller.reconstruction_multi as multi
 import reccdi.src_py.utilities.utils as ut
 import reccdi.src_py.utilities.utils_ga as gut
@@ -229,7 +229,8 @@ class Generation:
             
         Returns
         -------
-        nothing
+        success : bool
+            True when the child was saved
         """
         (parent_dir, breed_dir) = dirs
         image_file = os.path.join(parent_dir, 'image.npy')
@@ -300,9 +301,10 @@ class Generation:
         threshold = self.ga_support_thresholds[self.current_gen]
         new_support = ut.shrink_wrap(beta, threshold, sigma)
         np.save(os.path.join(breed_dir, 'support.npy'), new_support)
-        
+        return True
 
-    def breed(self, breed_dir, dirs):
+
+    def breed(self, breed_dir, dirs, pool=None):
         """
         Breeds next generation.
         
@@ -314,11 +316,13 @@ class Generation:
             a directory where subdirectories with 'child' images will be created
         dirs : tuple
             list of directories where the image to breed from is stored, a 'parent', ordered from best to worst
+        pool : WorkerPool
+            pool of workers running the breeding, or None to start workers for this generation
             
         Returns
         -------
         breed_dirs : list
-            list of directories containing 'child' images
+            list of directories containing 'child' images; the children that failed to breed are left out
         """
         breed_mode = self.breed_modes[self.current_gen]
         if breed_mode == 'none':
@@ -344,15 +348,25 @@ class Generation:
         shutil.copyfile(os.path.join(dirs[0], 'image.npy'), os.path.join(breed_dirs[0], 'image.npy'))
         shutil.copyfile(os.path.join(dirs[0], 'support.npy'), os.path.join(breed_dirs[0], 'support.npy'))
 
-        no_processes = min(len(dirs), mp.cpu_count())
         func = partial(self.breed_one, alpha, breed_mode)
-        with mp.Pool(processes = no_processes) as pool:
-            pool.map_async(func, iterable[1:])
-            pool.close()
-            pool.join()
-            pool.terminate()
-
-        return breed_dirs
+        own_pool = pool is None
+        if own_pool:
+            # the breeding runs on the CPU, so the workers are not assigned devices
+            pool = multi.WorkerPool([-1] * min(len(dirs), mp.cpu_count()))
+        try:
+            results = pool.map(func, iterable[1:])
+        finally:
+            if own_pool:
+                pool.close()
+
+        # the children that failed to breed are left out of the next generation
+        children = [breed_dirs[0]]
+        for i in range(len(results)):
+            if results[i] is None:
+                print ('breeding from ' + iterable[i + 1][0] + ' failed, the child is left out')
+            else:
+                children.append(breed_dirs[i + 1])
+        return children
 
 
 def reconstruction(proc, conf_file, datafile, dir, devices):
@@ -388,7 +402,6 @@ def reconstruction(proc, conf_file, datafile, dir, devices):
         if config_map is None:
             print("can't read configuration file " + conf_file)
             return
-        ut.prepare_config(conf_file)
     except:
         print('Cannot parse configuration file ' + conf_file + ' , check for matching parenthesis and quotations')
         return
@@ -418,19 +431,35 @@ def reconstruction(proc, conf_file, datafile, dir, devices):
         temp_dirs = []
         for _ in range(reconstructions):
             temp_dirs.append(None)
-        for g in range(generations):
-            gen_data = gen_obj.get_data(data)
-            gen_save_dir = os.path.join(save_dir, 'g_' + str(g))
-            m = gen_obj.metrics[g]
-            save_dirs, evals = rec.multi_rec(gen_save_dir, proc, gen_data, conf_file, config_map, devices, temp_dirs, m)
-            
-            # results are saved in a list of directories - save_dir
-            # it will be ranked, and moved to temporary ranked directories
-            gen_obj.order(save_dirs, evals)
-            if g < generations - 1 and len(save_dirs) > 1:
-               temp_dirs = gen_obj.breed(temp_dir, save_dirs)
-                
-            gen_obj.next_gen()
+        # the workers, with their devices, serve the reconstructions and breeding of all generations
+        workers = rec.get_worker_devices(proc, devices, reconstructions, data.shape, ut.get_fast_module_params(config_map))
+        pool = rec.WorkerPool(workers)
+        # the data is placed in shared memory once, and again only for the low resolution generations
+        shared = None
+        prev_gen_data = None
+        try:
+            for g in range(generations):
+                gen_data = gen_obj.get_data(data)
+                if gen_data is not prev_gen_data:
+                    if shared is not None:
+                        shared.close()
+                    shared = rec.SharedData(gen_data)
+                    prev_gen_data = gen_data
+                gen_save_dir = os.path.join(save_dir, 'g_' + str(g))
+                m = gen_obj.metrics[g]
+                save_dirs, evals = rec.multi_rec(gen_save_dir, proc, shared, conf_file, config_map, devices, temp_dirs, m, checkpoint=False, pool=pool)
+
+                # results are saved in a list of directories - save_dir
+                # it will be ranked, and moved to temporary ranked directories
+                gen_obj.order(save_dirs, evals)
+                if g < generations - 1 and len(save_dirs) > 1:
+                   temp_dirs = gen_obj.breed(temp_dir, save_dirs, pool)
+
+                gen_obj.next_gen()
+        finally:
+            pool.close()
+            if shared is not None:
+                shared.close()
 	# remove temp dir
         if os.path.isdir(temp_dir):
             shutil.rmtree(temp_dir)
@@ -438,17 +467,31 @@ def reconstruction(proc, conf_file, datafile, dir, devices):
         image = None
         support = None
         coh = None
-        rec = single
+        # the session keeps the data and the engine setup resident for all generations
+        session = None
 
         for g in range(generations):
             gen_data = gen_obj.get_data(data)
-            image, support, coh, err, flows, iter_arrs = rec.single_rec(proc, gen_data, conf_file, config_map, devices[0], image, support, coh)
+            if session is None:
+                session = calc.Session(proc, devices[0], ut.get_fast_module_params(config_map), gen_data)
+            elif gen_data is not prev_gen_data:
+                # the data differs only for low resolution generations, otherwise get_data returns the same array
+                session.set_data(gen_data)
+            prev_gen_data = gen_data
+            image, support, coh, err, flows, iter_arrs = session.run(image, support, coh)
             if image is None:
+                session.close()
                 return
             # save the generation results
             gen_save_dir = os.path.join(save_dir, 'g_' + str(g))
-            ut.save_results(image, support, coh, err, flows, iter_arrs, gen_save_dir)
+            run_stats = session.get_run_stats()
+            alloc_array = session.get_alloc_report()
+            if alloc_array is not None:
+                run_stats['alloc_array'] = alloc_array
+            ut.save_results(image, support, coh, err, flows, iter_arrs, gen_save_dir, run_stats=run_stats)
             gen_obj.next_gen()
+        if session is not None:
+            session.close()
 
     print ('done gen')
 
@@ -22,7 +22,7 @@ __all__ = ['single_rec',
            'reconstruction']
 
 
-def single_rec(proc, data, conf, config_map, dev, image, support, coh):
+def single_rec(proc, data, conf, config_map, dev, image, support, coh, save_dir=None, run_stats=None):
 
     """
     This function starts reconstruction and returns results.
@@ -53,6 +53,12 @@ def single_rec(proc, data, conf, config_map, dev, image, support, coh):
     coh : numpy array
         coherence of previous reconstructed images, or None
 
+    save_dir : str
+        directory where the results will be saved; if checkpoints are configured the checkpoint is kept there
+
+    run_stats : dict
+        if given, the run statistics are added to it, see fast_module.Session.get_run_stats
+
     Returns
     -------
     image : numpy array
@@ -74,7 +80,12 @@ def single_rec(proc, data, conf, config_map, dev, image, support, coh):
         coh_dims = tuple(config_map.partial_coherence_roi)
     except:
         coh_dims = None
-    image, support, coh, er, flow, iter_array = calc.fast_module_reconstruction(proc, dev, conf, data, coh_dims, image, support, coh)
+    # the parameters are passed to the engine in memory
+    params = ut.get_fast_module_params(config_map)
+    checkpoint = None
+    if save_dir is not None:
+        checkpoint = ut.get_checkpoint_file(params, save_dir)
+    image, support, coh, er, flow, iter_array = calc.fast_module_reconstruction(proc, dev, params, data, coh_dims, image, support, coh, checkpoint, run_stats)
 
     # errs contain errors for each iteration
     return image, support, coh, er, flow, iter_array
@@ -117,7 +128,6 @@ def reconstruction(proc, conf_file, datafile, dir, dev):
         if config_map is None:
             print("can't read configuration file " + conf_file)
             return
-        ut.prepare_config(conf_file)
     except:
         print('reconstruction: Cannot parse configuration file ' + conf_file + ' , check for matching parenthesis and quotations')
         return
@@ -140,14 +150,15 @@ def reconstruction(proc, conf_file, datafile, dir, dev):
         support = None
         coh = None
 
-    image, support, coh, errs, flow, iter_array = single_rec(proc, data, conf_file, config_map, dev[0], image, support, coh)
-    if image is None:
-        return
-
     try:
         save_dir = config_map.save_dir
     except AttributeError:
         filename = conf_file.split('/')[-1]
         save_dir = os.path.join(dir, filename.replace('config_rec', 'results'))
 
-    ut.save_results(image, support, coh, np.asarray(errs), flow, iter_array, save_dir)
+    run_stats = {}
+    image, support, coh, errs, flow, iter_array = single_rec(proc, data, conf_file, config_map, dev[0], image, support, coh, save_dir, run_stats)
+    if image is None:
+        return
+
+    ut.save_results(image, support, coh, np.asarray(errs), flow, iter_array, save_dir, run_stats=run_stats)
@@ -13,29 +13,150 @@ import numpy as np
 import reccdi.src_py.utilities.utils as ut
 import reccdi.src_py.controller.fast_module as calc
 import time
-from multiprocessing import Pool, Queue
+import queue
+from multiprocessing import Queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from functools import partial
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # before python 3.8 the data is passed to the workers with the tasks
+    shared_memory = None
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
-__all__ = ['single_rec_process',
+__all__ = ['rec_on_device',
+           'single_rec_process',
+           'single_rec_thread',
+           'batch_rec',
            'assign_gpu',
+           'get_worker_devices',
+           'WorkerPool',
+           'SharedData',
+           'attach_data',
            'multi_rec',
            'reconstruction']
 
 
-def single_rec_process(proc, conf, data, coh_dims, req_metric, dirs):
+# the shared data the worker is attached to, kept between the tasks; a tuple of the shared memory and the array view
+_attached = None
+
+
+class SharedData:
+    """
+    This class places the data array in shared memory once, so the worker processes attach to it without copying,
+    instead of receiving a pickled copy of the array with each task. If shared memory is not available, the array
+    is passed with the tasks.
+    """
+    def __init__(self, arr):
+        """
+        Constructor, copies the array into a new shared memory block.
+
+        Parameters
+        ----------
+        arr : ndarray
+            the array to share
+        """
+        self.array = arr
+        self.shm = None
+        if shared_memory is None:
+            return
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        self.array = np.ndarray(arr.shape, dtype=arr.dtype, buffer=self.shm.buf)
+        self.array[...] = arr
+
+
+    def get_ref(self):
+        """
+        Returns a reference to the shared array that is passed to the workers, see attach_data.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        ref : tuple or ndarray
+            name, shape and dtype of the shared memory block, or the array if shared memory is not available
+        """
+        if self.shm is None:
+            return self.array
+        return (self.shm.name, self.array.shape, self.array.dtype.str)
+
+
+    def close(self):
+        """
+        Releases the shared memory block. The workers attached to it release it when they attach to another block,
+        or when they exit.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        if self.shm is not None:
+            # the view must be released before the block is closed
+            self.array = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def attach_data(ref):
     """
-    This function runs a single reconstruction process.
+    This function returns the array the reference points to. It is called in a worker process; the worker attaches
+    to the shared memory block without copying and keeps the attachment for the next tasks.
+
+    Parameters
+    ----------
+    ref : tuple or ndarray
+        reference returned by SharedData.get_ref, or the data array
+
+    Returns
+    -------
+    data : ndarray
+        read only view of the shared data, or the given array
+    """
+    global _attached
+    if isinstance(ref, np.ndarray):
+        return ref
+    name, shape, dtype = ref
+    if _attached is not None:
+        if _attached[0].name == name:
+            return _attached[1]
+        # the block of the previous generation is released; it is kept if an array still refers to it
+        shm = _attached[0]
+        _attached = None
+        try:
+            shm.close()
+        except BufferError:
+            pass
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    arr.flags.writeable = False
+    _attached = (shm, arr)
+    return arr
+
+
+def rec_on_device(proc, device, params, data, coh_dims, req_metric, dirs):
+    """
+    This function runs a single reconstruction on given device and saves the results.
 
     Parameters
     ----------
     proc : str
         string defining library used 'cpu' or 'opencl' or 'cuda'
 
-    conf : str
-        configuration file
+    device : int
+        device id
+
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
 
     data : numpy array
         data array
@@ -52,7 +173,7 @@ def single_rec_process(proc, conf, data, coh_dims, req_metric, dirs):
     Returns
     -------
     metric : float
-        a calculated characteristic of the image array defined by the metric
+        a calculated characteristic of the image array defined by the metric, or None if the reconstruction failed
     """
     (prev, save_dir) = dirs
     if prev is None:
@@ -62,12 +183,149 @@ def single_rec_process(proc, conf, data, coh_dims, req_metric, dirs):
     else:
         prev_image, prev_support, prev_coh = ut.read_results(prev)
 
-    image, support, coh, errs, flow, iter_array = calc.fast_module_reconstruction(proc, gpu, conf, data, coh_dims, prev_image, prev_support, prev_coh)
- 
+    checkpoint = ut.get_checkpoint_file(params, save_dir)
+    run_stats = {}
+    image, support, coh, errs, flow, iter_array = calc.fast_module_reconstruction(proc, device, params, data, coh_dims, prev_image, prev_support, prev_coh, checkpoint, run_stats)
+    if image is None:
+        return None
+
     metric = ut.get_metric(image, errs)
-    ut.save_results(image, support, coh, errs, flow, iter_array, save_dir, metric)
+    ut.save_results(image, support, coh, errs, flow, iter_array, save_dir, metric, run_stats)
     return metric[req_metric]
-    
+
+
+def single_rec_process(proc, params, data, coh_dims, req_metric, dirs):
+    """
+    This function runs a single reconstruction process on the GPU assigned to the process.
+
+    Parameters
+    ----------
+    proc : str
+        string defining library used 'cpu' or 'opencl' or 'cuda'
+
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
+
+    data : numpy array or tuple
+        data array, or reference to the data in shared memory, see SharedData.get_ref
+
+    coh_dims : tuple
+        shape of coherence array
+
+    req_metric : str
+        defines metric that will be used if GA is utilized
+
+    dirs : list
+        tuple of two elements: directory that contain results of previous run or None, and directory where the results of this processing will be saved
+
+    Returns
+    -------
+    metric : float
+        a calculated characteristic of the image array defined by the metric, or None if the reconstruction failed
+    """
+    return rec_on_device(proc, gpu, params, attach_data(data), coh_dims, req_metric, dirs)
+
+
+def single_rec_thread(proc, params, data, coh_dims, req_metric, q, dirs):
+    """
+    This function runs a single reconstruction in a thread. It takes a free GPU id from the queue for the time of the
+    reconstruction. The engine releases the GIL while it runs, so the threads run the reconstructions concurrently and
+    share the data array in memory.
+
+    Parameters
+    ----------
+    proc : str
+        string defining library used 'cpu' or 'opencl' or 'cuda'
+
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
+
+    data : numpy array
+        data array
+
+    coh_dims : tuple
+        shape of coherence array
+
+    req_metric : str
+        defines metric that will be used if GA is utilized
+
+    q : queue.Queue
+        a queue holding free GPU ids
+
+    dirs : list
+        tuple of two elements: directory that contain results of previous run or None, and directory where the results of this processing will be saved
+
+    Returns
+    -------
+    metric : float
+        a calculated characteristic of the image array defined by the metric, or None if the reconstruction failed
+    """
+    device = q.get()
+    try:
+        return rec_on_device(proc, device, params, data, coh_dims, req_metric, dirs)
+    finally:
+        q.put(device)
+
+
+
+def batch_rec(proc, device, params, data, req_metric, iterable):
+    """
+    This function runs all reconstructions as one batch in a single session on given device, and saves the results.
+
+    Parameters
+    ----------
+    proc : str
+        string defining library used 'cpu' or 'opencl' or 'cuda'
+
+    device : int
+        device id
+
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
+
+    data : numpy array
+        data array
+
+    req_metric : str
+        defines metric that will be used if GA is utilized
+
+    iterable : list
+        list of tuples, one for each reconstruction, of two elements: directory that contain results of previous run or None, and directory where the results of this processing will be saved
+
+    Returns
+    -------
+    evals : list
+        list of calculated characteristics of the image arrays defined by the metric
+    """
+    prev_dirs = [prev for (prev, save_dir) in iterable]
+    if prev_dirs[0] is None:
+        prev_images = None
+        prev_supports = None
+    else:
+        results = [ut.read_results(prev) for prev in prev_dirs]
+        prev_images = np.stack([res[0] for res in results])
+        prev_supports = np.stack([res[1] for res in results])
+
+    session = calc.Session(proc, device, params, data)
+    images, supports, errs, flow, iter_array = session.run_batch(len(iterable), prev_images, prev_supports)
+    run_stats = None
+    if images is not None:
+        run_stats = session.get_run_stats()
+        alloc_array = session.get_alloc_report()
+        if alloc_array is not None:
+            run_stats['alloc_array'] = alloc_array
+    session.close()
+    if images is None:
+        return []
+
+    evals = []
+    for i in range(len(iterable)):
+        save_dir = iterable[i][1]
+        metric = ut.get_metric(images[i], errs[i])
+        ut.save_results(images[i], supports[i], None, errs[i], flow, iter_array, save_dir, metric, run_stats)
+        evals.append(metric[req_metric])
+    return evals
+
 
 def assign_gpu(*args):
     """
@@ -87,7 +345,156 @@ def assign_gpu(*args):
     gpu = q.get()
 
 
-def multi_rec(save_dir, proc, data, conf, config_map, devices, prev_dirs, metric='chi'):
+def get_worker_devices(proc, devices, runs, shape, params, probe=None):
+    """
+    This function assigns the workers to the devices. With "runs_per_device" configured to "auto", the number of
+    reconstructions that fit in each device is found from the free memory reported by the probe and the memory
+    estimated for one reconstruction, and the runs are distributed evenly across the devices. With a number
+    configured, each device runs that many reconstructions. As the runs finish, the freed workers take the next runs.
+    If the probe fails, or the reconstruction does not fit in the free memory, each device runs one reconstruction.
+
+    Parameters
+    ----------
+    proc : str
+        string defining library used 'cpu' or 'opencl' or 'cuda'
+
+    devices : list
+        list of GPUs available for this reconstructions
+
+    runs : int
+        number of reconstructions
+
+    shape : tuple
+        shape of the data array
+
+    params : dict
+        reconstruction parameters, see utils.get_fast_module_params
+
+    probe : callable
+        function taking the devices list and returning the free memory in MB aligned with it; if None,
+        utils.get_cpu_free_memory is used for cpu, and utils.get_gpu_free_memory otherwise
+
+    Returns
+    -------
+    workers : list
+        device for each worker; a device is repeated for each reconstruction it runs concurrently
+    """
+    per_device = params.get('runs_per_device', '1')
+    if per_device != 'auto':
+        return [device for device in devices for _ in range(int(per_device))]
+
+    if probe is None:
+        probe = ut.get_cpu_free_memory if proc == 'cpu' else ut.get_gpu_free_memory
+    mem_size = ut.estimate_rec_memory(shape, params)
+    try:
+        distributed = ut.get_gpu_distribution(runs, ut.get_gpu_load(mem_size, devices, probe))
+    except Exception as ex:
+        print ('cannot find free memory on the devices, ' + str(ex) + ', running one reconstruction per device')
+        return list(devices)
+    if sum(distributed) == 0:
+        print ('reconstruction needs ' + str(int(mem_size)) + 'MB, more than free on the devices, running one reconstruction per device')
+        return list(devices)
+    return [device for device, device_runs in zip(devices, distributed) for _ in range(device_runs)]
+
+
+class WorkerPool:
+    """
+    This class keeps a pool of worker processes for the whole run, i.e. all generations of GA. Each worker takes one
+    device when it starts and keeps it until the pool is closed, so the bridge library is imported and the device is
+    initialized once in each worker. The workers run reconstructions and other tasks, i.e. breeding.
+    If a worker dies, the pool is started again and the tasks that did not complete are resubmitted once.
+    """
+    def __init__(self, devices):
+        """
+        Constructor, starts a worker for each device.
+
+        Parameters
+        ----------
+        devices : list
+            list of GPUs, one worker is assigned to each entry; a device listed several times runs that many
+            reconstructions concurrently, see get_worker_devices
+        """
+        self.devices = devices
+        self.executor = None
+        self.start()
+
+
+    def start(self):
+        """
+        Starts the workers. Each worker takes a device from the queue in its initializer.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        q = Queue()
+        for device in self.devices:
+            q.put(device)
+        self.executor = ProcessPoolExecutor(max_workers = len(self.devices), initializer=assign_gpu, initargs=(q,))
+
+
+    def map(self, func, iterable):
+        """
+        Runs the function on each element of the iterable in the workers and returns the results in the order of the
+        elements. If a worker dies, the pool is restarted and the unfinished tasks are resubmitted once. The result of
+        a task that failed, or that did not complete after the restart, is None.
+
+        Parameters
+        ----------
+        func : callable
+            function taking one element of the iterable; it must be picklable
+        iterable : iterable
+            arguments of the tasks
+
+        Returns
+        -------
+        results : list
+            list of results, None for failed tasks
+        """
+        args = list(iterable)
+        results = [None] * len(args)
+        pending = list(range(len(args)))
+        for attempt in range(2):
+            futures = [(i, self.executor.submit(func, args[i])) for i in pending]
+            broken = []
+            for i, future in futures:
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool:
+                    broken.append(i)
+                except Exception as ex:
+                    print ('task failed: ' + str(ex))
+            if len(broken) == 0:
+                break
+            print ('a worker process died, restarting the worker pool')
+            self.executor.shutdown(wait=True)
+            self.start()
+            pending = broken
+        return results
+
+
+    def close(self):
+        """
+        Shuts the workers down, releasing the devices.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        nothing
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+def multi_rec(save_dir, proc, data, conf, config_map, devices, prev_dirs, metric='chi', checkpoint=True, pool=None, probe=None):
 
     """
     This function controls the multiple reconstructions.
@@ -100,8 +507,8 @@ def multi_rec(save_dir, proc, data, conf, config_map, devices, prev_dirs, metric
     proc : str
         a string indicating the processor type (cpu, cuda or opencl)
 
-    data : numpy array
-        data array
+    data : numpy array or SharedData
+        data array, or the data already placed in shared memory
 
     conf : str
         configuration file name
@@ -118,6 +525,16 @@ def multi_rec(save_dir, proc, data, conf, config_map, devices, prev_dirs, metric
     metric : str
         a metric defining algorithm by which to evaluate the image array
 
+    checkpoint : bool
+        if False, the checkpoints are not saved even if configured
+
+    pool : WorkerPool
+        pool of workers running the reconstructions in "processes" concurrency; if None, a pool is started for this
+        call and closed when the reconstructions complete
+
+    probe : callable
+        resource probe used to pack the reconstructions on devices, see get_worker_devices
+
     Returns
     -------
     save_dirs : list
@@ -125,6 +542,10 @@ def multi_rec(save_dir, proc, data, conf, config_map, devices, prev_dirs, metric
     evals : list
         list of evaluation results of image arrays
     """
+    shared = None
+    if isinstance(data, SharedData):
+        shared = data
+        data = shared.array
     evals = []
     def collect_result(result):
         for r in result:
@@ -141,16 +562,50 @@ def multi_rec(save_dir, proc, data, conf, config_map, devices, prev_dirs, metric
         coh_dims = tuple(config_map.partial_coherence_roi)
     except:
         coh_dims = None
-        
-    func = partial(single_rec_process, proc, conf, data, coh_dims, metric)
-    q = Queue()
-    for device in devices:
-        q.put(device)
-    with Pool(processes = len(devices),initializer=assign_gpu, initargs=(q,)) as pool:
-        pool.map_async(func, iterable, callback=collect_result)
-        pool.close()
-        pool.join()
-        pool.terminate()
+    # the parameters are passed to the engine in memory
+    params = ut.get_fast_module_params(config_map)
+    if not checkpoint:
+        params.pop('checkpoint_interval', None)
+    try:
+        concurrency = config_map.concurrency
+    except AttributeError:
+        concurrency = 'processes'
+
+    if concurrency == 'threads':
+        workers = get_worker_devices(proc, devices, reconstructions, data.shape, params, probe)
+        q = queue.Queue()
+        for device in workers:
+            q.put(device)
+        func = partial(single_rec_thread, proc, params, data, coh_dims, metric, q)
+        with ThreadPoolExecutor(max_workers = len(workers)) as executor:
+            results = list(executor.map(func, iterable))
+    elif concurrency == 'batch':
+        # all reconstructions run in one engine on the first device
+        collect_result(batch_rec(proc, devices[0], params, data, metric, iterable))
+        # no results are saved if the batch failed
+        if len(evals) == 0:
+            save_dirs = []
+    else:
+        # the workers attach to the data in shared memory instead of receiving a copy with each task
+        own_shared = shared is None
+        if own_shared:
+            shared = SharedData(data)
+        func = partial(single_rec_process, proc, params, shared.get_ref(), coh_dims, metric)
+        own_pool = pool is None
+        try:
+            if own_pool:
+                pool = WorkerPool(get_worker_devices(proc, devices, reconstructions, data.shape, params, probe))
+            results = pool.map(func, iterable)
+        finally:
+            # the block is unlinked also when the workers could not be started
+            if own_pool and pool is not None:
+                pool.close()
+            if own_shared:
+                shared.close()
+    if concurrency != 'batch':
+        # the reconstructions that failed are left out
+        save_dirs = [save_dirs[i] for i in range(reconstructions) if results[i] is not None]
+        collect_result([result for result in results if result is not None])
 
     # return only error from last iteration for each reconstruction
     return save_dirs, evals
@@ -189,7 +644,6 @@ def reconstruction(proc, conf_file, datafile, dir, devices):
         if config_map is None:
             print("can't read configuration file " + conf_file)
             return
-        ut.prepare_config(conf_file)
     except:
         print('Cannot parse configuration file ' + conf_file + ' , check for matching parenthesis and quotations')
         return
@@ -7,70 +7,187 @@
 
 # distutils: language = c++
 # distutils: include_dirs = ['reccdi/include', 'include',]
-# distutils: sources = ['reccdi/src_cpp/bridge.cpp', 'reccdi/src_cpp/manager.cpp', 'reccdi/src_cpp/parameters.cpp', 'reccdi/src_cpp/pcdi.cpp', 'reccdi/src_cpp/resolution.cpp', 'reccdi/src_cpp/state.cpp', 'reccdi/src_cpp/support.cpp', 'reccdi/src_cpp/util.cpp', 'reccdi/src_cpp/worker.cpp']
+# distutils: sources = ['reccdi/src_cpp/bridge.cpp', 'reccdi/src_cpp/control.cpp', 'reccdi/src_cpp/gauss_cache.cpp', 'reccdi/src_cpp/manager.cpp', 'reccdi/src_cpp/parameters.cpp', 'reccdi/src_cpp/pcdi.cpp', 'reccdi/src_cpp/progress.cpp', 'reccdi/src_cpp/resolution.cpp', 'reccdi/src_cpp/state.cpp', 'reccdi/src_cpp/support.cpp', 'reccdi/src_cpp/util.cpp', 'reccdi/src_cpp/worker.cpp']
 # distutils: libraries = ['afcpu', ]
 # distutils: library_dirs = ['lib',]
 
 
 from libcpp.vector cimport vector
 from libcpp.string cimport string
+from libcpp.map cimport map
+import numpy as np
+
+
+cdef extern from "../include/progress.hpp":
+    ctypedef struct progress_record:
+        int iteration
+        double error
+        int algorithm
+        unsigned int flow
+        double time
 
 
 cdef extern from "../include/bridge.hpp":
     cdef cppclass Bridge:
         Bridge() except +
-        void StartCalcWithGuess(int, vector[float], vector[float], vector[float], vector[int], string)
-        void StartCalcWithGuessSupport(int, vector[float], vector[float], vector[float], vector[int], vector[int], string)
-        void StartCalcWithGuessSupportCoh(int, vector[float], vector[float], vector[float], vector[int], vector[int], vector[float], vector[int], string)
-        void StartCalc(int, vector[float], vector[int], string)
-        vector[double] GetImageR()
-        vector[double] GetImageI()
-        vector[double] GetErrors()
-        vector[float] GetSupportV()
-        vector[double] GetCoherenceV()
-        vector[double] GetReciprocalR()
-        vector[double] GetReciprocalI()
-        vector[int] GetFlowV()
-        vector[int] GetIterFlowV()
-        int IsSuccess()	
+        void Init(int, const double *, vector[int], map[string, string]) except + nogil
+        void SetData(const double *) except + nogil
+        void Run(const double *, const int *, const double *, vector[int], int) except + nogil
+        void SetCheckpoint(string)
+        void ResumeCheckpoint(string) except + nogil
+        vector[progress_record] GetProgress() except +
+        void Cancel()
+        void Pause()
+        void Resume()
+        bint IsPaused()
+        vector[unsigned long] GetGaussCacheStats() except +
+        bint IsSinglePrecision() except +
+        vector[int] GetImageDims() except +
+        void GetImage(void *, bint) except + nogil
+        void GetReciprocal(void *, bint) except + nogil
+        void GetSupport(unsigned char *) except + nogil
+        bint HasVariance() except +
+        void GetVariance(void *, bint) except + nogil
+        vector[int] GetCoherenceDims() except +
+        void GetCoherence(double *) except + nogil
+        vector[double] GetErrors() except +
+        vector[int] GetFlowV() except +
+        vector[int] GetIterFlowV() except +
+        vector[long long] GetAllocReport() except +
+        map[string, double] GetRunStats() except +
+        int IsSuccess()
         void Cleanup()
 
 
+def flat_buffer(arr, dtype):
+    # returns C contiguous, one dimensional view of the array; the array is copied only if its type or order differs
+    return np.ascontiguousarray(arr, dtype=dtype).reshape(-1)
+
+
+cdef unsigned char * out_buffer(arr, dtypes, size) except NULL:
+    # returns pointer to the data of preallocated array that the results will be copied into
+    if arr.dtype not in dtypes:
+        raise ValueError('output array type must be one of ' + str(dtypes))
+    if not arr.flags.c_contiguous or not arr.flags.writeable:
+        raise ValueError('output array must be C contiguous and writeable')
+    if arr.size != size:
+        raise ValueError('output array size ' + str(arr.size) + ' does not match result size ' + str(size))
+    cdef unsigned char[::1] arr_v = arr.reshape(-1).view(np.uint8)
+    return &arr_v[0]
+
+
+# The calls that run on the device release the GIL, so reconstructions on different devices can be driven from
+# threads of one process. The arguments are converted to C types before the GIL is released.
 cdef class PyBridge:
     cdef Bridge *thisptr
     def __cinit__(self):
         self.thisptr = new Bridge()
     def __dealloc__(self):
         del self.thisptr
-    def start_calc_with_guess(self, device, data_r, guess_r, guess_i, dims, config):
-        self.thisptr.StartCalcWithGuess(device, data_r, guess_r, guess_i, dims, config.encode())
-    def start_calc_with_guess_support(self, device, data_r, guess_r, guess_i, support, dims, config):
-        self.thisptr.StartCalcWithGuessSupport(device, data_r, guess_r, guess_i, support, dims, config.encode())
-    def start_calc_with_guess_support_coh(self, device, data_r, guess_r, guess_i, support, dims, coh, coh_dims, config):
-        self.thisptr.StartCalcWithGuessSupportCoh(device, data_r, guess_r, guess_i, support, dims, coh, coh_dims, config.encode())
-    def start_calc(self, device, data_r, dims, config):
-        self.thisptr.StartCalc(device, data_r, dims, config.encode())
-    def get_image_r(self):
-        return self.thisptr.GetImageR()
-    def get_image_i(self):
-        return self.thisptr.GetImageI()
+    def init(self, device, data, dims, config):
+        cdef const double[::1] data_v = flat_buffer(data, np.float64)
+        cdef int device_c = device
+        cdef vector[int] dims_v = dims
+        # the config is dictionary of parameters with string values
+        cdef map[string, string] config_m
+        for name, value in config.items():
+            config_m[name.encode()] = value.encode()
+        cdef const double *data_p = &data_v[0]
+        with nogil:
+            self.thisptr.Init(device_c, data_p, dims_v, config_m)
+    def set_data(self, data):
+        cdef const double[::1] data_v = flat_buffer(data, np.float64)
+        cdef const double *data_p = &data_v[0]
+        with nogil:
+            self.thisptr.SetData(data_p)
+    def run(self, guess=None, support=None, coh=None, coh_dims=(), batch=1):
+        cdef const double complex[::1] guess_v
+        cdef const int[::1] support_v
+        cdef const double[::1] coh_v
+        cdef const double *guess_p = NULL
+        cdef const int *support_p = NULL
+        cdef const double *coh_p = NULL
+        cdef vector[int] coh_dims_v = coh_dims
+        cdef int batch_c = batch
+        if guess is not None:
+            guess_v = flat_buffer(guess, np.complex128)
+            guess_p = <const double *>&guess_v[0]
+        if support is not None:
+            support_v = flat_buffer(support, np.intc)
+            support_p = &support_v[0]
+        if coh is not None:
+            coh_v = flat_buffer(coh, np.float64)
+            coh_p = &coh_v[0]
+        with nogil:
+            self.thisptr.Run(guess_p, support_p, coh_p, coh_dims_v, batch_c)
+    def set_checkpoint(self, filename):
+        self.thisptr.SetCheckpoint(filename.encode())
+    def resume_checkpoint(self, filename):
+        cdef string filename_s = filename.encode()
+        with nogil:
+            self.thisptr.ResumeCheckpoint(filename_s)
+    def get_progress(self):
+        # returns list of dictionaries, one for each iteration completed since the previous call
+        return self.thisptr.GetProgress()
+    def cancel(self):
+        self.thisptr.Cancel()
+    def pause(self):
+        self.thisptr.Pause()
+    def resume(self):
+        self.thisptr.Resume()
+    def is_paused(self):
+        return self.thisptr.IsPaused()
+    def get_gauss_cache_stats(self):
+        stats = self.thisptr.GetGaussCacheStats()
+        return {'hits': stats[0], 'misses': stats[1], 'size': stats[2]}
+    def is_single_precision(self):
+        return self.thisptr.IsSinglePrecision()
+    def get_image_dims(self):
+        return self.thisptr.GetImageDims()
+    def get_image(self, image):
+        size = np.prod(self.thisptr.GetImageDims())
+        cdef void *image_p = out_buffer(image, (np.complex128, np.complex64), size)
+        cdef bint single = image.dtype == np.complex64
+        with nogil:
+            self.thisptr.GetImage(image_p, single)
+    def get_reciprocal(self, reciprocal):
+        size = np.prod(self.thisptr.GetImageDims())
+        cdef void *reciprocal_p = out_buffer(reciprocal, (np.complex128, np.complex64), size)
+        cdef bint single = reciprocal.dtype == np.complex64
+        with nogil:
+            self.thisptr.GetReciprocal(reciprocal_p, single)
+    def get_support(self, support):
+        size = np.prod(self.thisptr.GetImageDims())
+        cdef unsigned char *support_p = out_buffer(support, (np.uint8,), size)
+        with nogil:
+            self.thisptr.GetSupport(support_p)
+    def has_variance(self):
+        return self.thisptr.HasVariance()
+    def get_variance(self, variance):
+        size = np.prod(self.thisptr.GetImageDims())
+        cdef void *variance_p = out_buffer(variance, (np.float64, np.float32), size)
+        cdef bint single = variance.dtype == np.float32
+        with nogil:
+            self.thisptr.GetVariance(variance_p, single)
+    def get_coherence_dims(self):
+        return self.thisptr.GetCoherenceDims()
+    def get_coherence(self, coh):
+        size = np.prod(self.thisptr.GetCoherenceDims())
+        cdef double *coh_p = <double *>out_buffer(coh, (np.float64,), size)
+        with nogil:
+            self.thisptr.GetCoherence(coh_p)
     def get_errors(self):
         return self.thisptr.GetErrors()
-    def get_support(self):
-        return self.thisptr.GetSupportV()
-    def get_coherence(self):
-        return self.thisptr.GetCoherenceV()
-    def get_reciprocal_r(self):
-        return self.thisptr.GetReciprocalR()
-    def get_reciprocal_i(self):
-        return self.thisptr.GetReciprocalI()
     def get_flow(self):
         return self.thisptr.GetFlowV()
     def get_iter_flow(self):
         return self.thisptr.GetIterFlowV()
+    def get_run_stats(self):
+        cdef dict stats = self.thisptr.GetRunStats()
+        return {name.decode(): value for name, value in stats.items()}
+    def get_alloc_report(self):
+        return self.thisptr.GetAllocReport()
     def is_success(self):
-        return self.thisptr.IsSuccess()    
+        return self.thisptr.IsSuccess()
     def cleanup(self):
         self.thisptr.Cleanup()
-
-
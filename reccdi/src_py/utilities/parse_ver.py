@@ -241,6 +241,31 @@ def ver_config_rec(fname):
         print ('device parameter parsing error')
         return False
 
+    try:
+        concurrency = config_map.concurrency
+        if concurrency not in ["processes", "threads", "batch"]:
+            print('concurrency parameter should be "processes", "threads" or "batch"')
+            return False
+        if concurrency == "batch" and hasattr(config_map, 'pcdi_trigger'):
+            print('pcdi is not supported with "batch" concurrency')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('concurrency parameter parsing error')
+        return False
+
+    try:
+        runs_per_device = config_map.runs_per_device
+        if runs_per_device != 'auto' and (type(runs_per_device) != int or runs_per_device <= 0):
+            print('runs_per_device parameter should be positive int or "auto"')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('runs_per_device parameter parsing error')
+        return False
+
     try:
         algorithm_sequence = config_map.algorithm_sequence
         if not issubclass(type(algorithm_sequence), list):
@@ -275,6 +300,28 @@ def ver_config_rec(fname):
         print ('algorithm_sequence parameter parsing error')
         return False
 
+    try:
+        coarse_iterations = config_map.coarse_iterations
+        if type(coarse_iterations) != int or coarse_iterations <= 0:
+            print('coarse_iterations parameter should be positive int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('coarse_iterations parameter parsing error')
+        return False
+
+    try:
+        coarse_binning = config_map.coarse_binning
+        if type(coarse_binning) != int or coarse_binning < 2:
+            print('coarse_binning parameter should be int, 2 or greater')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('coarse_binning parameter parsing error')
+        return False
+
     try:
         beta = config_map.beta
         if type(beta) != float:
@@ -286,6 +333,127 @@ def ver_config_rec(fname):
         print ('beta parameter parsing error')
         return False
 
+    try:
+        precision = config_map.precision
+        if precision not in ["single", "double", "mixed"]:
+            print('precision parameter should be "single", "double" or "mixed"')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('precision parameter parsing error')
+        return False
+
+    try:
+        checkpoint_interval = config_map.checkpoint_interval
+        if type(checkpoint_interval) != int or checkpoint_interval <= 0:
+            print('checkpoint_interval parameter should be positive int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('checkpoint_interval parameter parsing error')
+        return False
+
+    try:
+        error_readback_interval = config_map.error_readback_interval
+        if type(error_readback_interval) != int or error_readback_interval <= 0:
+            print('error_readback_interval parameter should be positive int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('error_readback_interval parameter parsing error')
+        return False
+
+    try:
+        convergence_window = config_map.convergence_window
+        if type(convergence_window) != int or convergence_window <= 0:
+            print('convergence_window parameter should be positive int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('convergence_window parameter parsing error')
+        return False
+
+    try:
+        convergence_epsilon = config_map.convergence_epsilon
+        if type(convergence_epsilon) != float or convergence_epsilon < 0:
+            print('convergence_epsilon parameter should be non-negative float')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('convergence_epsilon parameter parsing error')
+        return False
+
+    try:
+        convergence_support_updates = config_map.convergence_support_updates
+        if type(convergence_support_updates) != int or convergence_support_updates <= 0:
+            print('convergence_support_updates parameter should be positive int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('convergence_support_updates parameter parsing error')
+        return False
+
+    try:
+        gc_policy = config_map.gc_policy
+        if gc_policy not in ('always', 'threshold', 'fraction', 'never'):
+            print('gc_policy parameter should be one of "always", "threshold", "fraction", "never"')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('gc_policy parameter parsing error')
+        return False
+
+    try:
+        gc_threshold = config_map.gc_threshold
+        if type(gc_threshold) != int or gc_threshold < 0:
+            print('gc_threshold parameter should be non negative int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('gc_threshold parameter parsing error')
+        return False
+
+    try:
+        gc_fraction = config_map.gc_fraction
+        if type(gc_fraction) != float or gc_fraction < 0 or gc_fraction > 1:
+            print('gc_fraction parameter should be float between 0 and 1')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('gc_fraction parameter parsing error')
+        return False
+
+    try:
+        alloc_report = config_map.alloc_report
+        if type(alloc_report) != bool:
+            print('alloc_report parameter should be true or false')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('alloc_report parameter parsing error')
+        return False
+
+    try:
+        fft_plan_cache_size = config_map.fft_plan_cache_size
+        if type(fft_plan_cache_size) != int or fft_plan_cache_size <= 0:
+            print('fft_plan_cache_size parameter should be positive int')
+            return False
+    except AttributeError:
+        pass
+    except:
+        print ('fft_plan_cache_size parameter parsing error')
+        return False
+
     try:
         generations = config_map.generations
         if type(generations) != int:
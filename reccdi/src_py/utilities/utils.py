@@ -15,6 +15,7 @@ import os
 import logging
 import stat
 from functools import reduce
+from collections import OrderedDict
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c), UChicago Argonne, LLC."
@@ -23,17 +24,22 @@ __all__ = ['get_logger',
            'read_tif',
            'save_tif',
            'read_config',
-           'prepare_config',
+           'get_fast_module_params',
+           'get_checkpoint_file',
+           'get_coarse_params',
            'get_good_dim',
            'binning',
            'get_centered',
            'get_centered_both',
            'get_zero_padded_centered',
+           'get_upsampled',
            'adjust_dimensions',
            'crop_center',
            'get_norm',
            'flip',
            'gaussian',
+           'get_gauss_cache_stats',
+           'clear_gauss_cache',
            'gauss_conv_fft',
            'shrink_wrap',
            'read_results',
@@ -45,6 +51,9 @@ __all__ = ['get_logger',
            'save_results',
            'sub_pixel_shift',
            'arr_property',
+           'estimate_rec_memory',
+           'get_gpu_free_memory',
+           'get_cpu_free_memory',
            'get_gpu_load',
            'get_gpu_distribution',
            'measure' ]
@@ -136,67 +145,169 @@ def read_config(config):
         return None
 
 
-def prepare_config(file):
+def get_fast_module_params(config_map):
+    """
+    This function converts the parsed configuration into parameters passed to the CFM (Calc Fast Module). The values
+    are converted to strings in the format expected by the CFM, i.e. lists are given in parenthesis, without spaces and
+    quotes. The algorithm sequence is expanded into "algs" and "algs_repeats" lists, and the total number of
+    iterations is added as "num_iter". The parameters are passed to the CFM in memory, so no temporary file is written.
+
+    Parameters
+    ----------
+    config_map : Config object
+        a Config containing parsed configuration
+
+    Returns
+    -------
+    params : dict
+        dictionary mapping parameter name to the value string
+    """
+    def to_str(value):
+        if isinstance(value, (list, tuple)):
+            return '(' + ','.join([to_str(v) for v in value]) + ')'
+        return str(value)
+
+    params = {}
+    for name, value in config_map.items():
+        params[name] = to_str(value)
+
     algs = []
     algs_repeats = []
-    def parse_alg_token(s):
-        items = s.replace('(','').replace(')','').split(',')
-        repeat = int(items[0])
-        items = items[1:]
-        for j in range(repeat):
-            for i in range(len(items)):
-                if (i + 1) % 2 == 0:
-                    algs_repeats.append(int(items[i]))
-                else:
-                    algs.append(items[i][1:-1])
-    with open(file, 'r') as f:
-        lines = f.readlines()
-        f.close()
-
-    lines_c = []
-    starts = []
-    ends = []
-    for i in range(len(lines)):
-        if  '=' in lines[i]:
-            starts.append(i)
-            if i != 0:
-                ends.append(i-1)
-    ends.append(len(lines)-1)
-
-    for i in range(len(starts)):
-        line_c = ''
-        for j in range(starts[i],ends[i]+1):
-            line_c += lines[j]
-        lines_c.append(line_c.replace(" ", ""))
-
-    # prepare algorithm sequence, triggers, and remove " around strings
-    for i in range(len(lines_c)):
-        tokens = []
-        if lines_c[i].startswith('algorithm_sequence'):
-            line = lines_c[i][20 : -2]    # remove 'algorithm_sequence=' and outer ()
-            if line.startswith('('):
-                while (line.find('))') > 0):
-                    ind = line.find('))')
-                    token = line[1 : ind + 1]
-                    tokens.append(token)
-                    line = line[ind + 2 :]
-                    if line.startswith(','):
-                        line = line[1 :]
-            else:
-                tokens.append(line)
-        for t in tokens:
-            parse_alg_token(t)
+    sequence = list(config_map.algorithm_sequence)
+    # a single sequence entry may be given without the outer parenthesis
+    if not isinstance(sequence[0], (list, tuple)):
+        sequence = [sequence]
+    for entry in sequence:
+        repeat = entry[0]
+        for _ in range(repeat):
+            for alg, iterations in entry[1:]:
+                algs.append(alg)
+                algs_repeats.append(iterations)
+    params['algs'] = to_str(algs)
+    params['algs_repeats'] = to_str(algs_repeats)
+    params['num_iter'] = str(sum(algs_repeats))
+    return params
+
+
+def get_checkpoint_file(params, save_dir):
+    """
+    This function returns name of the checkpoint file for reconstruction saving results in given directory, if the
+    checkpoints are configured. It creates the directory if it does not exist.
+
+    Parameters
+    ----------
+    params : dict
+        reconstruction parameters, see get_fast_module_params
+    save_dir : str
+        directory where the reconstruction results are saved
 
-    lines_c.append('algs=' + str(tuple(algs)) + '\n')
-    lines_c.append('algs_repeats=' + str(tuple(algs_repeats)) + '\n')
-    lines_c.append('num_iter=' + str(sum(algs_repeats)))
+    Returns
+    -------
+    checkpoint : str
+        checkpoint file name, or None if "checkpoint_interval" is not configured
+    """
+    if 'checkpoint_interval' not in params:
+        return None
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+    return os.path.join(save_dir, 'checkpoint.af')
 
-    tmp_file = file + '_tmp'
-    open(tmp_file, 'w').close()
-    with open(tmp_file, 'w') as tf:
-        for line in lines_c:
-            tf.write(line.replace('"','').replace("'",""))
-        tf.close()
+
+def get_coarse_params(params):
+    """
+    This function splits the reconstruction parameters into parameters of the coarse stage and parameters of the full
+    size stage that continues it. The coarse stage runs the first "coarse_iterations" iterations of the algorithm
+    sequence on data cropped in reciprocal space by the "coarse_binning" factor. The support area given in pixels and
+    the support sigmas, also those of the low resolution, are scaled to the coarse grid. The low resolution iterations
+    are clipped to the coarse stage. The full size stage runs the remaining iterations of the sequence.
+
+    Parameters
+    ----------
+    params : dict
+        reconstruction parameters, see get_fast_module_params
+
+    Returns
+    -------
+    coarse_params : dict
+        parameters of the coarse stage, or None if the coarse stage is not configured
+    fine_params : dict
+        parameters of the full size stage, or the given parameters if the coarse stage is not configured
+    """
+    if 'coarse_iterations' not in params or 'coarse_binning' not in params:
+        return None, params
+
+    def parse_list(value):
+        return value.strip('()').split(',')
+
+    coarse_iterations = int(params['coarse_iterations'])
+    binning = int(params['coarse_binning'])
+    coarse_algs = []
+    coarse_repeats = []
+    algs = []
+    algs_repeats = []
+    done = 0
+    for alg, iterations in zip(parse_list(params['algs']), parse_list(params['algs_repeats'])):
+        iterations = int(iterations)
+        coarse_part = min(iterations, max(0, coarse_iterations - done))
+        if coarse_part > 0:
+            coarse_algs.append(alg)
+            coarse_repeats.append(str(coarse_part))
+        if iterations > coarse_part:
+            algs.append(alg)
+            algs_repeats.append(str(iterations - coarse_part))
+        done += iterations
+    if len(coarse_algs) == 0 or len(algs) == 0:
+        print ('coarse_iterations should be smaller than the number of iterations, running without coarse stage')
+        return None, params
+
+    coarse_params = dict(params)
+    coarse_params['algs'] = '(' + ','.join(coarse_algs) + ')'
+    coarse_params['algs_repeats'] = '(' + ','.join(coarse_repeats) + ')'
+    coarse_params['num_iter'] = str(min(coarse_iterations, done))
+    # the area given in fractions applies to any grid; the area in pixels is scaled
+    if 'support_area' in params:
+        area = []
+        for a in parse_list(params['support_area']):
+            if '.' in a:
+                area.append(a)
+            else:
+                area.append(str(max(1, int(a) // binning)))
+        coarse_params['support_area'] = '(' + ','.join(area) + ')'
+    if 'support_sigma' in params:
+        coarse_params['support_sigma'] = str(float(params['support_sigma']) / binning)
+    # the low resolution is a first run feature, so it is not applied in the full size stage that continues the image;
+    # the trigger is clipped to the coarse iterations, and the ranges end at the values reached in the last of them
+    if 'resolution_trigger' in params:
+        trigger = parse_list(params['resolution_trigger'])
+        res_iterations = int(trigger[2]) if len(trigger) > 2 else done
+        if res_iterations < 0:
+            res_iterations += done
+        coarse_done = int(coarse_params['num_iter'])
+        fraction = 1.0
+        if res_iterations > coarse_done:
+            fraction = coarse_done / res_iterations
+            coarse_params['resolution_trigger'] = '(' + ','.join(trigger[:2] + [str(coarse_done)]) + ')'
+
+        def get_range(name, last_default, scale):
+            values = [float(v) for v in parse_list(params[name])]
+            last = values[1] if len(values) > 1 else last_default
+            last = values[0] + (last - values[0]) * fraction
+            return '(' + str(values[0] / scale) + ',' + str(last / scale) + ')'
+
+        # the sigmas are given in pixels, so they are scaled to the coarse grid, the dets are fractions of the grid
+        if 'iter_res_sigma_range' in params:
+            coarse_params['iter_res_sigma_range'] = get_range('iter_res_sigma_range', float(params.get('support_sigma', 1.0)), binning)
+        if 'iter_res_det_range' in params:
+            coarse_params['iter_res_det_range'] = get_range('iter_res_det_range', 1.0, 1)
+    # the partial coherence and averaging run on the full size data
+    coarse_params.pop('pcdi_trigger', None)
+    coarse_params.pop('average_trigger', None)
+
+    fine_params = dict(params)
+    fine_params['algs'] = '(' + ','.join(algs) + ')'
+    fine_params['algs_repeats'] = '(' + ','.join(algs_repeats) + ')'
+    fine_params['num_iter'] = str(done - int(coarse_params['num_iter']))
+    return coarse_params, fine_params
 
 
 def get_good_dim(dim):
@@ -351,7 +462,7 @@ def get_zero_padded_centered(arr, new_shape):
     for i in range(len(new_shape)):
         pad.append((0, new_shape[i] - shape[i]))
         c_vals.append((0.0, 0.0))
-    arr = np.lib.pad(arr, (pad), 'constant', constant_values=c_vals)
+    arr = np.pad(arr, (pad), 'constant', constant_values=c_vals)
 
     centered = arr
     for i in range(len(new_shape)):
@@ -360,6 +471,30 @@ def get_zero_padded_centered(arr, new_shape):
     return centered
 
 
+def get_upsampled(arr, new_shape):
+    """
+    This function upsamples the array to the new shape by zero padding its spectrum. The array center stays in the
+    center. The amplitudes keep the scale of the reconstructed image, i.e. the image reconstructed from data cropped in
+    reciprocal space is upsampled to the image of the full data.
+
+    Parameters
+    ----------
+    arr : ndarray
+        the array to upsample
+
+    new_shape : tuple
+        new dimensions, not smaller than the array dimensions
+
+    Returns
+    -------
+    upsampled : ndarray
+        the upsampled complex array
+    """
+    spectrum = np.fft.fftshift(np.fft.fftn(arr))
+    padded = get_zero_padded_centered(spectrum, new_shape)
+    return np.fft.ifftn(np.fft.ifftshift(padded))
+
+
 def adjust_dimensions(arr, pads):
     """
     This function adds to or subtracts from each dimension of the array elements defined by pad. If the pad is positive, the array is padded in this dimension. If the pad is negative, the array is cropped.
@@ -473,10 +608,53 @@ def flip(m, axis):
     return m[tuple(indexer)]
 
 
+# Gaussian grids calculated by gaussian(), mapped by (shape, sigmas, alpha), in the order of use
+GAUSS_CACHE_CAPACITY = 8
+_gauss_cache = OrderedDict()
+_gauss_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_gauss_cache_stats():
+    """
+    Returns statistics of the Gaussian grid cache used by gaussian().
+
+    Parameters
+    ----------
+    none
+
+    Returns
+    -------
+    stats : dict
+        number of 'hits', 'misses', and number of grids in the cache, 'size'
+    """
+    stats = dict(_gauss_cache_stats)
+    stats['size'] = len(_gauss_cache)
+    return stats
+
+
+def clear_gauss_cache():
+    """
+    Removes all grids from the Gaussian grid cache and resets the counters.
+
+    Parameters
+    ----------
+    none
+
+    Returns
+    -------
+    nothing
+    """
+    _gauss_cache.clear()
+    _gauss_cache_stats['hits'] = 0
+    _gauss_cache_stats['misses'] = 0
+
+
 def gaussian(shape, sigmas, alpha=1):
     """
     Calculates Gaussian distribution grid in ginven dimensions.
     
+    The grids are cached by shape, sigmas, and alpha, so a repeated call returns the grid calculated before. The cache keeps up to GAUSS_CACHE_CAPACITY grids, the least recently used grid is evicted first.
+
     Parameters
     ----------
     shape : tuple
@@ -489,8 +667,15 @@ def gaussian(shape, sigmas, alpha=1):
     Returns
     -------
     grid : ndarray
-        Gaussian distribution grid
+        Gaussian distribution grid; the grid is shared by all callers and is read only, so a caller that modifies it in place must copy it first
     """
+    key = (tuple(shape), tuple(float(sigma) for sigma in sigmas), alpha)
+    if key in _gauss_cache:
+        _gauss_cache_stats['hits'] += 1
+        _gauss_cache.move_to_end(key)
+        return _gauss_cache[key]
+
+    _gauss_cache_stats['misses'] += 1
     grid = np.full(shape, 1.0)
     for i in range(len(shape)):
         # prepare indexes for tile and transpose
@@ -509,7 +694,12 @@ def gaussian(shape, sigmas, alpha=1):
         grid = grid * gi
 
     grid_total = np.sum(grid)
-    return grid / grid_total
+    grid = grid / grid_total
+    grid.setflags(write=False)
+    _gauss_cache[key] = grid
+    if len(_gauss_cache) > GAUSS_CACHE_CAPACITY:
+        _gauss_cache.popitem(last=False)
+    return grid
 
 
 def gauss_conv_fft(arr, sigmas):
@@ -533,9 +723,8 @@ def gauss_conv_fft(arr, sigmas):
     arr_sum = np.sum(abs(arr))
     arr_f = np.fft.ifftshift(np.fft.fftn(np.fft.ifftshift(arr)))
     shape = list(arr.shape)
-    for i in range(len(sigmas)):
-        sigmas[i] = shape[i] / 2.0 / np.pi / sigmas[i]
-    convag = arr_f * gaussian(shape, sigmas)
+    dist_sigmas = [shape[i] / 2.0 / np.pi / sigmas[i] for i in range(len(sigmas))]
+    convag = arr_f * gaussian(shape, dist_sigmas)
     convag = np.fft.ifftshift(np.fft.ifftn(np.fft.ifftshift(convag)))
     convag = convag.real
     convag = np.clip(convag, 0, None)
@@ -678,15 +867,16 @@ def get_metric(image, errs):
     """
     metric = {}
     metric['chi'] = errs[-1]
-    metric['sharpness'] = np.sum(pow(abs(image), 4)).item()
-    metric['summed_phase'] = np.sum(sum_phase_tight_support(image)).item()
-    metric['area'] = np.sum(shrink_wrap(image, .2, .5)).item()
+    # the sums are accumulated in double precision, also for single precision images
+    metric['sharpness'] = np.sum(pow(abs(image), 4), dtype=np.float64).item()
+    metric['summed_phase'] = np.sum(sum_phase_tight_support(image), dtype=np.float64).item()
+    metric['area'] = np.sum(shrink_wrap(image, .2, .5), dtype=np.float64).item()
     return metric
 
 
-def save_metrics(errs, dir, metrics=None):
+def save_metrics(errs, dir, metrics=None, run_stats=None):
     """
-    Saves arrays metrics and errors by iterations in text file.
+    Saves arrays metrics, run statistics and errors by iterations in text file.
     
     Parameters
     ----------
@@ -698,6 +888,9 @@ def save_metrics(errs, dir, metrics=None):
         
     metrics : dict
         dictionary with metric type keys, and metric values
+
+    run_stats : dict
+        dictionary with run statistics, i.e. the stop iteration, see fast_module.Session.get_run_stats
                 
     Returns
     -------
@@ -712,6 +905,10 @@ def save_metrics(errs, dir, metrics=None):
             for key in metrics:
                 value = metrics[key]
                 f.write(key + ' = ' + str(value) + '\n')
+        if run_stats is not None:
+            f.write('\nrun statistics\n')
+            for key in run_stats:
+                f.write(key + ' = ' + str(run_stats[key]) + '\n')
         f.write('\nerrors by iteration\n')
         for er in errs:
             f.write(str(er) + ' ')
@@ -754,9 +951,9 @@ def write_plot_errors(save_dir):
     os.chmod(plot_file, st.st_mode | stat.S_IEXEC)
 
 
-def save_results(image, support, coh, errs, flow, iter_array, save_dir, metric=None):
+def save_results(image, support, coh, errs, flow, iter_array, save_dir, metric=None, run_stats=None):
     """
-    Saves results of reconstruction. Saves the following files: image.np, support.npy, errors.npy, optionally coherence.npy, plot_errors.py, graph.npy, flow.npy, iter_array.npy
+    Saves results of reconstruction. Saves the following files: image.np, support.npy, errors.npy, optionally coherence.npy, plot_errors.py, graph.npy, flow.npy, iter_array.npy, optionally alloc_array.npy
     
     
     Parameters
@@ -784,6 +981,10 @@ def save_results(image, support, coh, errs, flow, iter_array, save_dir, metric=N
         
     metrics : dict
         dictionary with metric type keys, and metric values
+
+    run_stats : dict
+        dictionary with run statistics saved in the summary, or None; the allocation report under the 'alloc_array'
+        key, see fast_module.Session.get_alloc_report, is saved in the graph directory instead
                 
     Returns
     -------
@@ -811,8 +1012,12 @@ def save_results(image, support, coh, errs, flow, iter_array, save_dir, metric=N
     np.save(flow_file, np.asarray(flow))
     iter_array_file = os.path.join(graph_dir, 'iter_array')
     np.save(iter_array_file, iter_array)
+    if run_stats is not None and 'alloc_array' in run_stats:
+        run_stats = dict(run_stats)
+        alloc_array_file = os.path.join(graph_dir, 'alloc_array')
+        np.save(alloc_array_file, run_stats.pop('alloc_array'))
 
-    save_metrics(errs, save_dir, metric)
+    save_metrics(errs, save_dir, metric, run_stats)
 
 
 def sub_pixel_shift(arr, row_shift, col_shift, z_shift):
@@ -862,44 +1067,114 @@ def arr_property(arr):
     print ('max coords, value', max_coordinates, arr[max_coordinates[0], max_coordinates[1],max_coordinates[2]])
 
 
-def get_gpu_load(mem_size, ids):
+# factor applied to the estimated reconstruction memory for the buffers rounded up and cached by the memory manager,
+# and the FFT plans
+MEMORY_OVERHEAD = 1.25
+
+
+def estimate_rec_memory(shape, params):
+    """
+    This function estimates the device memory used by one reconstruction. The estimate counts the arrays the engine
+    keeps for the data dimensions, in the configured precision, and the arrays added by the enabled features: partial
+    coherence, averaging, low resolution and shrink wrap.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of the data array
+
+    params : dict
+        reconstruction parameters, see get_fast_module_params
+
+    Returns
+    -------
+    mem_size : float
+        estimated memory in MB
+    """
+    points = reduce((lambda x,y: x*y), shape)
+    real_size = 4 if params.get('precision') in ('single', 'mixed') else 8
+    complex_size = 2 * real_size
+    # data, iteration data and amplitudes; image, raw image, reciprocal amplitudes and the FFT buffer; support
+    point_size = 3 * real_size + 4 * complex_size + 1
+    if 'shrink_wrap_trigger' in params:
+        # Gaussian distribution and the convolution spectrum
+        point_size += real_size + complex_size
+    if 'pcdi_trigger' in params:
+        # kernel and data spectra, and the converged amplitudes
+        point_size += 3 * complex_size + real_size
+    if 'average_trigger' in params:
+        # sums of amplitudes and squared amplitudes are kept in double precision
+        point_size += 2 * 8
+    if 'resolution_trigger' in params:
+        # the mask and the masked data
+        point_size += 2 * real_size
+    return points * point_size * MEMORY_OVERHEAD / (1024 * 1024)
+
+
+def get_gpu_free_memory(ids):
     """
     This function is only used when running on Linux OS. The GPUtil module is not supported on mac.
-    This function finds available GPU memory in each GPU that id is included in ids list. It calculates how many reconstruction can fit in each GPU available memory.
+    This function is the default resource probe for GPUs. It returns the free memory of each GPU that id is included
+    in ids list.
+
+    Parameters
+    ----------
+    ids : list
+        list of GPU ids user configured for use
+
+    Returns
+    -------
+    free : list
+        free memory in MB aligned with the GPU id list, 0 for the ids not found
+    """
+    import GPUtil
+
+    free_mem = {gpu.id : gpu.memoryFree for gpu in GPUtil.getGPUs()}
+    return [free_mem.get(id, 0) for id in ids]
+
+
+def get_cpu_free_memory(ids):
+    """
+    This function is the default resource probe for cpu. The host memory is shared, so the free memory is divided
+    between the configured ids, i.e. sockets.
+
+    Parameters
+    ----------
+    ids : list
+        list of configured ids
+
+    Returns
+    -------
+    free : list
+        free memory in MB aligned with the id list
+    """
+    free_mem = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    return [free_mem / len(ids)] * len(ids)
+
+
+def get_gpu_load(mem_size, ids, probe=None):
+    """
+    This function finds available memory in each device that id is included in ids list. It calculates how many reconstruction can fit in each device available memory.
     
     Parameters
     ----------
     mem_size : int
-        array size
+        memory in MB used by one reconstruction, see estimate_rec_memory
         
     ids : list
         list of GPU ids user configured for use
+
+    probe : callable
+        function taking the ids list and returning the free memory in MB aligned with it; get_gpu_free_memory if None
         
     Returns
     -------
     available : list
         list of available runs aligned with the GPU id list
     """
-    import GPUtil
-
-    gpus = GPUtil.getGPUs()
-    total_avail = 0
-    available_dir = {}
-    for gpu in gpus:
-        if gpu.id in ids:
-            free_mem = gpu.memoryFree
-            avail_runs = int(free_mem / mem_size)
-            if avail_runs > 0:
-                total_avail += avail_runs
-                available_dir[gpu.id] = avail_runs
-    available = []
-    for id in ids:
-        try:
-            avail_runs = available_dir[id]
-        except:
-            avail_runs = 0
-        available.append(avail_runs)
-    return available
+    if probe is None:
+        probe = get_gpu_free_memory
+    return [max(0, int(free_mem / mem_size)) for free_mem in probe(ids)]
 
 
 def get_gpu_distribution(runs, available):
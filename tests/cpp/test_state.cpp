@@ -0,0 +1,118 @@
+/***
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+***/
+
+// Checks the algorithm switches of State: the switch iterations kept by Next, skipping to the final ER block, and
+// restoring from a checkpoint. State and Params do not call ArrayFire, so only its header is needed to build.
+// Prints the failed checks and returns the number of failures.
+
+#include "stdio.h"
+#include "map"
+#include "string"
+#include "vector"
+#include "common.h"
+#include "parameters.hpp"
+#include "state.hpp"
+
+static int failures = 0;
+
+static void Check(bool condition, const char *what)
+{
+    if (!condition)
+    {
+        printf("failed: %s\n", what);
+        failures++;
+    }
+}
+
+static Params * GetParams(const std::string & algs, const std::string & algs_repeats, const std::string & num_iter)
+{
+    std::map<std::string, std::string> config;
+    config["algs"] = algs;
+    config["algs_repeats"] = algs_repeats;
+    config["num_iter"] = num_iter;
+    return new Params(config, std::vector<int>(3, 8), true);
+}
+
+// Runs the state to the end and returns the algorithm of each iteration.
+static std::vector<int> RunToEnd(State & state)
+{
+    std::vector<int> algs;
+    while (state.Next())
+    {
+        algs.push_back(state.GetCurrentAlg());
+    }
+    return algs;
+}
+
+static void TestSwitches()
+{
+    Params *params = GetParams("(ER,HIO,ER,HIO,ER)", "(2,3,2,3,2)", "12");
+    State state(params);
+    state.Init();
+    int expected[] = {2, 2, 3, 3, 3, 2, 2, 3, 3, 3, 2, 2};
+    std::vector<int> algs = RunToEnd(state);
+    Check(algs == std::vector<int>(expected, expected + 12), "algorithm of each iteration follows the switches");
+    Check(state.GetAlgSwitchIndex() == 4, "last switch index at the end");
+    delete params;
+}
+
+static void TestSkipToFinal()
+{
+    Params *params = GetParams("(ER,HIO,ER,HIO,ER)", "(2,3,2,3,2)", "12");
+    State state(params);
+    state.Init();
+    for (int i = 0; i < 4; i++)
+    {
+        state.Next();
+    }
+    Check(state.GetCurrentIteration() == 3, "iteration before skip");
+    Check(state.SkipToFinal(), "skip from HIO block");
+    Check(state.Next() && (state.GetCurrentIteration() == 10), "skip continues at the final block");
+    Check(state.GetCurrentAlg() == ALGORITHM_ER, "final block runs ER");
+    Check(state.GetAlgSwitchIndex() == 4, "switch index of the final block");
+    Check(!state.SkipToFinal(), "no skip in the final block");
+    Check(state.Next() && (state.GetCurrentIteration() == 11) && (state.GetCurrentAlg() == ALGORITHM_ER), "final block continues");
+    Check(!state.Next(), "run ends after the final block");
+    delete params;
+}
+
+static void TestSkipWithoutFinalEr()
+{
+    Params *params = GetParams("(ER,HIO)", "(2,3)", "5");
+    State state(params);
+    state.Init();
+    state.Next();
+    state.Next();
+    Check(state.SkipToFinal(), "skip without final ER block");
+    Check(!state.Next(), "skip without final ER block ends the run");
+    delete params;
+}
+
+static void TestRestore()
+{
+    Params *params = GetParams("(ER,HIO,ER,HIO,ER)", "(2,3,2,3,2)", "12");
+    State state(params);
+    state.Init();
+    // the checkpoint was written at iteration 4, the last HIO iteration of the first block
+    state.Restore(4, 1, std::vector<d_type>(5, 1.0));
+    Check(state.GetNumberErrors() == 5, "restored errors");
+    int expected[] = {2, 2, 3, 3, 3, 2, 2};
+    std::vector<int> algs = RunToEnd(state);
+    Check(algs == std::vector<int>(expected, expected + 7), "restored state switches at the same iterations");
+    delete params;
+}
+
+int main()
+{
+    TestSwitches();
+    TestSkipToFinal();
+    TestSkipWithoutFinalEr();
+    TestRestore();
+    if (failures == 0)
+    {
+        printf("passed\n");
+    }
+    return failures;
+}
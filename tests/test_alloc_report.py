@@ -0,0 +1,80 @@
+"""
+Checks the format of the allocation report and how it is saved with the results. The engine is replaced by a fake
+bridge returning a recorded report, so the test does not need ArrayFire.
+"""
+
+import os
+import subprocess
+import sys
+import numpy as np
+import reccdi.src_py.controller.fast_module as calc
+import reccdi.src_py.utilities.utils as ut
+
+
+class FakeBridge:
+    """
+    Replaces the bridge of a session with 3 flow items; the report is given flattened item by item, as by the engine.
+    """
+    def __init__(self, report, error_code=0):
+        self.report = report
+        self.error_code = error_code
+
+    def is_success(self):
+        return self.error_code
+
+    def get_flow(self):
+        return ['ER', 'HIO', 'Prog']
+
+    def get_alloc_report(self):
+        return list(self.report)
+
+
+def get_session(bridge):
+    session = calc.Session.__new__(calc.Session)
+    session.shape = (8, 8, 8)
+    session.fast_module = bridge
+    return session
+
+
+def test_report_shape():
+    report = np.arange(12)
+    alloc_array = get_session(FakeBridge(report)).get_alloc_report()
+    assert alloc_array.shape == (3, 4)
+    # each row holds one flow item over the iterations
+    assert list(alloc_array[1]) == [4, 5, 6, 7]
+
+
+def test_no_report():
+    assert get_session(FakeBridge([])).get_alloc_report() is None
+    assert get_session(FakeBridge(np.arange(12), error_code=-1)).get_alloc_report() is None
+    assert get_session(None).get_alloc_report() is None
+
+
+def test_report_saved_with_results(tmp_path):
+    alloc_array = get_session(FakeBridge(np.arange(12))).get_alloc_report()
+    run_stats = {'gc_count': 2, 'alloc_array': alloc_array}
+    image = np.ones((4, 4, 4), dtype=np.complex64)
+    save_dir = str(tmp_path / 'results')
+    ut.save_results(image, np.ones((4, 4, 4)), None, np.asarray([1.0, 0.5]), ['ER', 'HIO', 'Prog'], np.ones((3, 4)),
+                    save_dir, run_stats=run_stats)
+    saved = np.load(os.path.join(save_dir, 'graph', 'alloc_array.npy'))
+    assert np.array_equal(saved, alloc_array)
+    # the report is not written in the summary, and the given statistics are not changed
+    with open(os.path.join(save_dir, 'summary')) as f:
+        summary = f.read()
+    assert 'gc_count = 2' in summary
+    assert 'alloc_array' not in summary
+    assert 'alloc_array' in run_stats
+
+
+def test_check_script(tmp_path):
+    # the report of one flow item over two iterations; the second iteration allocates 2 MB
+    save_dir = tmp_path / 'results'
+    (save_dir / 'graph').mkdir(parents=True)
+    np.save(str(save_dir / 'graph' / 'alloc_array.npy'), np.array([[0, 2 * 1024 * 1024]]))
+    np.save(str(save_dir / 'graph' / 'flow.npy'), np.array(['ER']))
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dev', 'check_alloc.py')
+    assert subprocess.call([sys.executable, script, str(save_dir), '--limit', '4']) == 0
+    result = subprocess.run([sys.executable, script, str(save_dir), '--limit', '1'], stdout=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 1
+    assert 'ER allocated 2.0 MB in iteration 1' in result.stdout
@@ -0,0 +1,77 @@
+"""
+Checks the split of the parameters into the coarse and full size stages, and the upsampling of the coarse image.
+"""
+
+import numpy as np
+import reccdi.src_py.utilities.utils as ut
+
+
+def get_params(**kwargs):
+    params = {'algs': '(ER,HIO,ER)', 'algs_repeats': '(20,180,20)', 'num_iter': '220',
+              'coarse_iterations': '100', 'coarse_binning': '2', 'support_sigma': '1.0', 'support_area': '(.5,40,.5)'}
+    params.update(kwargs)
+    return params
+
+
+def test_no_coarse_stage():
+    params = get_params()
+    del params['coarse_iterations']
+    assert ut.get_coarse_params(params) == (None, params)
+    # the coarse stage must leave iterations for the full size stage
+    assert ut.get_coarse_params(get_params(coarse_iterations='220'))[0] is None
+
+
+def test_algorithm_sequence_split():
+    coarse, fine = ut.get_coarse_params(get_params())
+    assert coarse['algs'] == '(ER,HIO)'
+    assert coarse['algs_repeats'] == '(20,80)'
+    assert coarse['num_iter'] == '100'
+    assert fine['algs'] == '(HIO,ER)'
+    assert fine['algs_repeats'] == '(100,20)'
+    assert fine['num_iter'] == '120'
+
+
+def test_support_scaled():
+    coarse, fine = ut.get_coarse_params(get_params(pcdi_trigger='(50,50)', average_trigger='(-65,1)'))
+    assert coarse['support_sigma'] == '0.5'
+    assert coarse['support_area'] == '(.5,20,.5)'
+    assert fine['support_sigma'] == '1.0'
+    assert 'pcdi_trigger' not in coarse and 'average_trigger' not in coarse
+    assert 'pcdi_trigger' in fine and 'average_trigger' in fine
+
+
+def test_resolution_clipped_to_coarse_stage():
+    coarse, fine = ut.get_coarse_params(get_params(resolution_trigger='(0,1,200)', iter_res_sigma_range='(2.0)',
+                                                   iter_res_det_range='(.7)'))
+    assert coarse['resolution_trigger'] == '(0,1,100)'
+    # half of the low resolution iterations run, so the ranges end half way; the sigmas are scaled by the binning
+    sigmas = [float(v) for v in coarse['iter_res_sigma_range'].strip('()').split(',')]
+    dets = [float(v) for v in coarse['iter_res_det_range'].strip('()').split(',')]
+    assert np.allclose(sigmas, [1.0, 0.75])
+    assert np.allclose(dets, [.7, .85])
+
+
+def test_resolution_within_coarse_stage():
+    coarse, fine = ut.get_coarse_params(get_params(resolution_trigger='(0,1,-170)', iter_res_sigma_range='(3.0,1.0)'))
+    # the negative upper bound is counted from the end of the whole sequence, i.e. 50
+    assert coarse['resolution_trigger'] == '(0,1,-170)'
+    sigmas = [float(v) for v in coarse['iter_res_sigma_range'].strip('()').split(',')]
+    assert np.allclose(sigmas, [1.5, 0.5])
+
+
+def test_upsampled_keeps_band_limited_image():
+    shape = (8, 10, 6)
+    grid = np.indices(shape)
+    # a band limited image is sampled exactly on the finer grid
+    image = np.exp(2j * np.pi * (grid[0] / shape[0] + 2 * grid[1] / shape[1] - grid[2] / shape[2]))
+    upsampled = ut.get_upsampled(image, (16, 20, 12))
+    assert upsampled.shape == (16, 20, 12)
+    fine_grid = np.indices((16, 20, 12)) / 2.0
+    expected = np.exp(2j * np.pi * (fine_grid[0] / shape[0] + 2 * fine_grid[1] / shape[1] - fine_grid[2] / shape[2]))
+    # the spectrum keeps its values, so the image takes the scale of an image of the larger data
+    assert np.allclose(upsampled, expected / 8)
+
+
+def test_upsampled_same_shape():
+    image = np.random.default_rng(0).random((6, 6, 6)) + 0j
+    assert np.allclose(ut.get_upsampled(image, image.shape), image)
@@ -0,0 +1,53 @@
+"""
+Checks the cache of the Gaussian grids used by shrink wrap and low resolution.
+"""
+
+import numpy as np
+import pytest
+import reccdi.src_py.utilities.utils as ut
+
+SHAPE = (8, 8, 8)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    ut.clear_gauss_cache()
+    yield
+    ut.clear_gauss_cache()
+
+
+def test_hit_returns_same_grid():
+    grid = ut.gaussian(SHAPE, [1.0, 1.0, 1.0])
+    assert ut.gaussian(SHAPE, [1.0, 1.0, 1.0]) is grid
+    ut.gaussian(SHAPE, [2.0, 2.0, 2.0])
+    assert ut.get_gauss_cache_stats() == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+def test_grid_is_read_only():
+    grid = ut.gaussian(SHAPE, [1.0, 1.0, 1.0])
+    assert not grid.flags.writeable
+    with pytest.raises(ValueError):
+        grid[0, 0, 0] = 0
+    # the operations used by the callers return new arrays
+    assert np.array_equal(grid * 2, ut.gaussian(SHAPE, [1.0, 1.0, 1.0]) + grid)
+
+
+def test_least_recently_used_evicted():
+    for i in range(ut.GAUSS_CACHE_CAPACITY):
+        ut.gaussian(SHAPE, [1.0 + i, 1.0, 1.0])
+    # using the first grid keeps it, the second grid is the least recently used
+    ut.gaussian(SHAPE, [1.0, 1.0, 1.0])
+    ut.gaussian(SHAPE, [0.5, 1.0, 1.0])
+    stats = ut.get_gauss_cache_stats()
+    assert stats == {'hits': 1, 'misses': ut.GAUSS_CACHE_CAPACITY + 1, 'size': ut.GAUSS_CACHE_CAPACITY}
+    ut.gaussian(SHAPE, [1.0, 1.0, 1.0])
+    ut.gaussian(SHAPE, [2.0, 1.0, 1.0])
+    stats = ut.get_gauss_cache_stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == ut.GAUSS_CACHE_CAPACITY + 2
+
+
+def test_clear():
+    ut.gaussian(SHAPE, [1.0, 1.0, 1.0])
+    ut.clear_gauss_cache()
+    assert ut.get_gauss_cache_stats() == {'hits': 0, 'misses': 0, 'size': 0}
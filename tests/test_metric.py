@@ -0,0 +1,50 @@
+"""
+Checks that the metrics ranking the reconstructions, and the error curves of the engine, do not depend on the precision
+of the image.
+"""
+
+import numpy as np
+import pytest
+import reccdi.src_py.utilities.utils as ut
+
+
+def get_image(dtype):
+    # a smooth blob with a phase ramp, so the support thresholds are not close to any voxel value
+    grid = np.indices((32, 32, 32)) - 15.5
+    radius = np.sqrt(np.sum(grid ** 2, axis=0))
+    image = np.exp(-(radius / 8.0) ** 2) * np.exp(1j * 0.1 * grid[0])
+    return image.astype(dtype)
+
+
+def test_metric_single_matches_double():
+    errs = [1.0, 0.5, 0.25]
+    single = ut.get_metric(get_image(np.complex64), errs)
+    double = ut.get_metric(get_image(np.complex128), errs)
+    assert single.keys() == double.keys()
+    for key in double:
+        assert isinstance(single[key], float)
+        assert np.isclose(single[key], double[key], rtol=1e-5), key
+
+
+def test_error_curve_single_matches_double():
+    # the reference is the double precision run; it needs the engine, so it is skipped without ArrayFire
+    pytest.importorskip('reccdi.src_py.cyth.bridge_cpu')
+    import reccdi.src_py.controller.fast_module as calc
+
+    # both runs start from the same image and support, so the runs differ only in precision
+    rng = np.random.default_rng(0)
+    obj = np.abs(get_image(np.complex128)) > .5
+    data = np.abs(np.fft.fftshift(np.fft.fftn(obj * np.exp(1j * rng.uniform(-.5, .5, obj.shape)))))
+    image = rng.random(data.shape) * np.exp(1j * rng.uniform(-np.pi, np.pi, data.shape))
+    support = np.zeros(data.shape, dtype=np.int32)
+    support[8:24, 8:24, 8:24] = 1
+    errors = {}
+    for precision in ('single', 'double'):
+        params = {'algs': '(ER,HIO,ER)', 'algs_repeats': '(10,20,10)', 'num_iter': '40', 'beta': '0.9',
+                  'precision': precision}
+        session = calc.Session('cpu', -1, params, data)
+        errors[precision] = np.asarray(session.run(image, support)[3])
+        session.close()
+    assert len(errors['single']) == len(errors['double']) == 40
+    # tolerance: 1e-3 of the error at each iteration, well above the float32 rounding of the sums
+    assert np.allclose(errors['single'], errors['double'], rtol=1e-3, atol=0)
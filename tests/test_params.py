@@ -0,0 +1,48 @@
+"""
+Checks the translation of the parsed configuration into the parameters passed to the engine.
+"""
+
+import reccdi.src_py.utilities.utils as ut
+
+
+def get_params(tmp_path, text):
+    conf_file = tmp_path / 'config_rec'
+    conf_file.write_text(text)
+    return ut.get_fast_module_params(ut.read_config(str(conf_file)))
+
+
+def test_nested_repeats(tmp_path):
+    params = get_params(tmp_path, 'algorithm_sequence = ((3, ("ER",20), ("HIO", 180)), (1,("ER",20)))\n')
+    assert params['algs'] == '(ER,HIO,ER,HIO,ER,HIO,ER)'
+    assert params['algs_repeats'] == '(20,180,20,180,20,180,20)'
+    assert params['num_iter'] == '620'
+
+
+def test_single_entry_sequence(tmp_path):
+    params = get_params(tmp_path, 'algorithm_sequence = (2, ("ER",5), ("HIO", 10))\n')
+    assert params['algs'] == '(ER,HIO,ER,HIO)'
+    assert params['algs_repeats'] == '(5,10,5,10)'
+    assert params['num_iter'] == '30'
+
+
+def test_value_formatting(tmp_path):
+    params = get_params(tmp_path, 'algorithm_sequence = ((1, ("ER",5)))\n'
+                                  'alloc_report = true\n'
+                                  'cont = false\n'
+                                  'support_area = (.5,.5,.5)\n'
+                                  'partial_coherence_roi = (32, 32, 32)\n'
+                                  'resolution_trigger = (0, 1, -320)\n'
+                                  'iter_res_sigma_range = (2.0)\n'
+                                  'beta = .9\n'
+                                  'precision = "single"\n')
+    assert params['num_iter'] == '5'
+    # the booleans are given capitalized, the engine accepts both cases
+    assert params['alloc_report'] == 'True'
+    assert params['cont'] == 'False'
+    # the lists are given in parenthesis, without spaces and quotes
+    assert params['support_area'] == '(0.5,0.5,0.5)'
+    assert params['partial_coherence_roi'] == '(32,32,32)'
+    assert params['resolution_trigger'] == '(0,1,-320)'
+    assert params['iter_res_sigma_range'] == '(2.0)'
+    assert params['beta'] == '0.9'
+    assert params['precision'] == 'single'
@@ -0,0 +1,72 @@
+"""
+Checks how the reconstructions are packed on the devices, using fake probes of the free device memory.
+"""
+
+import reccdi.src_py.utilities.utils as ut
+import reccdi.src_py.controller.reconstruction_multi as multi
+
+SHAPE = (64, 64, 64)
+
+
+def get_params(per_device='auto'):
+    return {'runs_per_device': per_device, 'precision': 'double'}
+
+
+def fake_probe(free):
+    # returns probe reporting the given free memory in MB for each device id
+    return lambda ids: [free[id] for id in ids]
+
+
+def failing_probe(ids):
+    raise ImportError('no GPUtil')
+
+
+def test_gpu_load():
+    assert ut.get_gpu_load(100, [0, 1, 2], fake_probe({0: 450, 1: 99, 2: 1000})) == [4, 0, 10]
+
+
+def test_gpu_distribution_is_balanced():
+    assert ut.get_gpu_distribution(5, [4, 0, 10]) == [3, 0, 2]
+    assert ut.get_gpu_distribution(20, [4, 0, 10]) == [4, 0, 10]
+    assert ut.get_gpu_distribution(3, [0, 0]) == [0, 0]
+
+
+def test_estimate_depends_on_precision():
+    double = ut.estimate_rec_memory(SHAPE, {'precision': 'double'})
+    single = ut.estimate_rec_memory(SHAPE, {'precision': 'single'})
+    assert single < double
+    assert ut.estimate_rec_memory(SHAPE, {'precision': 'double', 'pcdi_trigger': '(50,50)'}) > double
+
+
+def test_configured_runs_per_device():
+    workers = multi.get_worker_devices('cuda', [0, 1], 6, SHAPE, get_params('2'), failing_probe)
+    assert workers == [0, 0, 1, 1]
+    # the default is one run on each device, the probe is not used
+    workers = multi.get_worker_devices('cuda', [0, 1], 6, SHAPE, {}, failing_probe)
+    assert workers == [0, 1]
+
+
+def test_auto_packs_by_free_memory():
+    mem_size = ut.estimate_rec_memory(SHAPE, get_params())
+    probe = fake_probe({0: 3.5 * mem_size, 1: 1.5 * mem_size})
+    workers = multi.get_worker_devices('cuda', [0, 1], 6, SHAPE, get_params(), probe)
+    assert sorted(workers) == [0, 0, 0, 1]
+
+
+def test_auto_does_not_exceed_runs():
+    mem_size = ut.estimate_rec_memory(SHAPE, get_params())
+    probe = fake_probe({0: 10 * mem_size, 1: 10 * mem_size})
+    workers = multi.get_worker_devices('cuda', [0, 1], 3, SHAPE, get_params(), probe)
+    assert sorted(workers) == [0, 0, 1]
+
+
+def test_auto_falls_back_when_memory_too_small():
+    mem_size = ut.estimate_rec_memory(SHAPE, get_params())
+    probe = fake_probe({0: 0.5 * mem_size, 1: 0})
+    workers = multi.get_worker_devices('cuda', [0, 1], 4, SHAPE, get_params(), probe)
+    assert workers == [0, 1]
+
+
+def test_auto_falls_back_when_probe_fails():
+    workers = multi.get_worker_devices('cuda', [0, 1], 4, SHAPE, get_params(), failing_probe)
+    assert workers == [0, 1]
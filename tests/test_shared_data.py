@@ -0,0 +1,94 @@
+"""
+Checks that the data placed in shared memory reaches the worker processes, and that the shared memory block is
+released when the reconstructions complete or fail.
+"""
+
+import numpy as np
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+import reccdi.src_py.utilities.utils as ut
+import reccdi.src_py.controller.reconstruction_multi as multi
+
+shared_memory = pytest.importorskip('multiprocessing.shared_memory')
+
+
+def read_shared(ref):
+    # runs in a worker process
+    arr = multi.attach_data(ref)
+    return arr.copy(), arr.flags.writeable, multi.attach_data(ref) is arr
+
+
+def get_data():
+    return np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+
+
+def test_round_trip():
+    data = get_data()
+    shared = multi.SharedData(data)
+    try:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            arr, writeable, reused = executor.submit(read_shared, shared.get_ref()).result()
+    finally:
+        shared.close()
+    assert np.array_equal(arr, data)
+    assert arr.dtype == data.dtype
+    # the worker gets a read only view, and keeps the attachment for the next tasks
+    assert not writeable
+    assert reused
+
+
+def test_close_unlinks():
+    shared = multi.SharedData(get_data())
+    name = shared.get_ref()[0]
+    shared.close()
+    assert shared.shm is None
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    # closing again does nothing
+    shared.close()
+
+
+class FailingPool:
+    def map(self, func, iterable):
+        raise RuntimeError('worker failed')
+
+
+def get_created(monkeypatch):
+    # records the shared data created by multi_rec
+    created = []
+    class RecordedSharedData(multi.SharedData):
+        def __init__(self, arr):
+            super().__init__(arr)
+            created.append(self.get_ref()[0])
+    monkeypatch.setattr(multi, 'SharedData', RecordedSharedData)
+    return created
+
+
+def get_config(tmp_path):
+    conf_file = tmp_path / 'config_rec'
+    conf_file.write_text('algorithm_sequence = ((1, ("ER",5)))\n')
+    return ut.read_config(str(conf_file))
+
+
+def run_failing(tmp_path, pool):
+    with pytest.raises(RuntimeError):
+        multi.multi_rec(str(tmp_path), 'cpu', get_data(), None, get_config(tmp_path), [-1], [None, None], pool=pool)
+
+
+def test_unlinked_when_run_fails(tmp_path, monkeypatch):
+    created = get_created(monkeypatch)
+    run_failing(tmp_path, FailingPool())
+    assert len(created) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=created[0])
+
+
+def test_unlinked_when_pool_fails(tmp_path, monkeypatch):
+    created = get_created(monkeypatch)
+    def failing_start(devices):
+        raise RuntimeError('cannot start workers')
+    monkeypatch.setattr(multi, 'WorkerPool', failing_start)
+    run_failing(tmp_path, None)
+    assert len(created) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=created[0])
@@ -0,0 +1,36 @@
+"""
+Builds and runs the C++ check of the reconstruction state, see cpp/test_state.cpp. The check needs a C++ compiler and
+the ArrayFire headers, found in AF_PATH/include or the system include directories; it is skipped otherwise.
+"""
+
+import os
+import shutil
+import subprocess
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+RECCDI_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'reccdi')
+
+
+def get_af_include():
+    dirs = ['/usr/include', '/usr/local/include', '/opt/arrayfire/include']
+    if 'AF_PATH' in os.environ:
+        dirs.insert(0, os.path.join(os.environ['AF_PATH'], 'include'))
+    for include_dir in dirs:
+        if os.path.isfile(os.path.join(include_dir, 'arrayfire.h')):
+            return include_dir
+    return None
+
+
+def test_state(tmp_path):
+    compiler = shutil.which('g++')
+    af_include = get_af_include()
+    if compiler is None or af_include is None:
+        pytest.skip('C++ compiler or ArrayFire headers not found')
+    program = str(tmp_path / 'test_state')
+    sources = [os.path.join(TESTS_DIR, 'cpp', 'test_state.cpp'),
+               os.path.join(RECCDI_DIR, 'src_cpp', 'state.cpp'),
+               os.path.join(RECCDI_DIR, 'src_cpp', 'parameters.cpp')]
+    subprocess.check_call([compiler, '-std=c++11', '-I', os.path.join(RECCDI_DIR, 'include'), '-I', af_include, '-o', program] + sources)
+    result = subprocess.run([program], stdout=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 0, result.stdout